@@ -1,6 +1,10 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
+from fastapi.concurrency import run_in_threadpool
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
@@ -8,7 +12,11 @@ from .config import settings
 from .schemas import TokenData
 
 # Используем pbkdf2_sha256 — надёжно и без проблем с длиной
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
 
 
 def hash_password(password: str) -> str:
@@ -19,6 +27,50 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# ---------- Хэширование вне пула потоков ----------
+#
+# pbkdf2 — чистый CPU на десятки миллисекунд. В синхронном эндпоинте он
+# занимал поток из общего пула FastAPI, и волна логинов выедала потоки у
+# всех остальных эндпоинтов. Теперь хэш считается в отдельном пуле из
+# PASSWORD_HASH_WORKERS процессов (spawn — без копии состояния сервера),
+# а эндпоинт асинхронно ждёт результат. 0 — считать в пуле потоков, как раньше.
+
+_password_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_password_pool() -> Optional[ProcessPoolExecutor]:
+    global _password_pool
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        return None
+    if _password_pool is None:
+        _password_pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _password_pool
+
+
+async def hash_password_async(password: str) -> str:
+    pool = _get_password_pool()
+    if pool is None:
+        return await run_in_threadpool(hash_password, password)
+    return await asyncio.get_running_loop().run_in_executor(pool, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    pool = _get_password_pool()
+    if pool is None:
+        return await run_in_threadpool(verify_password, plain_password, hashed_password)
+    return await asyncio.get_running_loop().run_in_executor(pool, verify_password, plain_password, hashed_password)
+
+
+def shutdown_password_pool() -> None:
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(wait=True, cancel_futures=True)
+        _password_pool = None
+
+
 def create_access_token(
     data: dict,
     expires_delta: Optional[timedelta] = None,
@@ -68,6 +120,6 @@ def decode_access_token(token: str) -> Optional[TokenData]:
         # Жёстко приводим к строке, даже если внутри UUID
         user_id_str = str(user_id_raw)
 
-        return TokenData(user_id=user_id_str, email=email)
+        return TokenData(user_id=user_id_str, email=email, exp=payload.get("exp"))
     except JWTError:
         return None
@@ -0,0 +1,182 @@
+"""
+Фоновое применение платёжных событий из входящей очереди (billing_inbox).
+
+Webhook ЮKassa только записывает событие и сразу отвечает, поэтому время
+ответа провайдеру не зависит от нагрузки на БД, а повторная доставка того
+же события отсекается уникальным ключом таблицы. Здесь раз в
+BILLING_INBOX_POLL_SECONDS ожидающие события забираются пачкой и
+применяются в одной транзакции, каждое в своём SAVEPOINT: ошибка одного
+события не откатывает остальные. На SQLite транзакция пачки сразу берёт
+блокировку записи (BEGIN IMMEDIATE).
+
+Применение ровно один раз: изменения события и перевод его из pending
+делаются в одном SAVEPOINT, а перевод — условным UPDATE ... WHERE
+status = 'pending'. Если событие уже забрал другой процесс, UPDATE не
+затронет строк и всё сделанное для события откатится. Платёж, по которому
+подписка уже есть (например, применён до появления очереди), повторно не
+применяется.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .principals import principal_cache
+
+PENDING = "pending"
+APPLIED = "applied"
+IGNORED = "ignored"
+FAILED = "failed"
+
+PROVIDER = "yookassa"
+
+
+class _AlreadyProcessed(Exception):
+    """Событие перевёл из pending кто-то другой — сделанное откатываем."""
+
+
+def _apply(db: Session, event: str, payload: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Применить одно событие в текущей транзакции.
+    Возвращает (статус, причина пропуска, id пользователя с изменённым лимитом).
+    """
+    # Нас интересует успешный платёж
+    if event != "payment.succeeded":
+        return IGNORED, f"event {event}", None
+
+    obj = json.loads(payload).get("object") or {}
+    payment_id = obj.get("id")
+    metadata = obj.get("metadata") or {}
+    user_id = metadata.get("user_id")
+    if metadata.get("purpose") != "buy_room" or not user_id:
+        return IGNORED, "not a room purchase", None
+
+    user = crud.get_user(db, user_id)
+    if user is None:
+        return IGNORED, "user not found", None
+    if crud.subscription_exists(db, PROVIDER, payment_id):
+        return IGNORED, "payment already applied", None
+
+    value_str = (obj.get("amount") or {}).get("value", "0.00")
+    try:
+        amount_rub = int(float(value_str))
+    except ValueError:
+        amount_rub = 0
+
+    description = f"Оплата {amount_rub} ₽ за доп. комнату, платёж {payment_id}"
+    crud.add_room_subscription(db, user, external_id=payment_id, amount_rub=amount_rub, description=description)
+    return APPLIED, None, user.id
+
+
+class BillingInbox:
+    def __init__(self) -> None:
+        self.batches = 0
+        self.applied = 0
+        self.ignored = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    def apply_pending(self, engine: Engine, batch_size: int, max_attempts: int) -> int:
+        """Применить до batch_size ожидающих событий; возвращает, сколько взято."""
+        Event = models.BillingEvent
+        started = time.perf_counter()
+        counts = {APPLIED: 0, IGNORED: 0, FAILED: 0, PENDING: 0}
+        users = set()
+
+        with Session(engine, autoflush=False) as db:
+            rows = db.execute(
+                select(Event.id, Event.event, Event.payload, Event.attempts)
+                .where(Event.status == PENDING)
+                .order_by(Event.received_at)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return 0
+            if engine.dialect.name == "sqlite":
+                # блокировку записи берём сразу: иначе переход от чтения к записи при
+                # параллельных вставках webhook-а даёт "database is locked" без ожидания busy_timeout
+                db.execute(text("BEGIN IMMEDIATE"))
+
+            for row in rows:
+                try:
+                    with db.begin_nested():
+                        result, reason, user_id = _apply(db, row.event, row.payload)
+                        claimed = db.execute(
+                            update(Event)
+                            .where(Event.id == row.id, Event.status == PENDING)
+                            .values(status=result, error=reason, processed_at=datetime.utcnow())
+                            .execution_options(synchronize_session=False)
+                        )
+                        if claimed.rowcount != 1:
+                            raise _AlreadyProcessed()
+                except _AlreadyProcessed:
+                    continue
+                except Exception as e:
+                    # SAVEPOINT откатился; событие вернётся в следующую пачку, пока не кончатся попытки
+                    attempts = row.attempts + 1
+                    result = FAILED if attempts >= max_attempts else PENDING
+                    db.execute(
+                        update(Event)
+                        .where(Event.id == row.id, Event.status == PENDING)
+                        .values(
+                            status=result,
+                            attempts=attempts,
+                            error=f"{type(e).__name__}: {e}"[:500],
+                            processed_at=datetime.utcnow() if result == FAILED else None,
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                    print(f"Billing event {row.id} failed (attempt {attempts}): {e}")
+                    user_id = None
+                counts[result] += 1
+                if user_id is not None:
+                    users.add(user_id)
+            db.commit()
+
+        # max_rooms изменился — закэшированные токены этих пользователей больше не годятся
+        for user_id in users:
+            principal_cache.invalidate_user(user_id)
+
+        self.batches += 1
+        self.applied += counts[APPLIED]
+        self.ignored += counts[IGNORED]
+        self.failed += counts[FAILED]
+        self.retried += counts[PENDING]
+        self.last_batch_size = len(rows)
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+        return len(rows)
+
+    def snapshot(self) -> dict:
+        return {
+            "batches": self.batches,
+            "applied": self.applied,
+            "ignored": self.ignored,
+            "retried": self.retried,
+            "failed": self.failed,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": self.last_batch_ms,
+        }
+
+
+billing_inbox = BillingInbox()
+
+
+async def inbox_loop(engine: Engine, interval: float, batch_size: int, max_attempts: int, pause: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # полная пачка — в очереди есть ещё; пауза между пачками даёт webhook-ам
+            # записать свои события, а не ждать, пока очередь опустеет
+            while await asyncio.to_thread(billing_inbox.apply_pending, engine, batch_size, max_attempts) >= batch_size:
+                await asyncio.sleep(pause)
+        except Exception as e:
+            print(f"Billing inbox failed: {e}")
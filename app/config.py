@@ -1,24 +1,101 @@
 import secrets
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
 
 class Settings(BaseSettings):
+    # Асинхронный драйвер (sqlite+aiosqlite:///...) переводит эндпоинты на AsyncSession
     DATABASE_URL: str = "sqlite:///./quiet_rooms.db"
 
+    # Профиль хранилища SQLite: прагмы на каждое соединение (пустая строка — не менять)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # Пул соединений к файлу SQLite (у aiosqlite каждое соединение — поток драйвера,
+    # поэтому без overflow: лишние соединения создавались бы и закрывались на каждом пике)
+    SQLITE_POOL_SIZE: int = 5
+    SQLITE_MAX_OVERFLOW: int = 0
+    # Пул соединений серверной СУБД (PostgreSQL и т.п.)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Применять миграции при старте control-plane (удобно в разработке);
+    # в проде выключить и запускать python -m app.migrate при выкладке
+    DB_MIGRATE_ON_STARTUP: bool = True
+
     SECRET_KEY: str = Field(default_factory=lambda: secrets.token_urlsafe(32))
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
 
+    # Хэширование паролей (pbkdf2_sha256): число итераций и размер пула процессов.
+    # Новые итерации действуют только на новые хэши; 0 воркеров — считать в пуле потоков.
+    PASSWORD_HASH_ROUNDS: int = 29000
+    PASSWORD_HASH_WORKERS: int = 2
+
+    # Размер страницы листингов /rooms/my и /nodes/ (keyset-пагинация, см. app/pagination.py)
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+
+    # Кэш "комната -> нода" для GET /rooms/{code}/node (см. app/room_nodes.py)
+    ROOM_NODE_CACHE_TTL_SECONDS: float = 30.0
+    ROOM_NODE_CACHE_MAX_SIZE: int = 10000
+    # Сколько браузер может не перепроверять ответ (дальше — If-None-Match и 304)
+    ROOM_NODE_MAX_AGE_SECONDS: int = 5
+
+    # Кэш проверенных токенов (см. app/principals.py)
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10_000
+
     DEFAULT_NODE_MAX_ROOMS: int = 3
 
+    # Как часто накопленные в памяти heartbeat-ы нод записываются в БД одним UPDATE
+    HEARTBEAT_FLUSH_INTERVAL_SECONDS: float = 2.0
+
+    # Сколько живёт резерв места на ноде под новую комнату, пока нода не сообщит её в heartbeat
+    PLACEMENT_RESERVATION_TTL_SECONDS: float = 60.0
+
+    # Выбор ноды под комнату (см. app/placement.py):
+    #   least_rooms          — меньше всего комнат (прежнее поведение)
+    #   weighted_load        — взвешенная загрузка: комнаты, CPU, память, задержка цикла событий
+    #   p2c                  — лучшая по weighted_load из двух случайных нод
+    #   participant_weighted — заполненность по участникам, а не по комнатам
+    PLACEMENT_STRATEGY: Literal["least_rooms", "weighted_load", "p2c", "participant_weighted"] = "weighted_load"
+    PLACEMENT_WEIGHT_ROOMS: float = 1.0
+    PLACEMENT_WEIGHT_CPU: float = 1.0
+    PLACEMENT_WEIGHT_MEM: float = 0.5
+    PLACEMENT_WEIGHT_LOOP_LAG: float = 1.0
+    # Задержка цикла событий, при которой нода считается полностью занятой по этому показателю
+    PLACEMENT_LOOP_LAG_CEILING_MS: float = 100.0
+    # Сколько участников закладывать на ещё не подтверждённую комнату (participant_weighted)
+    PLACEMENT_ROOM_PARTICIPANTS_ESTIMATE: int = 10
+
+    # Нода без heartbeat-а дольше этого срока помечается OFFLINE; проверка раз в интервал
+    PLACEMENT_NODE_STALE_AFTER_SECONDS: float = 30.0
+    PLACEMENT_SWEEP_INTERVAL_SECONDS: float = 5.0
+
+    # Максимум комнат в одном POST /rooms/batch
+    ROOM_BATCH_MAX: int = 100
+
+    # Таймаут запросов control-plane к нодам (регистрация комнат)
+    NODE_REQUEST_TIMEOUT_SECONDS: float = 3.0
+
     # --- YooKassa ---
     YOOKASSA_SHOP_ID: str = "YOUR_SHOP_ID"
     YOOKASSA_SECRET_KEY: str = "YOUR_SECRET_KEY"
     # URL, на который ЮKassa будет слать webhook (на бою: https://your.domain/api/billing/yookassa/webhook)
     YOOKASSA_WEBHOOK_URL: str = "https://example.com/api/billing/yookassa/webhook"
 
+    # Входящая очередь платёжных событий (см. app/billing_inbox.py):
+    # как часто фоновый обработчик забирает события, сколько за раз и сколько попыток на событие
+    BILLING_INBOX_POLL_SECONDS: float = 1.0
+    BILLING_INBOX_BATCH_SIZE: int = 20
+    BILLING_INBOX_MAX_ATTEMPTS: int = 5
+    # Пауза между пачками при разборе очереди: запись новых событий webhook-ом не ждёт весь разбор
+    BILLING_INBOX_BATCH_PAUSE_SECONDS: float = 0.2
+
     # Цена комнаты (в рублях)
     ROOM_PRICE_RUB: int = 1200
 
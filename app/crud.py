@@ -1,14 +1,19 @@
 import secrets
 import string
-from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import select
+from sqlalchemy import Row, and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from . import models, schemas
-from .models import NodeStatus, RoomStatus, User, UserSubscription
+from .models import NodeStatus, RoomStatus, User, UserRoomUsage, UserSubscription
 from .auth import hash_password, verify_password
+from .pagination import Key
+from .placement import capacity
+from .principals import Principal, principal_cache
+from .room_nodes import room_node_cache
+from .serialization import columns_for
 
 
 class RoomLimitExceeded(Exception):
@@ -21,27 +26,56 @@ class NodeUnavailable(Exception):
 
 # ---------- ВСПОМОГАТЕЛЬНЫЕ ----------
 
+# Сколько раз пересоздавать пачку, если при вставке всё же случилась коллизия кода
+ROOM_CODE_ATTEMPTS = 3
+
+
 def generate_room_code(length: int = 8) -> str:
     alphabet = string.ascii_lowercase + string.digits
     return "".join(secrets.choice(alphabet) for _ in range(length))
 
 
+def allocate_room_codes(db: Session, count: int) -> list[str]:
+    """
+    Свободные коды комнат: один запрос code IN (...) на всю пачку вместо
+    SELECT на каждый код. Гонку с параллельной вставкой ловит уникальный
+    индекс rooms.code (см. create_rooms).
+    """
+    codes: set[str] = set()
+    while len(codes) < count:
+        candidates = {generate_room_code() for _ in range(count - len(codes))} - codes
+        taken = set(db.scalars(select(models.Room.code).where(models.Room.code.in_(candidates))))
+        codes |= candidates - taken
+    return list(codes)
+
+
+def _room_title(data: schemas.RoomCreate) -> Optional[str]:
+    title = (data.title or data.name or None)
+    if title:
+        title = title.strip() or None
+    return title
+
+
 # ---------- USERS ----------
 
+def get_user(db: Session, user_id: str) -> Optional[User]:
+    return db.get(User, user_id)
+
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     stmt = select(User).where(User.email == email)
     return db.scalars(stmt).first()
 
 
-def create_user(db: Session, user_in: schemas.UserCreate) -> User:
+def create_user(db: Session, user_in: schemas.UserCreate, hashed_password: Optional[str] = None) -> User:
+    """hashed_password — если хэш уже посчитан асинхронно (см. auth.hash_password_async)."""
     user = User(
         email=user_in.email,
-        hashed_password=hash_password(user_in.password),
+        hashed_password=hashed_password or hash_password(user_in.password),
         max_rooms=1,  # по умолчанию 1 комната по подписке
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    db.flush()
 
     # Базовая запись подписки (потом привяжем к ЮKassa)
     sub = UserSubscription(
@@ -52,7 +86,9 @@ def create_user(db: Session, user_in: schemas.UserCreate) -> User:
         description="Initial free room or base subscription",
     )
     db.add(sub)
+    db.add(UserRoomUsage(user_id=user.id, active_rooms=0, room_limit=sub.room_count))
     db.commit()
+    db.refresh(user)
     return user
 
 
@@ -65,30 +101,146 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     return user
 
 
-def get_user_active_room_limit(db: Session, user: User) -> int:
-    """
-    Сколько комнат пользователю разрешено по подпискам.
-    Сейчас берём из user.max_rooms.
-    Можно заменить на сумму активных UserSubscription.room_count.
-    """
-    return user.max_rooms
-
+# ---------- ЛИМИТ КОМНАТ (счётчики user_room_usage) ----------
 
-def get_user_active_room_count(db: Session, user: User) -> int:
-    stmt = select(models.Room).where(
-        models.Room.owner_id == user.id,
+def _count_active_rooms(db: Session, user_id: str) -> int:
+    stmt = select(func.count()).select_from(models.Room).where(
+        models.Room.owner_id == user_id,
         models.Room.is_deleted == False,
         models.Room.status != RoomStatus.CLOSED,
     )
-    return len(list(db.scalars(stmt)))
+    return db.scalar(stmt)
 
 
-def list_user_rooms(db: Session, user: User) -> list[models.Room]:
-    stmt = select(models.Room).where(
-        models.Room.owner_id == user.id,
-        models.Room.is_deleted == False,
-    ).order_by(models.Room.created_at.desc())
-    return list(db.scalars(stmt))
+def _sum_subscription_rooms(db: Session, user_id: str) -> int:
+    stmt = select(func.coalesce(func.sum(UserSubscription.room_count), 0)).where(
+        UserSubscription.user_id == user_id,
+        UserSubscription.status == "active",
+    )
+    return db.scalar(stmt)
+
+
+def get_room_usage(db: Session, user: User | Principal, commit: bool = True) -> UserRoomUsage:
+    """
+    Счётчики пользователя. Для пользователей, заведённых до появления
+    таблицы, строка один раз заполняется из COUNT/SUM. commit=False —
+    новая строка только отправляется в текущую транзакцию (flush).
+    """
+    usage = db.get(UserRoomUsage, user.id)
+    if usage is None:
+        usage = UserRoomUsage(
+            user_id=user.id,
+            active_rooms=_count_active_rooms(db, user.id),
+            room_limit=_sum_subscription_rooms(db, user.id),
+        )
+        db.add(usage)
+        if not commit:
+            db.flush()
+            return usage
+        try:
+            db.commit()
+        except IntegrityError:
+            # параллельный запрос успел создать строку раньше
+            db.rollback()
+            usage = db.get(UserRoomUsage, user.id)
+    return usage
+
+
+def _take_room_quota(db: Session, user_id: str, count: int) -> bool:
+    """
+    Занять count комнат из лимита одним условным UPDATE в текущей
+    транзакции: два параллельных создания не превысят лимит.
+    """
+    result = db.execute(
+        update(UserRoomUsage)
+        .where(
+            UserRoomUsage.user_id == user_id,
+            UserRoomUsage.active_rooms + count <= UserRoomUsage.room_limit,
+        )
+        .values(active_rooms=UserRoomUsage.active_rooms + count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _change_room_usage(db: Session, user_id: str, active_rooms: int = 0, room_limit: int = 0) -> None:
+    db.execute(
+        update(UserRoomUsage)
+        .where(UserRoomUsage.user_id == user_id)
+        .values(
+            active_rooms=UserRoomUsage.active_rooms + active_rooms,
+            room_limit=UserRoomUsage.room_limit + room_limit,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def check_room_usage(db: Session, fix: bool = False) -> list[dict]:
+    """
+    Сверить счётчики с фактическими данными (COUNT комнат, SUM подписок)
+    для всех пользователей. Возвращает расхождения; fix=True их исправляет.
+    """
+    rooms = dict(db.execute(
+        select(models.Room.owner_id, func.count())
+        .where(models.Room.is_deleted == False, models.Room.status != RoomStatus.CLOSED)
+        .group_by(models.Room.owner_id)
+    ).all())
+    limits = dict(db.execute(
+        select(UserSubscription.user_id, func.sum(UserSubscription.room_count))
+        .where(UserSubscription.status == "active")
+        .group_by(UserSubscription.user_id)
+    ).all())
+    usage = {row.user_id: row for row in db.scalars(select(UserRoomUsage))}
+
+    mismatches = []
+    for user_id in db.scalars(select(User.id)):
+        expected_rooms = rooms.get(user_id, 0)
+        expected_limit = limits.get(user_id, 0)
+        row = usage.get(user_id)
+        actual = (row.active_rooms, row.room_limit) if row else None
+        if actual == (expected_rooms, expected_limit):
+            continue
+        mismatches.append({
+            "user_id": user_id,
+            "active_rooms": row.active_rooms if row else None,
+            "expected_active_rooms": expected_rooms,
+            "room_limit": row.room_limit if row else None,
+            "expected_room_limit": expected_limit,
+        })
+        if fix:
+            if row is None:
+                db.add(UserRoomUsage(user_id=user_id, active_rooms=expected_rooms, room_limit=expected_limit))
+            else:
+                row.active_rooms = expected_rooms
+                row.room_limit = expected_limit
+
+    if fix and mismatches:
+        db.commit()
+    return mismatches
+
+
+def list_user_rooms(
+    db: Session,
+    user: User | Principal,
+    limit: Optional[int] = None,
+    before: Optional[Key] = None,
+) -> list[Row]:
+    """
+    Комнаты пользователя, новые первыми: строки с колонками RoomOut, без
+    ORM-объектов (см. app/serialization.py). before — ключ (created_at, id)
+    последней комнаты предыдущей страницы (см. app/pagination.py).
+    """
+    Room = models.Room
+    stmt = select(*columns_for(Room, schemas.RoomOut)).where(
+        Room.owner_id == user.id,
+        Room.is_deleted == False,
+    ).order_by(Room.created_at.desc(), Room.id.desc())
+    if before is not None:
+        created_at, room_id = before
+        stmt = stmt.where(or_(Room.created_at < created_at, and_(Room.created_at == created_at, Room.id < room_id)))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return list(db.execute(stmt))
 
 
 # ---------- NODES ----------
@@ -106,11 +258,27 @@ def create_node(db: Session, data: schemas.ServerNodeCreate) -> models.ServerNod
     db.add(node)
     db.commit()
     db.refresh(node)
+    capacity.upsert_node(node)
     return node
 
 
-def list_nodes(db: Session) -> list[models.ServerNode]:
-    stmt = select(models.ServerNode).order_by(models.ServerNode.created_at)
+def list_nodes(db: Session, limit: Optional[int] = None, after: Optional[Key] = None) -> list[Row]:
+    """
+    Ноды в порядке регистрации: строки с колонками ServerNodeOut.
+    after — ключ последней ноды предыдущей страницы.
+    """
+    Node = models.ServerNode
+    stmt = select(*columns_for(Node, schemas.ServerNodeOut)).order_by(Node.created_at, Node.id)
+    if after is not None:
+        created_at, node_id = after
+        stmt = stmt.where(or_(Node.created_at > created_at, and_(Node.created_at == created_at, Node.id > node_id)))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return list(db.execute(stmt))
+
+
+def get_nodes(db: Session, node_ids: set[str]) -> list[models.ServerNode]:
+    stmt = select(models.ServerNode).where(models.ServerNode.id.in_(node_ids))
     return list(db.scalars(stmt))
 
 
@@ -121,6 +289,8 @@ def get_node(db: Session, node_id: str) -> Optional[models.ServerNode]:
 def update_node(db: Session, node: models.ServerNode, data: schemas.ServerNodeUpdate) -> models.ServerNode:
     payload = data.model_dump(exclude_unset=True)
     api_key = payload.pop("api_key", None)
+    if payload.get("base_url") is not None:
+        payload["base_url"] = str(payload["base_url"])
 
     for field, value in payload.items():
         setattr(node, field, value)
@@ -129,72 +299,82 @@ def update_node(db: Session, node: models.ServerNode, data: schemas.ServerNodeUp
         node.api_key_hash = api_key
     db.commit()
     db.refresh(node)
+    capacity.upsert_node(node)
+    # адрес или статус мог поменяться — закэшированные ответы по её комнатам устарели
+    room_node_cache.invalidate_node(node.id)
     return node
 
 
-def update_node_heartbeat(
-    db: Session,
-    node: models.ServerNode,
-    hb: schemas.ServerNodeHeartbeat,
-) -> models.ServerNode:
-    node.active_rooms = hb.active_rooms
-    node.cpu_load = hb.cpu_load
-    node.mem_load = hb.mem_load
-    node.last_heartbeat = datetime.utcnow()
-    db.commit()
-    db.refresh(node)
-    return node
-
-
-def pick_node_for_new_room(db: Session) -> Optional[models.ServerNode]:
-    """
-    Простая стратегия: взять активную ноду с наименьшим количеством активных комнат,
-    у которой active_rooms < max_rooms.
-    """
-    stmt = (
-        select(models.ServerNode)
-        .where(models.ServerNode.status == NodeStatus.ACTIVE)
-        .where(models.ServerNode.active_rooms < models.ServerNode.max_rooms)
-        .order_by(models.ServerNode.active_rooms.asc())
-    )
-    return db.scalars(stmt).first()
-
-
 # ---------- ROOMS ----------
 
-def create_room(db: Session, data: schemas.RoomCreate, owner: User) -> models.Room:
-    # Проверяем лимит комнат по подписке
-    limit = get_user_active_room_limit(db, owner)
-    current = get_user_active_room_count(db, owner)
-    if current >= limit:
-        raise RoomLimitExceeded("Превышен лимит комнат по подписке. Докупите ещё одну комнату.")
+def create_room(db: Session, data: schemas.RoomCreate, owner: User | Principal) -> models.Room:
+    return create_rooms(db, [data], owner)[0]
 
-    node = pick_node_for_new_room(db)
-    if not node:
-        raise NodeUnavailable("Нет доступных серверов для создания комнаты")
 
-    code = generate_room_code()
-    while db.scalar(select(models.Room).where(models.Room.code == code)):
-        code = generate_room_code()
-
-    title = (data.title or data.name or None)
-    if title:
-        title = title.strip() or None
-
-    room = models.Room(
-        code=code,
-        title=title,
-        owner_id=owner.id,
-        node_id=node.id,
-        max_participants=data.max_participants,
-        status=RoomStatus.ACTIVE,
+def create_rooms(db: Session, items: list[schemas.RoomCreate], owner: User | Principal) -> list[models.Room]:
+    """
+    Создать одну или несколько комнат: лимит проверяется один раз на всю
+    пачку, ноды подбираются за один проход, вставка — одной транзакцией.
+    """
+    get_room_usage(db, owner)
+    capacity.ensure_loaded(db)
+    for attempt in range(ROOM_CODE_ATTEMPTS):
+        # Проверяем и сразу занимаем лимит комнат по подписке (откатится вместе со вставкой)
+        if not _take_room_quota(db, owner.id, len(items)):
+            db.rollback()
+            if len(items) == 1:
+                raise RoomLimitExceeded("Превышен лимит комнат по подписке. Докупите ещё одну комнату.")
+            usage = get_room_usage(db, owner)
+            raise RoomLimitExceeded(
+                "Превышен лимит комнат по подписке: "
+                f"свободно {max(usage.room_limit - usage.active_rooms, 0)}, запрошено {len(items)}."
+            )
+
+        codes = allocate_room_codes(db, len(items))
+
+        # места на нодах резервируются сразу; см. app/placement.py
+        node_ids = capacity.reserve_many(codes)
+        if node_ids is None:
+            db.rollback()
+            raise NodeUnavailable("Нет доступных серверов для создания комнаты")
+
+        rooms = [
+            models.Room(
+                code=code,
+                title=_room_title(data),
+                owner_id=owner.id,
+                node_id=node_id,
+                max_participants=data.max_participants,
+                status=RoomStatus.ACTIVE,
+            )
+            for data, code, node_id in zip(items, codes, node_ids)
+        ]
+        db.add_all(rooms)
+        try:
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            for code, node_id in zip(codes, node_ids):
+                capacity.release(node_id, code)
+            # коллизия кода с параллельной вставкой — пробуем с новыми кодами
+            if isinstance(exc, IntegrityError) and attempt + 1 < ROOM_CODE_ATTEMPTS:
+                continue
+            raise
+        break
+
+    for room in rooms:
+        db.refresh(room)
+    return rooms
+
+
+def list_node_rooms(db: Session, node_id: str) -> list[Row]:
+    """Строки с колонками NodeRoomAssignment."""
+    stmt = select(*columns_for(models.Room, schemas.NodeRoomAssignment)).where(
+        models.Room.node_id == node_id,
+        models.Room.is_deleted == False,
+        models.Room.status != RoomStatus.CLOSED,
     )
-    db.add(room)
-    node.active_rooms += 1
-
-    db.commit()
-    db.refresh(room)
-    return room
+    return list(db.execute(stmt))
 
 
 def get_room_by_code(db: Session, code: str) -> Optional[models.Room]:
@@ -205,24 +385,50 @@ def get_room_by_code(db: Session, code: str) -> Optional[models.Room]:
     return db.scalars(stmt).first()
 
 
+def get_room_node(db: Session, code: str) -> Optional[tuple[str, Optional[str]]]:
+    """
+    (node_id, base_url) ноды комнаты одним запросом, None — комнаты нет;
+    base_url None — нода комнаты не найдена.
+    """
+    Room, Node = models.Room, models.ServerNode
+    stmt = (
+        select(Room.node_id, Node.base_url)
+        .outerjoin(Node, Node.id == Room.node_id)
+        .where(Room.code == code, Room.is_deleted == False)
+    )
+    row = db.execute(stmt).first()
+    return (row.node_id, row.base_url) if row else None
+
+
 def close_room(db: Session, room: models.Room) -> models.Room:
+    if room.status != RoomStatus.CLOSED and not room.is_deleted:
+        _change_room_usage(db, room.owner_id, active_rooms=-1)
     room.status = RoomStatus.CLOSED
-    if room.node and room.node.active_rooms > 0:
-        room.node.active_rooms -= 1
+    # счётчик комнат ноды обновит её heartbeat; снимаем только наш резерв
+    capacity.release(room.node_id, room.code)
     db.commit()
+    room_node_cache.invalidate_room(room.code)
     db.refresh(room)
     return room
 
 
 # ---------- BILLING / SUBSCRIPTIONS ----------
 
-def create_subscription_record_for_room(
+def add_room_subscription(
     db: Session,
     user: User,
     external_id: str | None,
     amount_rub: int,
     description: str,
 ) -> UserSubscription:
+    """
+    Подписка на одну комнату и +1 к лимиту пользователя в текущей
+    транзакции, без commit: фиксирует и сбрасывает principal_cache
+    вызывающий (см. app/billing_inbox.py).
+    """
+    # строка счётчиков должна существовать до изменения лимита
+    get_room_usage(db, user, commit=False)
+
     sub = UserSubscription(
         user_id=user.id,
         room_count=1,
@@ -236,7 +442,27 @@ def create_subscription_record_for_room(
 
     # увеличиваем доступный лимит комнат
     user.max_rooms += 1
-
-    db.commit()
-    db.refresh(sub)
+    _change_room_usage(db, user.id, room_limit=sub.room_count)
     return sub
+
+
+def subscription_exists(db: Session, provider: str, external_id: str) -> bool:
+    stmt = select(UserSubscription.id).where(
+        UserSubscription.provider == provider,
+        UserSubscription.external_id == external_id,
+    )
+    return db.execute(stmt.limit(1)).first() is not None
+
+
+def enqueue_billing_event(db: Session, provider: str, event: str, external_id: str, payload: str) -> bool:
+    """
+    Записать событие провайдера во входящую очередь. False — такое событие
+    уже записано (повторная доставка webhook).
+    """
+    db.add(models.BillingEvent(provider=provider, event=event, external_id=external_id, payload=payload))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
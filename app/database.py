@@ -1,5 +1,27 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+"""
+Подключение к БД.
+
+Синхронный engine/SessionLocal есть всегда: им пользуются скрипты и фоновые
+записи (heartbeat-ы, статусы нод). Если в DATABASE_URL указан асинхронный
+драйвер (например, sqlite+aiosqlite:///./quiet_rooms.db), эндпоинты
+работают через AsyncSession и не занимают пул потоков; для синхронного
+engine тогда берётся тот же адрес с синхронным драйвером.
+
+Профиль хранилища: у SQLite на каждое новое соединение ставятся прагмы
+(WAL, synchronous, busy_timeout — см. SQLITE_* в config), размеры пулов
+задаются отдельно для SQLite и серверных СУБД. Схему создают миграции
+(python -m app.migrate), а не create_all.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional, TypeVar, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from .config import settings
 
@@ -8,9 +30,118 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {},
-)
+# асинхронный драйвер -> синхронный для того же диалекта
+SYNC_DRIVERS = {
+    "aiosqlite": "pysqlite",
+    "asyncpg": "psycopg2",
+}
+
+url = make_url(settings.DATABASE_URL)
+IS_ASYNC = url.get_driver_name() in SYNC_DRIVERS
+sync_url = url.set(drivername=f"{url.get_backend_name()}+{SYNC_DRIVERS[url.get_driver_name()]}") if IS_ASYNC else url
+
+IS_SQLITE = url.get_backend_name() == "sqlite"
+
+connect_args = {"check_same_thread": False} if IS_SQLITE else {}
+
+
+def pool_options(url: URL) -> dict:
+    """Параметры пула соединений под бэкенд."""
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # база в памяти живёт в одном соединении — пул SQLAlchemy по умолчанию
+            return {}
+        return {
+            "pool_size": settings.SQLITE_POOL_SIZE,
+            "max_overflow": settings.SQLITE_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        }
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(
+    engine: Engine,
+    journal_mode: str = settings.SQLITE_JOURNAL_MODE,
+    synchronous: str = settings.SQLITE_SYNCHRONOUS,
+    busy_timeout_ms: int = settings.SQLITE_BUSY_TIMEOUT_MS,
+) -> None:
+    """
+    Прагмы на каждое новое соединение. WAL: читатели не ждут писателя и
+    наоборот; synchronous=NORMAL в WAL не теряет целостность, только
+    последние транзакции при отключении питания; busy_timeout — сколько
+    писатель ждёт блокировку, прежде чем получить "database is locked".
+    Пустое значение — оставить как есть.
+    """
+    pragmas = []
+    if journal_mode:
+        pragmas.append(f"PRAGMA journal_mode={journal_mode}")
+    if synchronous:
+        pragmas.append(f"PRAGMA synchronous={synchronous}")
+    if busy_timeout_ms is not None:
+        pragmas.append(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+engine = create_engine(sync_url, connect_args=connect_args, **pool_options(sync_url))
+if IS_SQLITE:
+    apply_sqlite_pragmas(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+if IS_ASYNC:
+    # у aiosqlite по умолчанию NullPool, а каждое соединение — отдельный поток драйвера:
+    # держим постоянный пул, чтобы потоки не создавались на каждую сессию
+    options = pool_options(url)
+    if IS_SQLITE and options:
+        options["poolclass"] = AsyncAdaptedQueuePool
+    async_engine = create_async_engine(url, connect_args=connect_args, **options)
+    if IS_SQLITE:
+        apply_sqlite_pragmas(async_engine.sync_engine)
+    # expire_on_commit=False: после commit атрибуты читаются уже вне сессии,
+    # ленивой догрузки в асинхронном режиме нет
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+DB = Union[Session, AsyncSession]
+
+T = TypeVar("T")
+
+
+@asynccontextmanager
+async def open_db() -> AsyncIterator[DB]:
+    """Сессия для эндпоинта: AsyncSession при асинхронном драйвере, иначе обычная."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def run_db(db: DB, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполнить функцию crud (первый аргумент — Session) из async-эндпоинта.
+    С AsyncSession она идёт через run_sync прямо в цикле событий (ввод-вывод
+    через асинхронный драйвер), с обычной сессией — в пуле потоков, как раньше.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
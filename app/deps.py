@@ -1,34 +1,35 @@
-from typing import Generator
+from typing import AsyncGenerator
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 
-from .database import SessionLocal
+from .database import DB, open_db, run_db
 from .auth import decode_access_token
-from . import models
+from .principals import Principal, principal_cache
+from . import crud
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncGenerator[DB, None]:
+    """Сессия запроса; функции crud вызываются из эндпоинтов через run_db."""
+    async with open_db() as db:
         yield db
-    finally:
-        db.close()
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> models.User:
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
     """
-    1. Достаём токен
-    2. Декодируем
-    3. Берём user_id как строку
-    4. Находим пользователя в БД по строковому primary key
+    Кто делает запрос. Уже проверенный токен берётся из кэша без проверки
+    подписи и без БД; иначе:
+    1. Декодируем токен
+    2. Берём user_id как строку
+    3. Находим пользователя в БД по строковому primary key (короткая сессия)
+    4. Кладём результат в кэш
     """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     token_data = decode_access_token(token)
 
     if not token_data or not token_data.user_id:
@@ -41,13 +42,20 @@ def get_current_user(
     # КРИТИЧЕСКОЕ МЕСТО: SQLite не понимает UUID → всегда приводим к str
     user_id_str = str(token_data.user_id)
 
-    user = db.get(models.User, user_id_str)
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
+    async with open_db() as db:
+        user = await run_db(db, crud.get_user, user_id_str)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal = Principal(
+            id=user.id,
+            email=user.email,
+            max_rooms=user.max_rooms,
+            created_at=user.created_at,
         )
 
-    return user
+    principal_cache.put(token, principal, token_data.exp)
+    return principal
@@ -0,0 +1,153 @@
+"""
+Write-behind для heartbeat-ов нод.
+
+Heartbeat (POST или кадр постоянного канала) только кладёт свежие цифры в
+память процесса; раз в HEARTBEAT_FLUSH_INTERVAL_SECONDS всё накопленное
+уходит в server_nodes одним UPDATE ... WHERE id = ? (executemany) в одной
+транзакции. Сколько бы heartbeat-ов ни пришло от ноды за интервал, в БД
+попадает только последний. Чтение статуса нод (GET /nodes) накладывает
+поверх строк из БД значения из памяти, поэтому ничего не отстаёт.
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.engine import Engine
+
+from . import models, schemas
+
+
+@dataclass
+class NodeLoad:
+    active_rooms: int
+    last_heartbeat: datetime
+    participants: Optional[int] = None
+    cpu_load: Optional[float] = None
+    mem_load: Optional[float] = None
+    process_cpu: Optional[float] = None
+    rss_bytes: Optional[int] = None
+    open_sockets: Optional[int] = None
+    loop_lag_ms: Optional[float] = None
+    loop_lag_max_ms: Optional[float] = None
+
+
+# Поля, которые есть в таблице server_nodes; остальное живёт только в памяти
+STORED_FIELDS = ("active_rooms", "cpu_load", "mem_load", "last_heartbeat")
+
+# Поля ответа GET /nodes, которые берутся из памяти
+OVERLAY_FIELDS = STORED_FIELDS + ("participants", "loop_lag_ms")
+
+_nodes = models.ServerNode.__table__
+
+_flush_stmt = (
+    update(_nodes)
+    .where(_nodes.c.id == bindparam("b_id"))
+    .values({field: bindparam(f"b_{field}") for field in STORED_FIELDS})
+)
+
+
+class HeartbeatBuffer:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # последние значения по каждой ноде — для чтения
+        self._latest: Dict[str, NodeLoad] = {}
+        # ноды, чьи значения ещё не записаны в БД
+        self._dirty: set = set()
+        # id существующих нод, чтобы не ходить в БД на каждый heartbeat
+        self._known: set = set()
+
+        self.received = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_ms = 0.0
+
+    # ---------- известные ноды ----------
+
+    def is_known(self, node_id: str) -> bool:
+        return node_id in self._known
+
+    def remember(self, node_id: str) -> None:
+        self._known.add(node_id)
+
+    def load_known(self, engine: Engine) -> None:
+        with engine.connect() as conn:
+            self._known.update(conn.scalars(select(_nodes.c.id)))
+
+    # ---------- запись ----------
+
+    def record(self, node_id: str, hb: schemas.ServerNodeHeartbeat) -> None:
+        load = NodeLoad(last_heartbeat=datetime.utcnow(), **hb.model_dump(exclude={"room_codes"}))
+        with self._lock:
+            self._latest[node_id] = load
+            self._dirty.add(node_id)
+            self.received += 1
+
+    def flush(self, engine: Engine) -> int:
+        with self._lock:
+            if not self._dirty:
+                return 0
+            rows = []
+            for node_id in self._dirty:
+                load = self._latest[node_id]
+                row = {f"b_{field}": getattr(load, field) for field in STORED_FIELDS}
+                row["b_id"] = node_id
+                rows.append(row)
+            self._dirty = set()
+
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(_flush_stmt, rows)
+        except Exception:
+            # не потеряли: вернём ноды в очередь записи, если новых значений ещё не пришло
+            with self._lock:
+                self._dirty.update(row["b_id"] for row in rows)
+            raise
+
+        self.flushes += 1
+        self.rows_written += len(rows)
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+        return len(rows)
+
+    # ---------- чтение ----------
+
+    def overlay(self, node: models.ServerNode) -> schemas.ServerNodeOut:
+        """Нода из БД с наложенными значениями последнего heartbeat."""
+        out = schemas.ServerNodeOut.model_validate(node)
+        values = self.overlay_values(node.id)
+        return out.model_copy(update=values) if values else out
+
+    def overlay_values(self, node_id: str) -> dict:
+        """Значения последнего heartbeat для полей ответа (пусто, если не было)."""
+        load = self._latest.get(node_id)
+        if load is None:
+            return {}
+        values = asdict(load)
+        return {key: values[key] for key in OVERLAY_FIELDS}
+
+    def snapshot(self) -> dict:
+        return {
+            "nodes": len(self._latest),
+            "pending": len(self._dirty),
+            "received": self.received,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+heartbeats = HeartbeatBuffer()
+
+
+async def flush_loop(engine: Engine, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(heartbeats.flush, engine)
+        except Exception as e:
+            print(f"Heartbeat flush failed: {e}")
@@ -1,8 +1,17 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .database import engine, Base
-from .routers import auth, nodes, rooms, billing, users
+from .auth import shutdown_password_pool
+from .billing_inbox import inbox_loop
+from .config import settings
+from .database import async_engine, engine, SessionLocal
+from .heartbeats import flush_loop, heartbeats
+from .migrate import pending, upgrade
+from .pagination import NEXT_CURSOR_HEADER
+from .placement import capacity, sweep_loop
+from .routers import auth, nodes, rooms, billing, users, stats
 
 app = FastAPI(
     title="Quiet Rooms Control Plane",
@@ -11,9 +20,33 @@ app = FastAPI(
 
 
 @app.on_event("startup")
-def on_startup() -> None:
-    """Инициализируем схему БД при запуске приложения."""
-    Base.metadata.create_all(bind=engine)
+async def on_startup() -> None:
+    """Проверяем схему БД, поднимаем индекс размещения и фоновые задачи."""
+    if settings.DB_MIGRATE_ON_STARTUP:
+        upgrade(engine)
+    elif pending(engine):
+        raise RuntimeError("Схема БД отстаёт от кода: выполните python -m app.migrate")
+    heartbeats.load_known(engine)
+    with SessionLocal() as db:
+        capacity.ensure_loaded(db)
+    asyncio.create_task(flush_loop(engine, settings.HEARTBEAT_FLUSH_INTERVAL_SECONDS))
+    asyncio.create_task(sweep_loop(engine, settings.PLACEMENT_SWEEP_INTERVAL_SECONDS))
+    asyncio.create_task(inbox_loop(
+        engine,
+        settings.BILLING_INBOX_POLL_SECONDS,
+        settings.BILLING_INBOX_BATCH_SIZE,
+        settings.BILLING_INBOX_MAX_ATTEMPTS,
+        settings.BILLING_INBOX_BATCH_PAUSE_SECONDS,
+    ))
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    # последние heartbeat-ы не должны пропасть при остановке
+    heartbeats.flush(engine)
+    shutdown_password_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # -----------------------
 # CORS — обязательно!
@@ -30,6 +63,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # курсор следующей страницы листингов (см. app/pagination.py)
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 @app.get("/")
@@ -41,3 +76,4 @@ app.include_router(nodes.router)
 app.include_router(rooms.router)
 app.include_router(billing.router)
 app.include_router(users.router)
+app.include_router(stats.router)
@@ -0,0 +1,86 @@
+"""
+Применение миграций схемы из app/migrations.
+
+Запускается один раз при выкладке, до старта control-plane:
+
+    python -m app.migrate            # применить недостающие миграции
+    python -m app.migrate --status   # текущая версия и что ещё не применено
+
+Каждая миграция выполняется в своей транзакции вместе с записью версии в
+schema_version, поэтому повторный запуск ничего не делает.
+"""
+
+import argparse
+from datetime import datetime
+from typing import List, Set
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, inspect, select
+from sqlalchemy.engine import Engine
+
+from .migrations import Migration, discover
+
+_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def applied_versions(engine: Engine) -> Set[int]:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(schema_version.name):
+            return set()
+        return set(conn.scalars(select(schema_version.c.version)))
+
+
+def pending(engine: Engine) -> List[Migration]:
+    applied = applied_versions(engine)
+    return [m for m in discover() if m.version not in applied]
+
+
+def upgrade(engine: Engine) -> List[Migration]:
+    """Применить недостающие миграции; возвращает применённые."""
+    schema_version.create(engine, checkfirst=True)
+    done = []
+    for migration in pending(engine):
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(
+                insert(schema_version).values(
+                    version=migration.version,
+                    name=migration.name,
+                    applied_at=datetime.utcnow(),
+                )
+            )
+        print(f"Applied migration {migration.version:04d}_{migration.name}")
+        done.append(migration)
+    return done
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="только показать состояние")
+    args = parser.parse_args()
+
+    from .database import engine
+
+    if args.status:
+        applied = applied_versions(engine)
+        print(f"База: {engine.url}")
+        print(f"Текущая версия: {max(applied) if applied else 'нет'}")
+        for migration in pending(engine):
+            print(f"  ожидает: {migration.version:04d}_{migration.name}")
+        return 0
+
+    done = upgrade(engine)
+    if not done:
+        print("Схема актуальна")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
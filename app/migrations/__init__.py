@@ -0,0 +1,44 @@
+"""
+Версионированные миграции схемы БД.
+
+Каждая миграция — модуль mNNNN_<название>.py с функцией upgrade(conn).
+Применённые версии записываются в таблицу schema_version, запускает их
+python -m app.migrate (см. app/migrate.py). Миграции не импортируют
+app.models: схема в них зафиксирована такой, какой была на момент написания.
+"""
+
+import importlib
+import pkgutil
+import re
+from dataclasses import dataclass
+from types import ModuleType
+from typing import List
+
+_NAME = re.compile(r"^m(\d{4})_(\w+)$")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    def upgrade(self, conn) -> None:
+        self.module.upgrade(conn)
+
+
+def discover() -> List[Migration]:
+    """Все миграции пакета по возрастанию версии."""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _NAME.match(info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{info.name}")
+        migrations.append(Migration(version=int(match.group(1)), name=match.group(2), module=module))
+
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Повторяющиеся версии миграций: {versions}")
+    return migrations
@@ -0,0 +1,89 @@
+"""
+Исходная схема: пользователи, подписки, счётчики комнат, ноды, комнаты.
+
+Базы, созданные ещё через Base.metadata.create_all, уже содержат эти
+таблицы — checkfirst пропускает существующие и досоздаёт недостающие.
+"""
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+)
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("email", String, nullable=False, unique=True, index=True),
+    Column("hashed_password", String, nullable=False),
+    Column("max_rooms", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+Table(
+    "user_room_usage",
+    metadata,
+    Column("user_id", String, ForeignKey("users.id"), primary_key=True),
+    Column("active_rooms", Integer, nullable=False),
+    Column("room_limit", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+Table(
+    "user_subscriptions",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("user_id", String, ForeignKey("users.id"), nullable=False),
+    Column("room_count", Integer, nullable=False),
+    Column("status", String, nullable=False),
+    Column("provider", String, nullable=False),
+    Column("external_id", String, nullable=True),
+    Column("amount_rub", Integer, nullable=False),
+    Column("description", String, nullable=True),
+    Column("created_at", DateTime, nullable=False),
+)
+
+Table(
+    "server_nodes",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("base_url", String, nullable=False),
+    Column("api_key_hash", String, nullable=True),
+    Column("status", Enum("ACTIVE", "DISABLED", "OFFLINE", name="nodestatus"), nullable=False),
+    Column("max_rooms", Integer, nullable=False),
+    Column("active_rooms", Integer, nullable=False),
+    Column("last_heartbeat", DateTime, nullable=True),
+    Column("cpu_load", Float, nullable=True),
+    Column("mem_load", Float, nullable=True),
+    Column("created_at", DateTime, nullable=False),
+)
+
+Table(
+    "rooms",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("code", String, nullable=False, unique=True, index=True),
+    Column("title", String, nullable=True),
+    Column("owner_id", String, ForeignKey("users.id"), nullable=False),
+    Column("node_id", String, ForeignKey("server_nodes.id"), nullable=False),
+    Column("max_participants", Integer, nullable=False),
+    Column("status", Enum("ACTIVE", "SCHEDULED", "CLOSED", name="roomstatus"), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("is_deleted", Boolean, nullable=False),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    metadata.create_all(conn, checkfirst=True)
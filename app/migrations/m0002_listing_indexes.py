@@ -0,0 +1,37 @@
+"""
+Индексы для листингов: комнаты владельца (/rooms/my, лимит комнат),
+комнаты ноды (/nodes/{id}/rooms) и ноды по (created_at, id) для /nodes/.
+"""
+
+from sqlalchemy import Boolean, Column, DateTime, Index, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+rooms = Table(
+    "rooms",
+    metadata,
+    Column("owner_id", String),
+    Column("node_id", String),
+    Column("is_deleted", Boolean),
+    Column("status", String),
+    Column("created_at", DateTime),
+)
+
+server_nodes = Table(
+    "server_nodes",
+    metadata,
+    Column("id", String),
+    Column("created_at", DateTime),
+)
+
+indexes = [
+    Index("ix_rooms_owner_listing", rooms.c.owner_id, rooms.c.is_deleted, rooms.c.status, rooms.c.created_at),
+    Index("ix_rooms_node_id", rooms.c.node_id),
+    Index("ix_server_nodes_created_at_id", server_nodes.c.created_at, server_nodes.c.id),
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for index in indexes:
+        index.create(conn, checkfirst=True)
@@ -0,0 +1,39 @@
+"""
+Входящая очередь событий платёжного провайдера (billing_inbox) и индекс
+по external_id подписок для проверки уже применённых платежей.
+"""
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text, UniqueConstraint
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+billing_inbox = Table(
+    "billing_inbox",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("provider", String, nullable=False),
+    Column("event", String, nullable=False),
+    Column("external_id", String, nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("status", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("error", String, nullable=True),
+    Column("received_at", DateTime, nullable=False),
+    Column("processed_at", DateTime, nullable=True),
+    UniqueConstraint("provider", "event", "external_id", name="uq_billing_inbox_event"),
+    Index("ix_billing_inbox_status_received", "status", "received_at"),
+)
+
+user_subscriptions = Table(
+    "user_subscriptions",
+    metadata,
+    Column("external_id", String),
+)
+
+subscription_external_id = Index("ix_user_subscriptions_external_id", user_subscriptions.c.external_id)
+
+
+def upgrade(conn: Connection) -> None:
+    billing_inbox.create(conn, checkfirst=True)
+    subscription_external_id.create(conn, checkfirst=True)
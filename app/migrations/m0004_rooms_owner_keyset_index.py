@@ -0,0 +1,32 @@
+"""
+Индекс комнат владельца под keyset-пагинацию /rooms/my.
+
+В ix_rooms_owner_listing между (owner_id, is_deleted) и created_at стоял
+status, по которому листинг не фильтрует, поэтому ORDER BY created_at, id
+сортировался отдельно по всем комнатам пользователя. Новый индекс отдаёт
+строки уже в нужном порядке; подсчёту незакрытых комнат (редкий, при
+заведении счётчиков) хватает его же префикса.
+"""
+
+from sqlalchemy import Boolean, Column, DateTime, Index, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+rooms = Table(
+    "rooms",
+    metadata,
+    Column("id", String),
+    Column("owner_id", String),
+    Column("is_deleted", Boolean),
+    Column("status", String),
+    Column("created_at", DateTime),
+)
+
+old_index = Index("ix_rooms_owner_listing", rooms.c.owner_id, rooms.c.is_deleted, rooms.c.status, rooms.c.created_at)
+new_index = Index("ix_rooms_owner_created_id", rooms.c.owner_id, rooms.c.is_deleted, rooms.c.created_at, rooms.c.id)
+
+
+def upgrade(conn: Connection) -> None:
+    new_index.create(conn, checkfirst=True)
+    old_index.drop(conn, checkfirst=True)
@@ -11,6 +11,9 @@ from sqlalchemy import (
     ForeignKey,
     Boolean,
     Float,
+    Index,
+    Text,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
@@ -46,6 +49,25 @@ class User(Base):
     subscriptions = relationship("UserSubscription", back_populates="user")
 
 
+class UserRoomUsage(Base):
+    """
+    Счётчики пользователя для проверки лимита за O(1): обновляются в той же
+    транзакции, что создание/закрытие комнат и запись подписок.
+    Сверка с фактическими данными — crud.check_room_usage.
+    """
+
+    __tablename__ = "user_room_usage"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+
+    # сколько незакрытых комнат у пользователя
+    active_rooms = Column(Integer, default=0, nullable=False)
+    # сумма room_count активных подписок
+    room_limit = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 class UserSubscription(Base):
     __tablename__ = "user_subscriptions"
 
@@ -60,7 +82,7 @@ class UserSubscription(Base):
 
     # Данные платёжного провайдера (ЮKassa и т.д.)
     provider = Column(String, default="yookassa", nullable=False)
-    external_id = Column(String, nullable=True)  # payment_id или subscription_id
+    external_id = Column(String, nullable=True, index=True)  # payment_id или subscription_id
 
     # Финансовые данные
     amount_rub = Column(Integer, default=0, nullable=False)
@@ -71,6 +93,37 @@ class UserSubscription(Base):
     user = relationship("User", back_populates="subscriptions")
 
 
+class BillingEvent(Base):
+    """
+    Входящее событие платёжного провайдера (inbox). Webhook только
+    записывает его и сразу отвечает; применяет события пачками фоновый
+    обработчик app/billing_inbox.py. Повтор того же события провайдером
+    отсекается уникальным ключом (provider, event, external_id).
+    """
+
+    __tablename__ = "billing_inbox"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    provider = Column(String, nullable=False)
+    event = Column(String, nullable=False)  # например, payment.succeeded
+    external_id = Column(String, nullable=False)  # id объекта у провайдера (payment_id)
+    payload = Column(Text, nullable=False)  # тело webhook как пришло
+
+    # pending / applied / ignored / failed
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("provider", "event", "external_id", name="uq_billing_inbox_event"),
+        # выборка очереди обработчиком
+        Index("ix_billing_inbox_status_received", "status", "received_at"),
+    )
+
+
 class ServerNode(Base):
     __tablename__ = "server_nodes"
 
@@ -94,6 +147,11 @@ class ServerNode(Base):
 
     rooms = relationship("Room", back_populates="node")
 
+    __table_args__ = (
+        # листинг /nodes/ по (created_at, id)
+        Index("ix_server_nodes_created_at_id", "created_at", "id"),
+    )
+
 
 class Room(Base):
     __tablename__ = "rooms"
@@ -106,7 +164,7 @@ class Room(Base):
     owner_id = Column(String, ForeignKey("users.id"), nullable=False)
     owner = relationship("User", back_populates="rooms")
 
-    node_id = Column(String, ForeignKey("server_nodes.id"), nullable=False)
+    node_id = Column(String, ForeignKey("server_nodes.id"), nullable=False, index=True)
     node = relationship("ServerNode", back_populates="rooms")
 
     max_participants = Column(Integer, default=20, nullable=False)
@@ -114,3 +172,9 @@ class Room(Base):
 
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     is_deleted = Column(Boolean, default=False, nullable=False)
+
+    __table_args__ = (
+        # комнаты владельца: листинг /rooms/my в порядке (created_at, id) без
+        # сортировки и подсчёт незакрытых комнат
+        Index("ix_rooms_owner_created_id", "owner_id", "is_deleted", "created_at", "id"),
+    )
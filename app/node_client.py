@@ -0,0 +1,34 @@
+import httpx
+
+from .config import settings
+
+
+def _post(url: str, json: dict | None = None) -> None:
+    try:
+        with httpx.Client(timeout=settings.NODE_REQUEST_TIMEOUT_SECONDS) as client:
+            client.post(url, json=json).raise_for_status()
+    except Exception as e:
+        # нода подтянет комнату сама при очередной сверке через /nodes/{id}/rooms
+        print(f"Node request {url} failed: {e}")
+
+
+def start_room_on_node(base_url: str, code: str, title: str | None, max_participants: int) -> None:
+    """Регистрируем комнату на ноде, чтобы та начала пускать в неё участников."""
+    _post(
+        f"{base_url.rstrip('/')}/rooms/{code}/start",
+        json={"title": title, "max_participants": max_participants},
+    )
+
+
+def start_rooms_on_nodes(rooms: list[tuple[str, str, str | None, int]]) -> None:
+    """
+    Регистрация пачки комнат одним HTTP-клиентом: (base_url, code, title, max_participants).
+    Запросы идут по одному на комнату — супервизор ноды маршрутизирует их по коду в нужный воркер.
+    """
+    with httpx.Client(timeout=settings.NODE_REQUEST_TIMEOUT_SECONDS) as client:
+        for base_url, code, title, max_participants in rooms:
+            url = f"{base_url.rstrip('/')}/rooms/{code}/start"
+            try:
+                client.post(url, json={"title": title, "max_participants": max_participants}).raise_for_status()
+            except Exception as e:
+                print(f"Node request {url} failed: {e}")
@@ -0,0 +1,70 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict
+
+
+@dataclass
+class NodeStream:
+    """
+    Состояние ноды, собранное из кадров её постоянного канала:
+    snapshot задаёт всё целиком, delta — только изменившиеся поля.
+    """
+
+    node_id: str
+    state: dict = field(default_factory=dict)
+    # code -> число участников (только активные комнаты)
+    rooms: Dict[str, int] = field(default_factory=dict)
+    connected_at: datetime = field(default_factory=datetime.utcnow)
+    messages: int = 0
+    bytes: int = 0
+
+    def apply(self, message: dict, size: int) -> None:
+        self.messages += 1
+        self.bytes += size
+
+        if message.get("type") == "snapshot":
+            self.state = dict(message.get("state") or {})
+            self.rooms = dict(message.get("rooms") or {})
+            return
+
+        self.state.update(message.get("state") or {})
+        self.rooms.update(message.get("rooms") or {})
+        for code in message.get("rooms_gone") or ():
+            self.rooms.pop(code, None)
+
+
+class NodeStreamRegistry:
+    def __init__(self) -> None:
+        self._streams: Dict[str, NodeStream] = {}
+        self.total_messages = 0
+        self.total_bytes = 0
+
+    def open(self, node_id: str) -> NodeStream:
+        # переподключение ноды заменяет старый поток
+        stream = NodeStream(node_id=node_id)
+        self._streams[node_id] = stream
+        return stream
+
+    def close(self, stream: NodeStream) -> None:
+        if self._streams.get(stream.node_id) is stream:
+            del self._streams[stream.node_id]
+        self.total_messages += stream.messages
+        self.total_bytes += stream.bytes
+
+    def snapshot(self) -> dict:
+        return {
+            "connected": len(self._streams),
+            "messages": self.total_messages + sum(s.messages for s in self._streams.values()),
+            "bytes": self.total_bytes + sum(s.bytes for s in self._streams.values()),
+            "nodes": {
+                node_id: {
+                    "connected_at": stream.connected_at.isoformat(),
+                    "messages": stream.messages,
+                    "rooms": len(stream.rooms),
+                }
+                for node_id, stream in self._streams.items()
+            },
+        }
+
+
+node_streams = NodeStreamRegistry()
@@ -0,0 +1,52 @@
+"""
+Keyset-пагинация листингов.
+
+Страница — не OFFSET, а "строки после последней показанной" по тому же
+порядку сортировки (created_at, id), поэтому глубина листинга не влияет на
+стоимость запроса, а вставки между запросами не сдвигают страницы. Курсор
+для клиента непрозрачен: base64 от JSON с ключом последней строки. Курсор
+следующей страницы отдаётся в заголовке X-Next-Cursor; нет заголовка —
+страница последняя. Тело ответа остаётся прежним списком.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import List, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+# ключ строки для курсора: (created_at, id)
+Key = Tuple[datetime, str]
+
+
+def encode_cursor(key: Key) -> str:
+    created_at, row_id = key
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Key:
+    """Ключ из курсора; испорченный курсор — 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from exc
+
+
+def paginate(response: Response, rows: Sequence[T], limit: int) -> List[T]:
+    """
+    rows — результат запроса с LIMIT limit + 1: лишняя строка означает, что
+    есть следующая страница. Возвращает саму страницу и ставит заголовок.
+    """
+    page = list(rows[:limit])
+    if len(rows) > limit:
+        last = page[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor((last.created_at, last.id))
+    return page
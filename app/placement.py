@@ -0,0 +1,399 @@
+"""
+Индекс свободной ёмкости нод для размещения комнат.
+
+Вместо ORDER BY по server_nodes на каждое создание комнаты процесс держит
+в памяти кучу активных нод с ключом «занято комнат» (та же стратегия, что
+была в SQL: наименее загруженная нода, у которой есть место). Изменение
+ноды не ищет её старую запись в куче — кладётся новая запись с новой
+версией, а устаревшие выбрасываются при извлечении. Выбор ноды — O(log n).
+
+Занятое место = сколько комнат нода сама сообщила в heartbeat + наши
+неподтверждённые резервы. Резерв ставится атомарно (под блокировкой) в
+момент выбора ноды и живёт PLACEMENT_RESERVATION_TTL_SECONDS: как только
+нода сообщит код комнаты среди своих активных, резерв подтверждён и
+снимается, потому что комната уже входит в её собственный счётчик. Так
+параллельные создания комнат не переполняют ноду, а heartbeat больше не
+затирает только что выданные места.
+
+Порядок нод задаёт стратегия PLACEMENT_STRATEGY (см. SCORERS): чем меньше
+оценка, тем охотнее нода получает комнату. p2c не держит порядок вовсе:
+берёт две случайные ноды с местом и отдаёт комнату менее загруженной —
+так свежая, но ещё не дошедшая до нас загрузка не собирает все новые
+комнаты на одной «лучшей» ноде.
+
+Нода, от которой PLACEMENT_NODE_STALE_AFTER_SECONDS нет heartbeat-а,
+помечается OFFLINE и перестаёт получать комнаты; первый же heartbeat
+возвращает её в ACTIVE. Выключенные вручную (DISABLED) ноды сами не
+включаются.
+
+Индекс живёт в памяти одного процесса control-plane.
+"""
+
+import asyncio
+import heapq
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .config import settings
+from .models import NodeStatus
+from .room_nodes import room_node_cache
+
+
+@dataclass
+class NodeCapacity:
+    node_id: str
+    max_rooms: int
+    status: NodeStatus = NodeStatus.ACTIVE
+    # сколько активных комнат нода сообщила в последнем heartbeat
+    reported: int = 0
+    # code -> когда истекает резерв (time.monotonic)
+    pending: Dict[str, float] = field(default_factory=dict)
+    version: int = 0
+
+    # последняя загрузка из heartbeat
+    participants: Optional[int] = None
+    cpu_load: Optional[float] = None
+    mem_load: Optional[float] = None
+    loop_lag_ms: Optional[float] = None
+    # когда был последний heartbeat (time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+
+    @property
+    def used(self) -> int:
+        return self.reported + len(self.pending)
+
+    @property
+    def free(self) -> int:
+        return self.max_rooms - self.used
+
+    @property
+    def eligible(self) -> bool:
+        return self.status == NodeStatus.ACTIVE and self.free > 0
+
+
+# ---------- Оценки нод (меньше — лучше) ----------
+
+def score_least_rooms(node: NodeCapacity) -> float:
+    """Прежняя стратегия: меньше всего занятых комнат."""
+    return node.used
+
+
+def score_weighted_load(node: NodeCapacity) -> float:
+    """Взвешенная сумма заполненности по комнатам, CPU, памяти и задержки цикла событий."""
+    score = settings.PLACEMENT_WEIGHT_ROOMS * node.used / max(node.max_rooms, 1)
+    if node.cpu_load is not None:
+        score += settings.PLACEMENT_WEIGHT_CPU * node.cpu_load / 100
+    if node.mem_load is not None:
+        score += settings.PLACEMENT_WEIGHT_MEM * node.mem_load / 100
+    if node.loop_lag_ms is not None:
+        score += settings.PLACEMENT_WEIGHT_LOOP_LAG * min(node.loop_lag_ms / settings.PLACEMENT_LOOP_LAG_CEILING_MS, 1.0)
+    return score
+
+
+def score_participant_weighted(node: NodeCapacity) -> float:
+    """
+    Заполненность по участникам, а не по комнатам: комната на 40 человек
+    весит больше пустой. Ещё не подтверждённая комната считается
+    PLACEMENT_ROOM_PARTICIPANTS_ESTIMATE участниками.
+    """
+    estimate = settings.PLACEMENT_ROOM_PARTICIPANTS_ESTIMATE
+    expected = (node.participants or 0) + len(node.pending) * estimate
+    return expected / max(node.max_rooms * estimate, 1)
+
+
+SCORERS: Dict[str, Callable[[NodeCapacity], float]] = {
+    "least_rooms": score_least_rooms,
+    "weighted_load": score_weighted_load,
+    "participant_weighted": score_participant_weighted,
+    # p2c сравнивает две случайные ноды по взвешенной загрузке
+    "p2c": score_weighted_load,
+}
+
+
+class CapacityIndex:
+    def __init__(self, reservation_ttl: float, strategy: str, stale_after: float) -> None:
+        self.reservation_ttl = reservation_ttl
+        self.strategy = strategy
+        self.score = SCORERS[strategy]
+        self.two_choices = strategy == "p2c"
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, NodeCapacity] = {}
+        # (оценка, node_id, версия) — только ноды со свободным местом
+        self._heap: List[Tuple[float, str, int]] = []
+        # ноды со свободным местом для p2c: список + позиция в нём
+        self._eligible: List[NodeCapacity] = []
+        self._eligible_pos: Dict[str, int] = {}
+        # (истекает, node_id, code)
+        self._leases: List[Tuple[float, str, str]] = []
+        self._loaded = False
+
+        # смены статуса, ещё не записанные в БД
+        self._went_offline: Set[str] = set()
+        self._recovered: Set[str] = set()
+
+        self.reserved = 0
+        self.confirmed = 0
+        self.expired = 0
+
+    # ---------- наполнение ----------
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._loaded:
+            return
+        nodes = list(db.scalars(select(models.ServerNode)))
+        now, utcnow = time.monotonic(), datetime.utcnow()
+        with self._lock:
+            if self._loaded:
+                return
+            for node in nodes:
+                entry = self._upsert(node.id, node.max_rooms, node.status, node.active_rooms)
+                entry.cpu_load, entry.mem_load = node.cpu_load, node.mem_load
+                # без heartbeat-а с момента старта control-plane ноде даётся полный срок
+                if node.last_heartbeat is not None:
+                    entry.last_seen = now - (utcnow - node.last_heartbeat).total_seconds()
+                self._touch(entry)
+            self._loaded = True
+
+    def upsert_node(self, node: models.ServerNode) -> None:
+        """Нода создана или изменена через API (статус, max_rooms)."""
+        with self._lock:
+            self._upsert(node.id, node.max_rooms, node.status, None)
+
+    def _upsert(self, node_id: str, max_rooms: int, status: NodeStatus, reported: Optional[int]) -> NodeCapacity:
+        entry = self._nodes.get(node_id)
+        if entry is None:
+            entry = self._nodes[node_id] = NodeCapacity(node_id=node_id, max_rooms=max_rooms)
+        entry.max_rooms = max_rooms
+        entry.status = status
+        if reported is not None:
+            entry.reported = reported
+        self._touch(entry)
+        return entry
+
+    def _touch(self, entry: NodeCapacity) -> None:
+        # старая запись в куче станет невалидной по версии
+        entry.version += 1
+        eligible = entry.eligible
+        self._set_eligible(entry, eligible)
+        if self.two_choices:
+            return
+        if eligible:
+            heapq.heappush(self._heap, (self.score(entry), entry.node_id, entry.version))
+        if len(self._heap) > 2 * len(self._nodes) + 64:
+            self._compact()
+
+    def _set_eligible(self, entry: NodeCapacity, eligible: bool) -> None:
+        pos = self._eligible_pos.get(entry.node_id)
+        if eligible and pos is None:
+            self._eligible_pos[entry.node_id] = len(self._eligible)
+            self._eligible.append(entry)
+        elif not eligible and pos is not None:
+            # O(1): на место удаляемой ставим последнюю
+            last = self._eligible.pop()
+            del self._eligible_pos[entry.node_id]
+            if last is not entry:
+                self._eligible[pos] = last
+                self._eligible_pos[last.node_id] = pos
+
+    def _compact(self) -> None:
+        """Heartbeat-ы постоянно добавляют записи; устаревшие периодически вычищаем."""
+        self._heap = [(self.score(e), e.node_id, e.version) for e in self._eligible]
+        heapq.heapify(self._heap)
+
+    # ---------- размещение ----------
+
+    def reserve(self, code: str) -> Optional[str]:
+        """Выбрать ноду и занять на ней место под комнату code. None — мест нет."""
+        placed = self.reserve_many([code])
+        return placed[0] if placed else None
+
+    def reserve_many(self, codes: List[str]) -> Optional[List[str]]:
+        """
+        Разместить сразу несколько комнат за один проход под одной блокировкой;
+        каждая следующая видит резервы предыдущих, поэтому комнаты расходятся
+        по нодам. Всё или ничего: если мест на все не хватило, резервы снимаются.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            placed: List[NodeCapacity] = []
+            for code in codes:
+                entry = self._pick_two_choices() if self.two_choices else self._pick_best()
+                if entry is None:
+                    for taken, taken_code in zip(placed, codes):
+                        del taken.pending[taken_code]
+                        self._touch(taken)
+                    return None
+                expires = now + self.reservation_ttl
+                entry.pending[code] = expires
+                heapq.heappush(self._leases, (expires, entry.node_id, code))
+                self._touch(entry)
+                placed.append(entry)
+            self.reserved += len(placed)
+            return [entry.node_id for entry in placed]
+
+    def _pick_best(self) -> Optional[NodeCapacity]:
+        while self._heap:
+            _, node_id, version = heapq.heappop(self._heap)
+            entry = self._nodes.get(node_id)
+            if entry is not None and entry.version == version:
+                return entry
+        return None
+
+    def _pick_two_choices(self) -> Optional[NodeCapacity]:
+        if len(self._eligible) <= 1:
+            return self._eligible[0] if self._eligible else None
+        first, second = random.sample(self._eligible, 2)
+        return first if self.score(first) <= self.score(second) else second
+
+    def release(self, node_id: str, code: str) -> None:
+        """Комната не создалась или закрыта — резерв больше не нужен."""
+        with self._lock:
+            entry = self._nodes.get(node_id)
+            if entry is not None and entry.pending.pop(code, None) is not None:
+                self._touch(entry)
+
+    def report(self, node_id: str, hb: schemas.ServerNodeHeartbeat, room_codes: Optional[Iterable[str]]) -> None:
+        """
+        Heartbeat ноды. Резервы под комнаты, которые нода уже сообщила,
+        подтверждаются: их место теперь учтено в active_rooms самой ноды.
+        Нода без room_codes (старая версия) резервы не подтверждает — они истекут по TTL.
+        """
+        with self._lock:
+            entry = self._nodes.get(node_id)
+            if entry is None:
+                return
+            entry.reported = hb.active_rooms
+            entry.participants = hb.participants
+            entry.cpu_load = hb.cpu_load
+            entry.mem_load = hb.mem_load
+            entry.loop_lag_ms = hb.loop_lag_ms
+            entry.last_seen = time.monotonic()
+            if entry.status == NodeStatus.OFFLINE:
+                entry.status = NodeStatus.ACTIVE
+                self._went_offline.discard(node_id)
+                self._recovered.add(node_id)
+            if room_codes is not None and entry.pending:
+                for code in set(room_codes).intersection(entry.pending):
+                    del entry.pending[code]
+                    self.confirmed += 1
+            self._touch(entry)
+
+    def _expire(self, now: float) -> None:
+        while self._leases and self._leases[0][0] <= now:
+            expires, node_id, code = heapq.heappop(self._leases)
+            entry = self._nodes.get(node_id)
+            # резерв могли уже подтвердить или выдать заново с новым сроком
+            if entry is not None and entry.pending.get(code) == expires:
+                del entry.pending[code]
+                self.expired += 1
+                self._touch(entry)
+
+    # ---------- протухшие ноды ----------
+
+    def sweep(self) -> Tuple[List[str], List[str]]:
+        """
+        Пометить OFFLINE ноды без свежего heartbeat-а. Возвращает смены
+        статуса, накопленные с прошлого вызова: (ушли в OFFLINE, вернулись).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            for entry in self._nodes.values():
+                if entry.status == NodeStatus.ACTIVE and now - entry.last_seen > self.stale_after:
+                    entry.status = NodeStatus.OFFLINE
+                    self._recovered.discard(entry.node_id)
+                    self._went_offline.add(entry.node_id)
+                    self._touch(entry)
+            went_offline, recovered = list(self._went_offline), list(self._recovered)
+            self._went_offline, self._recovered = set(), set()
+            return went_offline, recovered
+
+    def requeue_status(self, went_offline: List[str], recovered: List[str]) -> None:
+        """Запись в БД не удалась — повторим при следующем проходе."""
+        with self._lock:
+            self._went_offline.update(went_offline)
+            self._recovered.update(recovered)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return {
+                "strategy": self.strategy,
+                "reserved": self.reserved,
+                "confirmed": self.confirmed,
+                "expired": self.expired,
+                "heap_size": len(self._heap),
+                "nodes": {
+                    node_id: {
+                        "status": entry.status.value,
+                        "max_rooms": entry.max_rooms,
+                        "reported": entry.reported,
+                        "pending": len(entry.pending),
+                        "free": entry.free,
+                        "score": round(self.score(entry), 4),
+                        "seconds_since_heartbeat": round(now - entry.last_seen, 1),
+                    }
+                    for node_id, entry in self._nodes.items()
+                },
+            }
+
+
+capacity = CapacityIndex(
+    settings.PLACEMENT_RESERVATION_TTL_SECONDS,
+    settings.PLACEMENT_STRATEGY,
+    settings.PLACEMENT_NODE_STALE_AFTER_SECONDS,
+)
+
+_nodes = models.ServerNode.__table__
+
+
+def persist_status(engine: Engine) -> None:
+    went_offline, recovered = capacity.sweep()
+    if not went_offline and not recovered:
+        return
+    try:
+        with engine.begin() as conn:
+            # условие по текущему статусу: не трогаем ноды, которые админ успел выключить
+            if went_offline:
+                conn.execute(
+                    update(_nodes)
+                    .where(_nodes.c.id.in_(went_offline), _nodes.c.status == NodeStatus.ACTIVE)
+                    .values(status=NodeStatus.OFFLINE)
+                )
+            if recovered:
+                conn.execute(
+                    update(_nodes)
+                    .where(_nodes.c.id.in_(recovered), _nodes.c.status == NodeStatus.OFFLINE)
+                    .values(status=NodeStatus.ACTIVE)
+                )
+    except Exception:
+        capacity.requeue_status(went_offline, recovered)
+        raise
+    for node_id in went_offline + recovered:
+        room_node_cache.invalidate_node(node_id)
+    for node_id in went_offline:
+        print(f"Node {node_id} marked offline: no heartbeat for {capacity.stale_after:.0f}s")
+    for node_id in recovered:
+        print(f"Node {node_id} is back online")
+
+
+async def sweep_loop(engine: Engine, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(persist_status, engine)
+        except Exception as e:
+            print(f"Node sweep failed: {e}")
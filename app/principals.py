@@ -0,0 +1,112 @@
+"""
+Кэш проверенных токенов: токен -> лёгкий Principal.
+
+Без кэша каждый запрос с авторизацией проверяет подпись JWT и достаёт
+пользователя из БД. Здесь уже проверенный токен живёт до
+PRINCIPAL_CACHE_TTL_SECONDS (но не дольше срока самого токена), размер
+кэша ограничен PRINCIPAL_CACHE_MAX_SIZE с вытеснением давно не
+использованных. Когда crud меняет у пользователя поля, влияющие на
+авторизацию (max_rooms и т.п.), все его токены сбрасываются через
+invalidate_user.
+
+Кэш живёт в памяти процесса: при нескольких процессах control-plane
+изменение в одном из них в остальных проявится не позже чем через TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Кто делает запрос — без ORM-объекта и без сессии БД."""
+
+    id: str
+    email: str
+    max_rooms: int
+    created_at: datetime
+
+
+class PrincipalCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # token -> (principal, истекает по time.time())
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        # user_id -> его токены в кэше
+        self._by_user: Dict[str, Set[str]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires = entry
+            if expires <= now:
+                self._drop(token, principal.id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: Optional[float]) -> None:
+        expires = time.time() + self.ttl
+        if token_exp is not None:
+            expires = min(expires, token_exp)
+        with self._lock:
+            if token in self._entries:
+                self._entries.move_to_end(token)
+            self._entries[token] = (principal, expires)
+            self._by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                old_token, (old_principal, _) = next(iter(self._entries.items()))
+                self._drop(old_token, old_principal.id)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            tokens = self._by_user.pop(user_id, ())
+            for token in tokens:
+                self._entries.pop(token, None)
+            if tokens:
+                self.invalidations += 1
+
+    def _drop(self, token: str, user_id: str) -> None:
+        self._entries.pop(token, None)
+        tokens = self._by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user_id]
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_MAX_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
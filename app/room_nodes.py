@@ -0,0 +1,187 @@
+"""
+Кэш "код комнаты -> нода" для GET /rooms/{code}/node.
+
+Этот запрос делает каждый входящий участник, и в начале большой встречи
+сотни одинаковых запросов приходят за секунды. Ответ кэшируется в памяти
+процесса на ROOM_NODE_CACHE_TTL_SECONDS; одновременные промахи по одной
+комнате ждут один общий запрос к БД (single-flight), так что волна
+подключений ходит в БД не больше раза на комнату.
+
+Запись сбрасывается при закрытии комнаты (crud.close_room) и изменении
+ноды — адреса или статуса через PATCH /nodes и фоновую проверку
+heartbeat-ов; перенос комнаты на другую ноду должен так же вызвать
+invalidate_room. Кэш живёт в памяти процесса: при нескольких процессах
+control-plane изменение в одном из них в остальных проявится не позже
+чем через TTL.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class RoomNode:
+    room_code: str
+    node_id: str
+    # None — комната есть, а ноды нет (такой ответ не кэшируется)
+    node_base_url: Optional[str]
+
+    @property
+    def etag(self) -> str:
+        digest = hashlib.sha1(f"{self.room_code}|{self.node_id}|{self.node_base_url}".encode()).hexdigest()
+        return f'"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли If-None-Match с ETag (слабое сравнение, как требует RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+# загрузка из БД: (node_id, base_url) или None, если комнаты нет
+Loader = Callable[[], Awaitable[Optional[Tuple[str, Optional[str]]]]]
+
+
+class RoomNodeCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # записи меняются и из потоков (crud в пуле потоков, фоновая проверка нод)
+        self._lock = threading.Lock()
+        # code -> (RoomNode, истекает по time.time())
+        self._entries: "OrderedDict[str, Tuple[RoomNode, float]]" = OrderedDict()
+        # node_id -> коды её комнат в кэше
+        self._by_node: Dict[str, Set[str]] = {}
+        # растёт при каждом сбросе: загрузка, начатая до сброса, в кэш не попадает
+        self._epoch = 0
+        # code -> общий результат идущей загрузки (только из цикла событий)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, code: str) -> Optional[RoomNode]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            room_node, expires = entry
+            if expires <= now:
+                self._drop(code, room_node.node_id)
+                return None
+            self._entries.move_to_end(code)
+            self.hits += 1
+            return room_node
+
+    async def get_or_load(self, code: str, load: Loader) -> Optional[RoomNode]:
+        while True:
+            room_node = self.get(code)
+            if room_node is not None:
+                return room_node
+            future = self._inflight.get(code)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # отменили не нас, а запрос, который грузил, — грузим сами
+                if not future.cancelled():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[code] = future
+        epoch = self._epoch
+        try:
+            loaded = await load()
+            room_node = None
+            if loaded is not None:
+                node_id, base_url = loaded
+                room_node = RoomNode(room_code=code, node_id=node_id, node_base_url=base_url)
+                if base_url is not None:
+                    self._put(room_node, epoch)
+            future.set_result(room_node)
+            return room_node
+        except Exception as exc:
+            future.set_exception(exc)
+            # ошибку получат ожидающие; если их нет — не шуметь в лог
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._inflight[code]
+
+    def _put(self, room_node: RoomNode, epoch: int) -> None:
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            code = room_node.room_code
+            old = self._entries.pop(code, None)
+            if old is not None:
+                self._drop(code, old[0].node_id)
+            self._entries[code] = (room_node, time.time() + self.ttl)
+            self._by_node.setdefault(room_node.node_id, set()).add(code)
+            while len(self._entries) > self.max_size:
+                old_code, (old_room_node, _) = next(iter(self._entries.items()))
+                self._drop(old_code, old_room_node.node_id)
+                self.evictions += 1
+
+    def invalidate_room(self, code: str) -> None:
+        with self._lock:
+            self._epoch += 1
+            entry = self._entries.get(code)
+            if entry is not None:
+                self._drop(code, entry[0].node_id)
+                self.invalidations += 1
+
+    def invalidate_node(self, node_id: str) -> None:
+        with self._lock:
+            self._epoch += 1
+            codes = self._by_node.pop(node_id, ())
+            for code in codes:
+                self._entries.pop(code, None)
+            if codes:
+                self.invalidations += 1
+
+    def _drop(self, code: str, node_id: str) -> None:
+        self._entries.pop(code, None)
+        codes = self._by_node.get(node_id)
+        if codes is not None:
+            codes.discard(code)
+            if not codes:
+                del self._by_node[node_id]
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+room_node_cache = RoomNodeCache(settings.ROOM_NODE_CACHE_MAX_SIZE, settings.ROOM_NODE_CACHE_TTL_SECONDS)
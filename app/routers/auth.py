@@ -2,35 +2,37 @@ from datetime import timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
 
 from .. import crud, schemas
+from ..database import DB, run_db
 from ..deps import get_db
-from ..auth import create_access_token
+from ..auth import create_access_token, hash_password_async, verify_password_async
 from ..config import settings
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-def register_user(
+async def register_user(
     user_in: schemas.UserCreate,
-    db: Session = Depends(get_db),
+    db: DB = Depends(get_db),
 ):
-    existing = crud.get_user_by_email(db, user_in.email)
+    # хэш пароля — в пул процессов, см. auth.hash_password_async
+    existing = await run_db(db, crud.get_user_by_email, user_in.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = crud.create_user(db, user_in)
+    hashed_password = await hash_password_async(user_in.password)
+    user = await run_db(db, crud.create_user, user_in, hashed_password)
     return user
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: DB = Depends(get_db),
 ):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    user = await run_db(db, crud.get_user_by_email, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -1,11 +1,15 @@
+import json
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
 
 from yookassa import Configuration, Payment
 
+from ..billing_inbox import PROVIDER
 from ..config import settings
-from ..deps import get_db, get_current_user
-from .. import crud, models
+from ..database import DB, run_db
+from ..deps import get_db, get_current_principal
+from ..principals import Principal
+from .. import crud
 
 router = APIRouter(prefix="/billing", tags=["billing"])
 
@@ -17,8 +21,7 @@ def configure_yookassa():
 
 @router.post("/buy-room")
 def buy_room(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """
     Создать платёж в ЮKassa для покупки ещё одной комнаты.
@@ -72,50 +75,24 @@ def buy_room(
 
 
 @router.post("/yookassa/webhook")
-async def yookassa_webhook(request: Request, db: Session = Depends(get_db)):
+async def yookassa_webhook(request: Request, db: DB = Depends(get_db)):
     """
-    Webhook от ЮKassa. Здесь подтверждаем оплату и увеличиваем количество комнат.
+    Webhook от ЮKassa. Событие только записывается во входящую очередь и
+    сразу подтверждается; оплату применяет фоновый обработчик
+    (app/billing_inbox.py). Повторная доставка того же события -> "duplicate".
     """
-    configure_yookassa()
-
-    body = await request.json()
-
-    event = body.get("event")
-    obj = body.get("object", {})
-
-    # Нас интересует успешный платёж
-    if event != "payment.succeeded":
-        return {"status": "ignored"}
-
-    payment_id = obj.get("id")
-    amount_info = obj.get("amount", {})
-    metadata = obj.get("metadata") or {}
-
-    value_str = amount_info.get("value", "0.00")
     try:
-        amount_rub = int(float(value_str))
+        # UnicodeDecodeError — тоже ValueError: не-UTF-8 тело отклоняем с 400
+        raw = (await request.body()).decode("utf-8")
+        body = json.loads(raw)
     except ValueError:
-        amount_rub = 0
-
-    user_id = metadata.get("user_id")
-    purpose = metadata.get("purpose")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON")
 
-    if purpose != "buy_room" or not user_id:
+    event = body.get("event") if isinstance(body, dict) else None
+    obj = (body.get("object") or {}) if event else {}
+    external_id = obj.get("id") if isinstance(obj, dict) else None
+    if not event or not external_id:
         return {"status": "ignored"}
 
-    user = db.get(models.User, user_id)
-    if not user:
-        # Пользователь не найден — логируем, но не падаем
-        return {"status": "user_not_found"}
-
-    # Создаём запись подписки и увеличиваем max_rooms
-    description = f"Оплата {amount_rub} ₽ за доп. комнату, платёж {payment_id}"
-    crud.create_subscription_record_for_room(
-        db=db,
-        user=user,
-        external_id=payment_id,
-        amount_rub=amount_rub,
-        description=description,
-    )
-
-    return {"status": "ok"}
+    created = await run_db(db, crud.enqueue_billing_event, PROVIDER, str(event), str(external_id), raw)
+    return {"status": "accepted" if created else "duplicate"}
@@ -1,57 +1,161 @@
-from typing import List
+import json
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
 
 from .. import crud, schemas
+from ..config import settings
+from ..database import DB, open_db, run_db
 from ..deps import get_db
+from ..heartbeats import heartbeats
+from ..node_streams import node_streams
+from ..pagination import decode_cursor, paginate
+from ..serialization import NODE_LIST, NODE_ROOM_LIST, render
+from ..placement import capacity
 
 router = APIRouter(prefix="/nodes", tags=["nodes"])
 
 
 @router.post("/", response_model=schemas.ServerNodeOut, status_code=status.HTTP_201_CREATED)
-def create_node(
+async def create_node(
     data: schemas.ServerNodeCreate,
-    db: Session = Depends(get_db),
+    db: DB = Depends(get_db),
 ):
-    node = crud.create_node(db, data)
+    node = await run_db(db, crud.create_node, data)
+    heartbeats.remember(node.id)
     return node
 
 
 @router.get("/", response_model=List[schemas.ServerNodeOut])
-def list_nodes(db: Session = Depends(get_db)):
-    return crud.list_nodes(db)
+async def list_nodes(
+    response: Response,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    db: DB = Depends(get_db),
+):
+    """Ноды в порядке регистрации, по limit штук; следующая страница — по X-Next-Cursor."""
+    after = decode_cursor(cursor) if cursor else None
+    rows = paginate(response, await run_db(db, crud.list_nodes, limit + 1, after), limit)
+    nodes = [{**row._mapping, **heartbeats.overlay_values(row.id)} for row in rows]
+    return render(NODE_LIST, nodes, response)
+
+
+@router.get("/heartbeats")
+def heartbeat_stats():
+    """Сколько heartbeat-ов принято и сколько строк реально записано в БД."""
+    return heartbeats.snapshot()
+
+
+@router.get("/capacity")
+async def capacity_stats(db: DB = Depends(get_db)):
+    """Свободные места и резервы по нодам в индексе размещения."""
+    await run_db(db, capacity.ensure_loaded)
+    return capacity.snapshot()
+
+
+@router.get("/streams")
+def node_stream_stats():
+    """Сколько нод держат постоянный канал и сколько кадров/байт он принёс."""
+    return node_streams.snapshot()
 
 
 @router.get("/{node_id}", response_model=schemas.ServerNodeOut)
-def get_node(node_id: str, db: Session = Depends(get_db)):
-    node = crud.get_node(db, node_id)
+async def get_node(node_id: str, db: DB = Depends(get_db)):
+    node = await run_db(db, crud.get_node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
-    return node
+    return heartbeats.overlay(node)
+
+
+@router.get("/{node_id}/rooms", response_model=List[schemas.NodeRoomAssignment])
+async def get_node_rooms(node_id: str, db: DB = Depends(get_db)):
+    """
+    Активные комнаты, размещённые на ноде. Нода забирает их при старте и
+    затем периодически сверяется, чтобы пускать участников и в комнаты,
+    регистрация которых на ноде не дошла.
+    """
+    node = await run_db(db, crud.get_node, node_id)
+    if not node:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return render(NODE_ROOM_LIST, await run_db(db, crud.list_node_rooms, node_id))
 
 
 @router.patch("/{node_id}", response_model=schemas.ServerNodeOut)
-def update_node(
+async def update_node(
     node_id: str,
     data: schemas.ServerNodeUpdate,
-    db: Session = Depends(get_db),
+    db: DB = Depends(get_db),
 ):
-    node = crud.get_node(db, node_id)
+    node = await run_db(db, crud.get_node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
-    node = crud.update_node(db, node, data)
-    return node
+    node = await run_db(db, crud.update_node, node, data)
+    return heartbeats.overlay(node)
 
 
-@router.post("/{node_id}/heartbeat", response_model=schemas.ServerNodeOut)
-def node_heartbeat(
-    node_id: str,
-    hb: schemas.ServerNodeHeartbeat,
-    db: Session = Depends(get_db),
-):
-    node = crud.get_node(db, node_id)
-    if not node:
+async def _ensure_known(node_id: str) -> bool:
+    """Проверка по кэшу id; в БД идём только за незнакомым id."""
+    if heartbeats.is_known(node_id):
+        return True
+    if await _node_exists(node_id):
+        heartbeats.remember(node_id)
+        return True
+    return False
+
+
+@router.post("/{node_id}/heartbeat", response_model=schemas.MessageOut, status_code=status.HTTP_202_ACCEPTED)
+async def node_heartbeat(node_id: str, hb: schemas.ServerNodeHeartbeat):
+    """
+    Heartbeat только записывается в память; в server_nodes он попадёт
+    при ближайшей фоновой записи (см. app/heartbeats.py).
+    """
+    if not await _ensure_known(node_id):
         raise HTTPException(status_code=404, detail="Node not found")
-    node = crud.update_node_heartbeat(db, node, hb)
-    return node
+    heartbeats.record(node_id, hb)
+    capacity.report(node_id, hb, hb.room_codes)
+    return schemas.MessageOut(message="accepted")
+
+
+# ---------- Постоянный канал нода -> control-plane ----------
+
+# 4404: ноды с таким id нет; 1003: кадр не разобрался
+CLOSE_NODE_UNKNOWN = 4404
+CLOSE_BAD_FRAME = 1003
+
+
+async def _node_exists(node_id: str) -> bool:
+    async with open_db() as db:
+        return await run_db(db, crud.get_node, node_id) is not None
+
+
+@router.websocket("/{node_id}/stream")
+async def node_stream(node_id: str, websocket: WebSocket):
+    """
+    Нода держит этот канал вместо POST /heartbeat и шлёт только изменения
+    (см. node_service/app/uplink.py). Каждый кадр, включая пустую дельту-keepalive,
+    обновляет ноду так же, как heartbeat.
+    """
+    exists = await _ensure_known(node_id)
+    await websocket.accept()
+    if not exists:
+        await websocket.close(code=CLOSE_NODE_UNKNOWN)
+        return
+
+    stream = node_streams.open(node_id)
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                stream.apply(json.loads(text), len(text))
+                hb = schemas.ServerNodeHeartbeat(**stream.state)
+            except (ValueError, TypeError, ValidationError) as e:
+                print(f"Bad stream frame from node {node_id}: {e}")
+                await websocket.close(code=CLOSE_BAD_FRAME)
+                return
+            heartbeats.record(node_id, hb)
+            capacity.report(node_id, hb, stream.rooms.keys())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        node_streams.close(stream)
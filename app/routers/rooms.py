@@ -1,11 +1,16 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response, status
 
-from .. import crud, models, schemas
+from .. import crud, node_client, schemas
+from ..config import settings
 from ..crud import NodeUnavailable, RoomLimitExceeded
-from ..deps import get_db, get_current_user
+from ..database import DB, open_db, run_db
+from ..deps import get_db, get_current_principal
+from ..pagination import decode_cursor, paginate
+from ..principals import Principal
+from ..room_nodes import etag_matches, room_node_cache
+from ..serialization import ROOM_LIST, render
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
 
@@ -16,14 +21,20 @@ router = APIRouter(prefix="/rooms", tags=["rooms"])
 
 
 @router.get("/my", response_model=List[schemas.RoomOut])
-def get_my_rooms(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+async def get_my_rooms(
+    response: Response,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    db: DB = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """
-    Возвращает список комнат, созданных текущим пользователем.
+    Возвращает комнаты, созданные текущим пользователем, новые первыми,
+    по limit штук. Курсор следующей страницы — в заголовке X-Next-Cursor.
     """
-    return crud.list_user_rooms(db, current_user)
+    before = decode_cursor(cursor) if cursor else None
+    rooms = await run_db(db, crud.list_user_rooms, current_user, limit + 1, before)
+    return render(ROOM_LIST, paginate(response, rooms, limit), response)
 
 
 # ------------------------
@@ -32,16 +43,18 @@ def get_my_rooms(
 
 
 @router.post("/", response_model=schemas.RoomOut)
-def create_room(
+async def create_room(
     room_in: schemas.RoomCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    db: DB = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """
     Создать комнату, соблюдая лимиты подписки.
+    Нода узнаёт о комнате уже после ответа клиенту (фоновая задача).
     """
     try:
-        return crud.create_room(db, room_in, current_user)
+        room = await run_db(db, crud.create_room, room_in, current_user)
     except RoomLimitExceeded as exc:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -53,6 +66,54 @@ def create_room(
             detail=str(exc),
         ) from exc
 
+    node = await run_db(db, crud.get_node, room.node_id)
+    background_tasks.add_task(
+        node_client.start_room_on_node,
+        node.base_url,
+        room.code,
+        room.title,
+        room.max_participants,
+    )
+    return room
+
+
+@router.post("/batch", response_model=List[schemas.RoomOut], status_code=status.HTTP_201_CREATED)
+async def create_rooms_batch(
+    batch: schemas.RoomBatchCreate,
+    background_tasks: BackgroundTasks,
+    db: DB = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """
+    Создать сразу несколько комнат одной транзакцией: лимит подписки
+    проверяется на всю пачку, комнаты распределяются по нодам за один проход.
+    """
+    if len(batch.rooms) > settings.ROOM_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {settings.ROOM_BATCH_MAX} комнат за один запрос",
+        )
+
+    try:
+        rooms = await run_db(db, crud.create_rooms, batch.rooms, current_user)
+    except RoomLimitExceeded as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+    except NodeUnavailable as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(exc),
+        ) from exc
+
+    nodes = {node.id: node for node in await run_db(db, crud.get_nodes, {room.node_id for room in rooms})}
+    background_tasks.add_task(
+        node_client.start_rooms_on_nodes,
+        [(nodes[room.node_id].base_url, room.code, room.title, room.max_participants) for room in rooms],
+    )
+    return rooms
+
 
 # ------------------------
 # Информация о комнате по коду
@@ -60,16 +121,16 @@ def create_room(
 
 
 @router.get("/{code}", response_model=schemas.RoomOut)
-def get_room_by_code(
+async def get_room_by_code(
     code: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: DB = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """
     Получить информацию о комнате по её коду.
     Используется в основном ведущим (владелец комнаты).
     """
-    room = crud.get_room_by_code(db, code)
+    room = await run_db(db, crud.get_room_by_code, code)
     if not room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -89,34 +150,47 @@ def get_room_by_code(
 
 
 @router.get("/{code}/node", response_model=schemas.RoomNodeInfo)
-def get_room_node(
+async def get_room_node(
     code: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Возвращает URL медиасервера, к которому нужно подключаться клиентам,
     и код комнаты.
 
     Логика:
-    - находим комнату по коду;
-    - возвращаем информацию о ноде, на которой размещена комната.
+    - берём ноду комнаты из кэша (см. app/room_nodes.py), при промахе —
+      одним запросом к БД, общим для одновременных запросов по этой комнате;
+    - отдаём ETag: повторный запрос с If-None-Match получает 304 без тела.
     """
-    room = crud.get_room_by_code(db, code)
-    if not room:
+
+    async def load():
+        async with open_db() as db:
+            return await run_db(db, crud.get_room_node, code)
+
+    room_node = await room_node_cache.get_or_load(code, load)
+    if room_node is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Комната не найдена",
         )
 
-    node = room.node or db.get(models.ServerNode, room.node_id)
-
-    if not node:
+    if room_node.node_base_url is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Не удалось подобрать сервер для комнаты",
         )
 
+    headers = {
+        "ETag": room_node.etag,
+        "Cache-Control": f"public, max-age={settings.ROOM_NODE_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(if_none_match, room_node.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
     return schemas.RoomNodeInfo(
-        node_base_url=node.base_url,
-        room_code=room.code,
+        node_base_url=room_node.node_base_url,
+        room_code=room_node.room_code,
     )
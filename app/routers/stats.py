@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+
+from ..billing_inbox import billing_inbox
+from ..principals import principal_cache
+from ..room_nodes import room_node_cache
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/caches")
+def cache_stats():
+    """Размер и доля попаданий внутрипроцессных кэшей control-plane."""
+    return {
+        "principals": principal_cache.snapshot(),
+        "room_nodes": room_node_cache.snapshot(),
+    }
+
+
+@router.get("/billing-inbox")
+def billing_inbox_stats():
+    """Счётчики фонового применения платёжных событий."""
+    return billing_inbox.snapshot()
@@ -1,19 +1,21 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
 
-from .. import crud, schemas, models
-from ..deps import get_db, get_current_user
+from .. import crud, schemas
+from ..database import DB, run_db
+from ..deps import get_db, get_current_principal
+from ..principals import Principal
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/me", response_model=schemas.UserProfile)
-def get_me(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+async def get_me(
+    db: DB = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    current_rooms = crud.get_user_active_room_count(db, current_user)
-    limit = crud.get_user_active_room_limit(db, current_user)
+    usage = await run_db(db, crud.get_room_usage, current_user)
+    current_rooms = usage.active_rooms
+    limit = usage.room_limit
 
     return schemas.UserProfile(
         id=current_user.id,
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import AnyHttpUrl, BaseModel, ConfigDict, EmailStr, constr, field_validator
+from pydantic import AnyHttpUrl, BaseModel, ConfigDict, EmailStr, Field, constr, field_validator
 from .models import NodeStatus, RoomStatus
 
 
@@ -56,6 +56,8 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     user_id: str | None = None
     email: str | None = None
+    # срок действия токена (unix time) — до него можно кэшировать проверку
+    exp: int | None = None
 
 
 
@@ -78,6 +80,14 @@ class RoomCreate(RoomBase):
     pass
 
 
+class RoomBatchCreate(BaseModel):
+    """
+    Пакетное создание комнат (например, под мероприятие): все или ни одной.
+    """
+
+    rooms: List[RoomCreate] = Field(min_length=1)
+
+
 class RoomUpdate(BaseModel):
     title: Optional[str] = None
     max_participants: Optional[int] = None
@@ -139,8 +149,31 @@ class ServerNodeHeartbeat(BaseModel):
     """
 
     active_rooms: int
+    participants: Optional[int] = None
+    # коды активных комнат ноды — подтверждают резервы мест (см. app/placement.py)
+    room_codes: Optional[List[str]] = None
+    # загрузка хоста, %
     cpu_load: Optional[float] = None
     mem_load: Optional[float] = None
+    # процесс(ы) ноды: CPU в % одного ядра, RSS, открытые сокеты
+    process_cpu: Optional[float] = None
+    rss_bytes: Optional[int] = None
+    open_sockets: Optional[int] = None
+    # задержка цикла событий ноды, мс (сглаженная и худшая за интервал)
+    loop_lag_ms: Optional[float] = None
+    loop_lag_max_ms: Optional[float] = None
+
+
+class NodeRoomAssignment(BaseModel):
+    """
+    Комната, которую нода должна обслуживать (нода забирает список при старте).
+    """
+
+    code: str
+    title: Optional[str] = None
+    max_participants: int
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ServerNodeOut(BaseModel):
@@ -159,6 +192,10 @@ class ServerNodeOut(BaseModel):
     last_heartbeat: Optional[datetime] = None
     created_at: datetime
 
+    # не хранятся в БД — только из последнего heartbeat в памяти процесса
+    participants: Optional[int] = None
+    loop_lag_ms: Optional[float] = None
+
     model_config = ConfigDict(from_attributes=True)
 
 
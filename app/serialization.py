@@ -0,0 +1,49 @@
+"""
+Быстрый путь ответа для листингов.
+
+Обычный путь FastAPI для списка ORM-объектов: загрузка ORM-объектов,
+проверка через response_model, перевод в dict/str на Python и json.dumps.
+Здесь листинг выбирает из БД только колонки схемы ответа, строки один раз
+проверяются заранее собранным TypeAdapter и сразу сериализуются им же в
+JSON (pydantic-core) — в Response уходят готовые байты. Схемы из
+app/schemas.py остаются контрактом: ответ тот же, что дал бы
+response_model.
+"""
+
+from typing import Any, Iterable, List, Optional
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import DeclarativeBase
+
+from . import schemas
+
+
+class JSONBytesResponse(Response):
+    """Тело — уже готовый JSON (bytes), без повторного кодирования."""
+
+    media_type = "application/json"
+
+
+def columns_for(model: type[DeclarativeBase], schema: type[BaseModel]) -> list:
+    """Колонки таблицы, которые есть в схеме ответа (остальные поля — не из БД)."""
+    table = model.__table__
+    return [table.c[name] for name in schema.model_fields if name in table.c]
+
+
+# собираются один раз при импорте, а не на каждый запрос
+ROOM_LIST = TypeAdapter(List[schemas.RoomOut])
+NODE_LIST = TypeAdapter(List[schemas.ServerNodeOut])
+NODE_ROOM_LIST = TypeAdapter(List[schemas.NodeRoomAssignment])
+
+
+def render(adapter: TypeAdapter, rows: Iterable[Any], response: Optional[Response] = None) -> JSONBytesResponse:
+    """
+    Строки (Row из select по колонкам или dict) -> JSON-ответ по схеме адаптера.
+    response — Response, внедрённый в эндпоинт: его заголовки (например,
+    X-Next-Cursor) переносятся, FastAPI сам этого для готового Response не делает.
+    """
+    # dict проверяется заметно быстрее, чем Row через from_attributes
+    items = adapter.validate_python([row if isinstance(row, dict) else row._asdict() for row in rows])
+    headers = dict(response.headers) if response is not None else None
+    return JSONBytesResponse(adapter.dump_json(items), headers=headers)
@@ -15,3 +15,16 @@ api.interceptors.request.use((config) => {
   }
   return config
 })
+
+// Листинги (/rooms/my, /nodes/) отдаются страницами: курсор следующей —
+// в заголовке X-Next-Cursor, без него страница последняя.
+export async function getAllPages<T>(url: string): Promise<T[]> {
+  const items: T[] = []
+  let cursor: string | undefined
+  do {
+    const res = await api.get<T[]>(url, { params: { cursor } })
+    items.push(...res.data)
+    cursor = res.headers['x-next-cursor'] || undefined
+  } while (cursor)
+  return items
+}
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react'
-import { api, API_BASE_URL } from '../api/http'
+import { api, API_BASE_URL, getAllPages } from '../api/http'
 
 interface NodeItem {
   id: string
@@ -38,8 +38,7 @@ export const AdminNodesPage: React.FC = () => {
     setLoading(true)
     setError(null)
     try {
-      const res = await api.get<NodeItem[]>('/nodes/')
-      setNodes(res.data || [])
+      setNodes(await getAllPages<NodeItem>('/nodes/'))
     } catch (e: any) {
       console.error(e)
       setError(e?.response?.data?.detail || 'Не удалось загрузить список нод')
@@ -140,7 +139,7 @@ HEARTBEAT_INTERVAL_SECONDS=10
 EOF
 
 # 6. Тестовый запуск узла (убедиться, что все работает)
-uvicorn node_service.app.main:app --host 0.0.0.0 --port ${port}
+uvicorn node_service.app.main:app --host 0.0.0.0 --port ${port} --ws websockets --ws-per-message-deflate true
 `
   }
 
@@ -159,7 +158,9 @@ Group=www-data
 WorkingDirectory=/opt/quiet_node_${shortId}
 Environment="PYTHONUNBUFFERED=1"
 # .env в node_service/.env будет прочитан через настройки приложения
-ExecStart=/opt/quiet_node_${shortId}/.venv/bin/uvicorn node_service.app.main:app --host 0.0.0.0 --port ${port}
+ExecStart=/opt/quiet_node_${shortId}/.venv/bin/uvicorn node_service.app.main:app --host 0.0.0.0 --port ${port} --ws websockets --ws-per-message-deflate true
+# На многоядерном сервере вместо строки выше — по воркеру на ядро, комнаты шардируются по коду:
+# ExecStart=/opt/quiet_node_${shortId}/.venv/bin/python -m node_service.app.cluster --workers 4 --host 0.0.0.0 --port ${port}
 Restart=always
 RestartSec=5
 
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react'
 import { useNavigate } from 'react-router-dom'
-import { api } from '../api/http'
+import { api, getAllPages } from '../api/http'
 
 interface RoomItem {
   id: string
@@ -46,19 +46,7 @@ export const DashboardPage: React.FC = () => {
     setLoading(true)
     setError(null)
     try {
-      const res = await api.get<any>('/rooms/my')
-
-      const raw = res.data
-      let listRaw: any[] = []
-
-      if (Array.isArray(raw)) {
-        listRaw = raw
-      } else if (raw && Array.isArray(raw.rooms)) {
-        listRaw = raw.rooms
-      } else {
-        listRaw = []
-      }
-
+      const listRaw = await getAllPages<any>('/rooms/my')
       const list = listRaw.map(normalizeRoom)
       setRooms(list)
     } catch (e: any) {
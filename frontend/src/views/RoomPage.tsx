@@ -36,9 +36,21 @@ interface Participant {
 
 interface WsParticipantsMessage {
   type: "participants"
+  version?: number
   participants: { id: string; name: string }[]
 }
 
+type WsRosterEvent =
+  | { type: "participant_joined"; seq: number; id: string; name: string }
+  | { type: "participant_left"; seq: number; id: string }
+
+interface WsRosterDeltaMessage {
+  type: "roster_delta"
+  base: number
+  version: number
+  events: WsRosterEvent[]
+}
+
 interface WsSignalMessage {
   type: "signal"
   from: string
@@ -47,6 +59,13 @@ interface WsSignalMessage {
   payload: any
 }
 
+interface WsSignalBatchMessage {
+  type: "signal_batch"
+  from: string
+  to: string
+  signals: WsSignalMessage[]
+}
+
 interface WsControlMessage {
   type: "control"
   from: string
@@ -61,6 +80,12 @@ interface WsChatMessage {
   name: string
   text: string
   ts: string
+  seq?: number
+}
+
+interface WsChatHistoryMessage {
+  type: "chat_history"
+  messages: WsChatMessage[]
 }
 
 interface ChatMessage {
@@ -101,6 +126,9 @@ export const RoomPage: React.FC = () => {
 
   const wsRef = useRef<WebSocket | null>(null)
   const clientIdRef = useRef<string>("")
+  const rosterVersionRef = useRef<number>(0)
+  // снимок уже запрошен — следующие дельты с разрывом ждут его, а не просят снова
+  const rosterResyncPendingRef = useRef<boolean>(false)
 
   const peerConnectionsRef = useRef<Map<string, RTCPeerConnection>>(new Map())
   const localStreamRef = useRef<MediaStream | null>(null)
@@ -262,6 +290,31 @@ export const RoomPage: React.FC = () => {
     const ws = new WebSocket(wsURL)
     wsRef.current = ws
 
+    const handleSignal = async (msg: WsSignalMessage) => {
+      if (msg.to !== clientIdRef.current) return
+      const pc = createPeerConnection(msg.from)
+      if (msg.signalType === "offer") {
+        await pc.setRemoteDescription(msg.payload)
+        const answer = await pc.createAnswer()
+        await pc.setLocalDescription(answer)
+        ws.send(
+          JSON.stringify({
+            type: "signal",
+            from: clientIdRef.current,
+            to: msg.from,
+            signalType: "answer",
+            payload: answer,
+          }),
+        )
+      } else if (msg.signalType === "answer") {
+        await pc.setRemoteDescription(msg.payload)
+      } else if (msg.signalType === "ice") {
+        try {
+          await pc.addIceCandidate(msg.payload)
+        } catch {}
+      }
+    }
+
     ws.onmessage = async (event) => {
       let data: any
       try {
@@ -272,6 +325,8 @@ export const RoomPage: React.FC = () => {
 
       if (data.type === "participants") {
         const msg = data as WsParticipantsMessage
+        rosterVersionRef.current = msg.version ?? 0
+        rosterResyncPendingRef.current = false
         setParticipants(
           msg.participants.map((p) => ({
             id: p.id,
@@ -284,32 +339,45 @@ export const RoomPage: React.FC = () => {
         }
       }
 
-      else if (data.type === "signal") {
-        const msg = data as WsSignalMessage
-        if (msg.to !== clientIdRef.current) return
-        const pc = createPeerConnection(msg.from)
-        if (msg.signalType === "offer") {
-          await pc.setRemoteDescription(msg.payload)
-          const answer = await pc.createAnswer()
-          await pc.setLocalDescription(answer)
-          ws.send(
-            JSON.stringify({
-              type: "signal",
-              from: clientIdRef.current,
-              to: msg.from,
-              signalType: "answer",
-              payload: answer,
-            }),
-          )
-        } else if (msg.signalType === "answer") {
-          await pc.setRemoteDescription(msg.payload)
-        } else if (msg.signalType === "ice") {
-          try {
-            await pc.addIceCandidate(msg.payload)
-          } catch {}
+      else if (data.type === "roster_delta") {
+        const msg = data as WsRosterDeltaMessage
+        if (msg.base > rosterVersionRef.current) {
+          // пропустили часть изменений — просим полный снимок (один раз до его прихода)
+          if (!rosterResyncPendingRef.current) {
+            rosterResyncPendingRef.current = true
+            ws.send(JSON.stringify({ type: "roster_resync" }))
+          }
+          return
+        }
+        for (const ev of msg.events) {
+          if (ev.seq <= rosterVersionRef.current) continue
+          rosterVersionRef.current = ev.seq
+          if (ev.type === "participant_joined") {
+            setParticipants((prev) => [
+              ...prev.filter((p) => p.id !== ev.id),
+              { id: ev.id, name: ev.name, isYou: ev.id === clientIdRef.current },
+            ])
+            if (ev.id !== clientIdRef.current) startConnection(ev.id)
+          } else {
+            setParticipants((prev) => prev.filter((p) => p.id !== ev.id))
+            peerConnectionsRef.current.get(ev.id)?.close()
+            peerConnectionsRef.current.delete(ev.id)
+            remoteStreamsRef.current.delete(ev.id)
+            updateRemoteVideo()
+          }
         }
       }
 
+      else if (data.type === "signal") {
+        await handleSignal(data as WsSignalMessage)
+      }
+
+      else if (data.type === "signal_batch") {
+        // порядок внутри пары важен: offer раньше своих ICE-кандидатов
+        const msg = data as WsSignalBatchMessage
+        for (const s of msg.signals) await handleSignal(s)
+      }
+
       else if (data.type === "control") {
         const msg = data as WsControlMessage
         if (!msg.to || msg.to === clientIdRef.current) {
@@ -325,6 +393,21 @@ export const RoomPage: React.FC = () => {
         }
       }
 
+      else if (data.type === "chat_history") {
+        // сообщения, написанные до нашего входа, — приходят один раз при подключении
+        const msg = data as WsChatHistoryMessage
+        setChatMessages((prev) => [
+          ...msg.messages.map((m) => ({
+            fromId: m.from,
+            fromName: m.name,
+            text: m.text,
+            ts: m.ts,
+            isOwn: false,
+          })),
+          ...prev,
+        ])
+      }
+
       else if (data.type === "chat") {
         const msg = data as WsChatMessage
         if (msg.from === clientIdRef.current) return // не дублируем свои
@@ -342,8 +425,12 @@ export const RoomPage: React.FC = () => {
       }
     }
 
-    ws.onclose = () => {
+    ws.onclose = (event) => {
       wsRef.current = null
+      // коды отказа в допуске от ноды
+      if (event.code === 4404) setError("Комната не найдена на сервере")
+      else if (event.code === 4410) setError("Комната закрыта")
+      else if (event.code === 4429) setError("В комнате нет свободных мест")
     }
 
     return () => {
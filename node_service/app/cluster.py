@@ -0,0 +1,352 @@
+"""
+Многопроцессный режим node_service с шардированием комнат по ядрам.
+
+Супервизор поднимает N воркеров uvicorn (node_service.app.worker), каждый
+на своём unix-сокете, и сам слушает внешний порт. Для каждого входящего
+соединения он читает только заголовок HTTP-запроса, по коду комнаты из
+пути (/ws/rooms/{code}, /rooms/{code}/...) выбирает воркера-владельца и
+передаёт ему сам сокет клиента вместе с прочитанными байтами (SCM_RIGHTS
+по отдельному unix-сокету воркера). Дальше соединение обслуживает воркер
+напрямую, в том числе всю рассылку по комнате: супервизор байты не
+перекачивает и не ограничивает ноду одним ядром. Все участники одной
+комнаты гарантированно попадают в один процесс, а in-memory состояние
+комнат остаётся локальным для воркера.
+
+Запросы без кода комнаты (/health, /node-info, /rooms, /stats/...) идут
+воркеру 0 — он же шлёт heartbeat и собирает по unix-сокетам состояние
+и статистику остальных воркеров, чтобы control-plane видел одну ноду.
+
+    python -m node_service.app.cluster --workers 4 --host 0.0.0.0 --port 9000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+import httpx
+
+
+# Путь, из которого берём код комнаты для маршрутизации
+ROOM_PATH_RE = re.compile(rb"^/(?:ws/)?rooms/([^/?#]+)")
+
+# Реализация WebSocket с согласованием permessage-deflate; можно переопределить аргументами
+DEFAULT_UVICORN_ARGS = ["--ws", "websockets", "--ws-per-message-deflate", "true"]
+
+# Максимальный размер заголовка HTTP-запроса, который читает супервизор
+MAX_HEAD_BYTES = 64 * 1024
+
+# Заголовок и прочитанные вместе с ним байты уходят воркеру одним сообщением
+HANDOFF_MAX_BYTES = 2 * MAX_HEAD_BYTES + 1024
+
+
+def shard_for(code: str, workers: int) -> int:
+    """Воркер-владелец комнаты. Стабилен между перезапусками (в отличие от hash())."""
+    if workers <= 1:
+        return 0
+    return zlib.crc32(code.encode("utf-8")) % workers
+
+
+def worker_socket_path(socket_dir: str, index: int) -> str:
+    return os.path.join(socket_dir, f"worker-{index}.sock")
+
+
+def worker_handoff_path(socket_dir: str, index: int) -> str:
+    """Сокет, по которому воркер получает от супервизора соединения клиентов."""
+    return os.path.join(socket_dir, f"worker-{index}.handoff.sock")
+
+
+# ---------- Агрегация состояния воркеров (используется воркером 0) ----------
+
+async def fetch_peers(socket_dir: str, workers: int, self_index: int, path: str) -> Dict[int, dict]:
+    """GET path у остальных воркеров. Недоступный воркер пропускаем — heartbeat важнее."""
+
+    async def fetch(index: int) -> Optional[dict]:
+        transport = httpx.AsyncHTTPTransport(uds=worker_socket_path(socket_dir, index))
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://worker", timeout=1.0) as client:
+                resp = await client.get(path)
+                resp.raise_for_status()
+                return resp.json()
+        except Exception as e:
+            print(f"[cluster] worker {index} {path} unavailable: {e}")
+            return None
+
+    indexes = [i for i in range(workers) if i != self_index]
+    results = await asyncio.gather(*(fetch(i) for i in indexes))
+    return {index: result for index, result in zip(indexes, results) if result is not None}
+
+
+async def fetch_peer_states(socket_dir: str, workers: int, self_index: int) -> List[dict]:
+    """Состояние остальных воркеров."""
+    peers = await fetch_peers(socket_dir, workers, self_index, "/internal/worker-state")
+    return list(peers.values())
+
+
+def merge_states(states: List[dict]) -> dict:
+    """Сводим состояния воркеров в состояние одной ноды."""
+
+    def max_of(key: str):
+        values = [s[key] for s in states if s.get(key) is not None]
+        return max(values) if values else None
+
+    def sum_of(key: str):
+        values = [s[key] for s in states if s.get(key) is not None]
+        return sum(values) if values else None
+
+    return {
+        "active_rooms": sum(s["active_rooms"] for s in states),
+        "participants": sum(s["participants"] for s in states),
+        "rooms": [room for s in states for room in s["rooms"]],
+        # загрузка хоста одинакова для всех воркеров, берём худшую оценку
+        "cpu_load": max_of("cpu_load"),
+        "mem_load": max_of("mem_load"),
+        # процессы воркеров складываются
+        "process_cpu": sum_of("process_cpu"),
+        "rss_bytes": sum_of("rss_bytes"),
+        "open_sockets": sum_of("open_sockets"),
+        # клиентам комнаты важен самый медленный цикл событий
+        "loop_lag_ms": max_of("loop_lag_ms"),
+        "loop_lag_max_ms": max_of("loop_lag_max_ms"),
+        "workers": len(states),
+    }
+
+
+# ---------- Супервизор: маршрутизация соединений по воркерам ----------
+
+def route_worker(head: bytes, workers: int) -> int:
+    request_line = head.split(b"\r\n", 1)[0]
+    parts = request_line.split(b" ")
+    if len(parts) < 2:
+        return 0
+    match = ROOM_PATH_RE.match(parts[1])
+    if not match:
+        return 0
+    # FastAPI отдаёт в обработчик уже раскодированный код — шардируем по нему же
+    code = unquote(match.group(1).decode("latin-1"))
+    return shard_for(code, workers)
+
+
+def force_connection_close(head: bytes) -> bytes:
+    """
+    Обычный HTTP-запрос маршрутизируем один раз на соединение, поэтому
+    keep-alive запрещаем: следующий запрос клиента может быть уже про
+    другую комнату и должен пройти маршрутизацию заново.
+    """
+    lines = head.rstrip(b"\r\n").split(b"\r\n")
+    kept = [lines[0]] + [
+        line for line in lines[1:]
+        if not line.lower().startswith((b"connection:", b"keep-alive:"))
+    ]
+    kept.append(b"Connection: close")
+    return b"\r\n".join(kept) + b"\r\n\r\n"
+
+
+def is_upgrade(head: bytes) -> bool:
+    return b"\r\nupgrade:" in head.lower()
+
+
+async def read_head(loop: asyncio.AbstractEventLoop, conn: socket.socket) -> Optional[bytes]:
+    """
+    Читаем из сокета клиента заголовок запроса. Возвращаем всё прочитанное —
+    вместе с началом тела, если оно пришло тем же пакетом; None — клиент
+    закрыл соединение или заголовок слишком длинный.
+    """
+    data = b""
+    while b"\r\n\r\n" not in data:
+        if len(data) > MAX_HEAD_BYTES:
+            return None
+        chunk = await loop.sock_recv(conn, MAX_HEAD_BYTES)
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+async def send_fd(loop: asyncio.AbstractEventLoop, channel: socket.socket, data: bytes, fd: int) -> None:
+    """Одно сообщение SOCK_SEQPACKET: байты запроса и дескриптор сокета клиента."""
+    while True:
+        try:
+            socket.send_fds(channel, [data], [fd])
+            return
+        except BlockingIOError:
+            writable = loop.create_future()
+            loop.add_writer(channel.fileno(), writable.set_result, None)
+            try:
+                await writable
+            finally:
+                loop.remove_writer(channel.fileno())
+
+
+class Supervisor:
+    def __init__(self, workers: int, socket_dir: str, uvicorn_args: List[str]) -> None:
+        self.workers = workers
+        self.socket_dir = socket_dir
+        self.uvicorn_args = uvicorn_args
+        self.processes: List[Optional[subprocess.Popen]] = [None] * workers
+        # каналы передачи соединений воркерам; после перезапуска воркера переподключаемся
+        self.channels: List[Optional[socket.socket]] = [None] * workers
+
+    def spawn(self, index: int) -> None:
+        path = worker_socket_path(self.socket_dir, index)
+        if os.path.exists(path):
+            os.unlink(path)
+
+        env = os.environ.copy()
+        env["NODE_WORKER_INDEX"] = str(index)
+        env["NODE_WORKER_COUNT"] = str(self.workers)
+        env["NODE_WORKER_SOCKET_DIR"] = self.socket_dir
+
+        self.processes[index] = subprocess.Popen(
+            [sys.executable, "-m", "node_service.app.worker", "--uds", path, *self.uvicorn_args],
+            env=env,
+        )
+
+    async def watch(self) -> None:
+        """Перезапускаем упавших воркеров: их комнаты начнутся заново, но маршрутизация не сломается."""
+        while True:
+            await asyncio.sleep(1)
+            for index, proc in enumerate(self.processes):
+                if proc is not None and proc.poll() is not None:
+                    print(f"[cluster] worker {index} exited with {proc.returncode}, restarting")
+                    self.spawn(index)
+
+    async def channel(self, index: int) -> socket.socket:
+        channel = self.channels[index]
+        if channel is None:
+            channel = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            channel.setblocking(False)
+            try:
+                await asyncio.get_running_loop().sock_connect(
+                    channel, worker_handoff_path(self.socket_dir, index)
+                )
+            except OSError:
+                channel.close()
+                raise
+            self.channels[index] = channel
+        return channel
+
+    def drop_channel(self, index: int) -> None:
+        channel, self.channels[index] = self.channels[index], None
+        if channel is not None:
+            channel.close()
+
+    async def hand_off(self, index: int, data: bytes, conn: socket.socket) -> bool:
+        loop = asyncio.get_running_loop()
+        # второй заход — если канал остался от воркера, который уже перезапущен
+        for _ in range(2):
+            try:
+                await send_fd(loop, await self.channel(index), data, conn.fileno())
+                return True
+            except OSError:
+                self.drop_channel(index)
+        return False
+
+    async def handle(self, conn: socket.socket) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            data = await read_head(loop, conn)
+            if data is None:
+                return
+
+            head, _, rest = data.partition(b"\r\n\r\n")
+            head += b"\r\n\r\n"
+            index = route_worker(head, self.workers)
+            if not is_upgrade(head):
+                head = force_connection_close(head)
+
+            if not await self.hand_off(index, head + rest, conn):
+                await loop.sock_sendall(
+                    conn, b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                )
+        except OSError:
+            pass
+        finally:
+            # у воркера своя копия дескриптора; наша больше не нужна
+            conn.close()
+
+    def stop(self) -> None:
+        for index in range(self.workers):
+            self.drop_channel(index)
+        for proc in self.processes:
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+        for proc in self.processes:
+            if proc is None:
+                continue
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+async def serve(supervisor: Supervisor, host: str, port: int) -> None:
+    for index in range(supervisor.workers):
+        supervisor.spawn(index)
+
+    loop = asyncio.get_running_loop()
+    listener = socket.create_server((host, port), backlog=socket.SOMAXCONN)
+    listener.setblocking(False)
+    print(f"[cluster] {supervisor.workers} workers, listening on {host}:{port}")
+
+    handlers = set()
+
+    async def accept() -> None:
+        while True:
+            conn, _ = await loop.sock_accept(listener)
+            conn.setblocking(False)
+            task = loop.create_task(supervisor.handle(conn))
+            handlers.add(task)
+            task.add_done_callback(handlers.discard)
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    watcher = asyncio.create_task(supervisor.watch())
+    acceptor = asyncio.create_task(accept())
+    try:
+        await stop.wait()
+    finally:
+        acceptor.cancel()
+        watcher.cancel()
+        listener.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Многопроцессный запуск node_service")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--socket-dir", default=None, help="каталог для unix-сокетов воркеров")
+    args, uvicorn_args = parser.parse_known_args()
+
+    socket_dir = args.socket_dir or tempfile.mkdtemp(prefix="quiet-node-")
+    Path(socket_dir).mkdir(parents=True, exist_ok=True)
+
+    supervisor = Supervisor(args.workers, socket_dir, DEFAULT_UVICORN_ARGS + uvicorn_args)
+    try:
+        asyncio.run(serve(supervisor, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
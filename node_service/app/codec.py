@@ -0,0 +1,154 @@
+"""
+Кодек WebSocket-протокола комнаты.
+
+Входящий кадр разбирается один раз, проверяется только заголовок
+маршрутизации (type, to), а ретранслируемые signal/control уходят
+получателю исходным текстом — без повторного json.dumps. Если установлен
+orjson, он используется и для разбора, и для кодирования исходящих кадров.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, List, Literal, Optional, TypedDict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+from . import wire
+
+
+# ---------- Сообщения протокола ----------
+
+class ParticipantOut(TypedDict):
+    id: str
+    name: str
+
+
+class ParticipantsMessage(TypedDict):
+    type: Literal["participants"]
+    version: int
+    participants: List[ParticipantOut]
+
+
+class RosterDeltaMessage(TypedDict):
+    type: Literal["roster_delta"]
+    base: int
+    version: int
+    events: List[dict]
+
+
+# "from" — ключевое слово, поэтому сообщения с ним объявлены функциональным синтаксисом
+SignalMessage = TypedDict(
+    "SignalMessage",
+    {
+        "type": Literal["signal"],
+        "from": str,
+        "to": str,
+        "signalType": Literal["offer", "answer", "ice"],
+        "payload": Any,
+    },
+)
+
+ControlMessage = TypedDict(
+    "ControlMessage",
+    {
+        "type": Literal["control"],
+        "from": str,
+        "to": Optional[str],
+        "action": str,
+        "payload": Any,
+    },
+    total=False,
+)
+
+
+class ChatIn(TypedDict, total=False):
+    type: Literal["chat"]
+    text: str
+    name: str
+
+
+ChatEnvelope = TypedDict(
+    "ChatEnvelope",
+    {
+        "type": Literal["chat"],
+        "from": str,
+        "name": str,
+        "text": str,
+        "ts": str,
+        "seq": int,
+    },
+    total=False,
+)
+
+
+# ---------- JSON-бэкенд ----------
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def loads(text: str) -> Any:
+        return orjson.loads(text)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    DecodeError = orjson.JSONDecodeError
+else:
+    JSON_BACKEND = "json"
+
+    loads = json.loads
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    DecodeError = json.JSONDecodeError
+
+
+# ---------- Входящие кадры ----------
+
+@dataclass(frozen=True, slots=True)
+class InboundFrame:
+    type: str
+    to: Optional[str]
+    # исходный текст кадра — его и пересылаем получателю
+    raw: str
+    data: dict
+
+
+def decode(text: str) -> Optional[InboundFrame]:
+    """Разобрать кадр и проверить заголовок маршрутизации. None — кадр битый, игнорируем."""
+    try:
+        data = loads(text)
+    except (DecodeError, ValueError):
+        return None
+    return _routed(data, text)
+
+
+def decode_binary(payload: bytes) -> Optional[InboundFrame]:
+    """
+    Бинарный кадр (msgpack) от клиента. Внутри нода живёт на JSON-тексте,
+    поэтому кадр один раз перекодируется в JSON — дальше всё как у текстового.
+    """
+    try:
+        data = wire.unpack(payload)
+        if not isinstance(data, dict):
+            return None
+        text = dumps(data)
+    except Exception:
+        return None
+    return _routed(data, text)
+
+
+def _routed(data: Any, text: str) -> Optional[InboundFrame]:
+    if not isinstance(data, dict):
+        return None
+
+    msg_type = data.get("type")
+    to = data.get("to")
+    if not isinstance(msg_type, str) or (to is not None and not isinstance(to, str)):
+        return None
+
+    return InboundFrame(type=msg_type, to=to or None, raw=text, data=data)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,6 +16,75 @@ class Settings(BaseSettings):
     # Интервал отправки heartbeat в секундах
     HEARTBEAT_INTERVAL_SECONDS: int = 10
 
+    # Как часто сверять свои комнаты с control-plane (GET /nodes/{id}/rooms);
+    # до первой удачной сверки повтор идёт с интервалом heartbeat
+    ROOM_SYNC_INTERVAL_SECONDS: int = 30
+
+    # Постоянный канал в control-plane (WebSocket /nodes/{id}/stream) вместо POST heartbeat.
+    # Пока канал не поднят, heartbeat шлётся по-старому.
+    CONTROL_STREAM_ENABLED: bool = True
+    # Как часто сверять загрузку с последней отправленной
+    CONTROL_STREAM_TICK_SECONDS: float = 1.0
+    # Минимальный промежуток между кадрами: всплеск входов склеивается в одну дельту
+    CONTROL_STREAM_MIN_GAP_MS: int = 200
+
+    # Максимум кадров в исходящей очереди одного WebSocket-клиента
+    SEND_QUEUE_MAX_SIZE: int = 256
+
+    # Что делать при переполнении очереди:
+    #   drop_oldest      — выбросить самый старый кадр
+    #   drop_noncritical — выбросить чат, а если выбрасывать нечего — отключить клиента
+    #   disconnect       — сразу отключить клиента (код 1013)
+    SEND_QUEUE_OVERFLOW_POLICY: Literal["drop_oldest", "drop_noncritical", "disconnect"] = "drop_noncritical"
+
+    # Таймаут одной отправки в сокет; не успел — клиент отключается и выселяется из комнаты
+    SEND_TIMEOUT_SECONDS: float = 5.0
+
+    # Окно склейки изменений состава комнаты в один кадр roster_delta
+    ROSTER_COALESCE_WINDOW_MS: int = 50
+
+    # Пакетирование сигналинга по паре (from, to): окно в мс, 0 — выключено
+    SIGNAL_BATCH_WINDOW_MS: int = 0
+    # Пачка уходит досрочно, если набралось столько сообщений
+    SIGNAL_BATCH_MAX: int = 32
+
+    # История чата для опоздавших: лимиты на комнату и на процесс ноды (в байтах)
+    CHAT_HISTORY_ROOM_MAX_MESSAGES: int = 100
+    CHAT_HISTORY_ROOM_MAX_BYTES: int = 64 * 1024
+    CHAT_HISTORY_NODE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Ограничение частоты входящих кадров (token bucket): кадров в секунду и размер ведра.
+    # Бюджеты сигналинга рассчитаны на полносвязное согласование комнаты на 50 человек.
+    RATE_LIMIT_ENABLED: bool = True
+    # drop — лишний кадр выбрасывается, disconnect — клиент отключается (код 1008)
+    RATE_LIMIT_POLICY: Literal["drop", "disconnect"] = "drop"
+
+    RATE_LIMIT_CONN_SIGNAL_PER_SEC: float = 200
+    RATE_LIMIT_CONN_SIGNAL_BURST: float = 1000
+    RATE_LIMIT_CONN_CONTROL_PER_SEC: float = 20
+    RATE_LIMIT_CONN_CONTROL_BURST: float = 40
+    RATE_LIMIT_CONN_CHAT_PER_SEC: float = 5
+    RATE_LIMIT_CONN_CHAT_BURST: float = 20
+
+    RATE_LIMIT_ROOM_SIGNAL_PER_SEC: float = 2000
+    RATE_LIMIT_ROOM_SIGNAL_BURST: float = 10000
+    RATE_LIMIT_ROOM_CONTROL_PER_SEC: float = 200
+    RATE_LIMIT_ROOM_CONTROL_BURST: float = 400
+    RATE_LIMIT_ROOM_CHAT_PER_SEC: float = 50
+    RATE_LIMIT_ROOM_CHAT_BURST: float = 100
+
+    # Замер загрузки хоста (/proc) и задержки цикла событий
+    LOAD_SAMPLE_INTERVAL_SECONDS: float = 2.0
+    LOOP_LAG_PROBE_INTERVAL_MS: int = 250
+    # Коэффициент сглаживания EWMA: больше — быстрее реагирует на всплески
+    LOAD_EWMA_ALPHA: float = 0.3
+
+    # Многопроцессный режим (выставляет супервизор node_service.app.cluster):
+    # номер воркера, число воркеров и каталог их unix-сокетов
+    NODE_WORKER_INDEX: int = 0
+    NODE_WORKER_COUNT: int = 1
+    NODE_WORKER_SOCKET_DIR: str = ""
+
     model_config = SettingsConfigDict(env_file=".env.node", extra="ignore")
 
 
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Callable, Deque, Optional
+
+from fastapi import WebSocket
+
+from . import codec
+from .ratelimit import BucketSet
+from .wire import ENCODING_JSON, ENCODING_MSGPACK, timed_pack, wire_stats
+
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NONCRITICAL = "drop_noncritical"
+OVERFLOW_DISCONNECT = "disconnect"
+
+# Типы сообщений, которые можно выбросить при переполнении без поломки сигналинга
+NON_CRITICAL_TYPES = frozenset({"chat"})
+
+# 1013 = "Try Again Later": клиент не успевает вычитывать исходящую очередь
+CLOSE_SLOW_CONSUMER = 1013
+
+
+class Frame:
+    """
+    Готовый к отправке кадр. Один объект разделяется всеми получателями
+    broadcast-а: текст кодируется один раз, а счётчик pending показывает,
+    сколько очередей ещё не отдали его в сокет. Бинарное представление
+    (msgpack) строится лениво, тоже один раз на кадр.
+    """
+
+    __slots__ = ("text", "msg_type", "created", "pending", "on_done", "json_size", "_binary")
+
+    def __init__(
+        self,
+        text: str,
+        msg_type: str,
+        pending: int = 1,
+        on_done: Optional[Callable[["Frame"], None]] = None,
+    ) -> None:
+        self.text = text
+        self.msg_type = msg_type
+        self.created = time.perf_counter()
+        self.pending = pending
+        self.on_done = on_done
+        self.json_size = wire_stats.record_frame(msg_type, text)
+        self._binary: Optional[bytes] = None
+
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = timed_pack(self.msg_type, codec.loads(self.text))
+        return self._binary
+
+    def release(self) -> None:
+        """Кадр отправлен или выброшен одной из очередей."""
+        self.pending -= 1
+        if self.pending == 0 and self.on_done is not None:
+            self.on_done(self)
+
+
+@dataclass
+class QueueStats:
+    enqueued: int = 0
+    sent: int = 0
+    dropped: int = 0
+    max_depth: int = 0
+
+
+class ClientConnection:
+    """
+    Исходящая сторона одного WebSocket-клиента.
+
+    Отправители только кладут готовый текст в ограниченную очередь (O(1)),
+    а собственная задача-писатель отдаёт кадры в сокет. Медленный клиент
+    тормозит только свою очередь, но не всю комнату и не чужой receive-цикл.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        websocket: WebSocket,
+        max_size: int,
+        overflow_policy: str,
+        send_timeout: float,
+        on_failed: Optional[Callable[["ClientConnection"], None]] = None,
+        encoding: str = ENCODING_JSON,
+        limits: Optional[BucketSet] = None,
+    ) -> None:
+        self.client_id = client_id
+        self.websocket = websocket
+        self.encoding = encoding
+        # вёдра ограничения входящих кадров этого клиента
+        self.limits = limits
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.on_failed = on_failed
+
+        self.stats = QueueStats()
+        self.closed = False
+
+        self._queue: Deque[Frame] = deque()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._close_code: Optional[int] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Поставить кадр в очередь. False — кадр не принят (выброшен или клиент отключается)."""
+        if self.closed or (len(self._queue) >= self.max_size and not self._make_room(frame.msg_type)):
+            frame.release()
+            return False
+
+        self._queue.append(frame)
+        self.stats.enqueued += 1
+        if len(self._queue) > self.stats.max_depth:
+            self.stats.max_depth = len(self._queue)
+        self._wakeup.set()
+        return True
+
+    def _make_room(self, msg_type: str) -> bool:
+        if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+            self._queue.popleft().release()
+            self.stats.dropped += 1
+            return True
+
+        if self.overflow_policy == OVERFLOW_DROP_NONCRITICAL:
+            for index, queued in enumerate(self._queue):
+                if queued.msg_type in NON_CRITICAL_TYPES:
+                    del self._queue[index]
+                    queued.release()
+                    self.stats.dropped += 1
+                    return True
+            if msg_type in NON_CRITICAL_TYPES:
+                self.stats.dropped += 1
+                return False
+
+        # disconnect, либо критичному кадру некуда встать — сигналинг уже не восстановить
+        self.abort(CLOSE_SLOW_CONSUMER)
+        return False
+
+    def abort(self, code: int) -> None:
+        """Отключить клиента: очередь выбрасывается, писатель закрывает сокет с кодом."""
+        if self.closed:
+            return
+        self._close_code = code
+        self._fail()
+        self._wakeup.set()
+
+    def _fail(self) -> None:
+        self.closed = True
+        self.stats.dropped += len(self._queue)
+        self._drain()
+        if self.on_failed is not None:
+            callback, self.on_failed = self.on_failed, None
+            callback(self)
+
+    def _drain(self) -> None:
+        while self._queue:
+            self._queue.popleft().release()
+
+    async def close(self) -> None:
+        """Остановить писателя (клиент уже отключился)."""
+        self.closed = True
+        self.on_failed = None
+        self._drain()
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                while not self._queue:
+                    if self.closed:
+                        return
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+
+                frame = self._queue.popleft()
+                try:
+                    if self.encoding == ENCODING_MSGPACK:
+                        payload = frame.binary()
+                        wire_stats.record_msgpack_send(frame.msg_type, frame.json_size, len(payload))
+                        send = self.websocket.send_bytes(payload)
+                    else:
+                        wire_stats.record_text_send(frame.msg_type, frame.json_size)
+                        send = self.websocket.send_text(frame.text)
+                    await asyncio.wait_for(send, self.send_timeout)
+                finally:
+                    frame.release()
+                self.stats.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._close_code = CLOSE_SLOW_CONSUMER
+            self._fail()
+        except Exception:
+            self._fail()
+        finally:
+            if self._close_code is not None:
+                try:
+                    await asyncio.wait_for(self.websocket.close(code=self._close_code), self.send_timeout)
+                except Exception:
+                    pass
+
+    def snapshot(self) -> dict:
+        data = asdict(self.stats)
+        data["client_id"] = self.client_id
+        data["encoding"] = self.encoding
+        if self.limits is not None:
+            data["buckets"] = self.limits.levels()
+        data["depth"] = self.depth
+        data["closed"] = self.closed
+        return data
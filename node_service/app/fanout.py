@@ -0,0 +1,115 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Union
+
+from . import codec
+from .connections import ClientConnection, Frame
+
+
+# Верхние границы корзин по размеру комнаты (число получателей)
+ROOM_SIZE_BUCKETS = (2, 5, 10, 20, 50)
+
+# Сколько последних замеров держим на корзину для перцентилей
+LATENCY_SAMPLES = 1024
+
+
+def _bucket_label(size: int) -> str:
+    lower = 1
+    for upper in ROOM_SIZE_BUCKETS:
+        if size <= upper:
+            return f"{lower}-{upper}"
+        lower = upper + 1
+    return f"{lower}+"
+
+
+@dataclass
+class FanoutResult:
+    delivered: int = 0
+    # кадр выброшен политикой переполнения, но клиент жив
+    dropped: int = 0
+    # клиент отключён — его нужно выселить из комнаты
+    failed: List[str] = field(default_factory=list)
+
+
+@dataclass
+class _BucketStats:
+    frames: int = 0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"frames": self.frames, "p50_ms": None, "p99_ms": None, "max_ms": None}
+
+        def pct(q: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+        return {
+            "frames": self.frames,
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+
+
+class RoomFanout:
+    """
+    Единая точка рассылки по комнате.
+
+    Кадр сериализуется один раз и ставится во все очереди получателей;
+    сами отправки идут параллельно в писателях соединений с таймаутом на
+    каждую. Латентность считается от постановки до момента, когда кадр
+    покинул последнюю очередь, и группируется по размеру комнаты.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: Dict[str, _BucketStats] = {}
+        self.failed_total = 0
+
+    def broadcast(
+        self,
+        recipients: Iterable[ClientConnection],
+        message: Union[str, dict],
+        msg_type: str,
+    ) -> FanoutResult:
+        conns = list(recipients)
+        result = FanoutResult()
+        if not conns:
+            return result
+
+        text = message if isinstance(message, str) else codec.dumps(message)
+        bucket = self._buckets.setdefault(_bucket_label(len(conns)), _BucketStats())
+        bucket.frames += 1
+
+        def on_done(frame: Frame) -> None:
+            bucket.samples.append(time.perf_counter() - frame.created)
+
+        frame = Frame(text, msg_type, pending=len(conns), on_done=on_done)
+        for conn in conns:
+            if conn.enqueue(frame):
+                result.delivered += 1
+            elif conn.closed:
+                result.failed.append(conn.client_id)
+            else:
+                result.dropped += 1
+
+        self.failed_total += len(result.failed)
+        return result
+
+    def send(self, conn: ClientConnection, message: Union[str, dict], msg_type: str) -> bool:
+        """Адресная отправка одному клиенту (signal / control с полем to)."""
+        text = message if isinstance(message, str) else codec.dumps(message)
+        ok = conn.enqueue(Frame(text, msg_type))
+        if not ok:
+            self.failed_total += 1
+        return ok
+
+    def snapshot(self) -> dict:
+        return {
+            "failed_total": self.failed_total,
+            "by_room_size": {label: stats.snapshot() for label, stats in self._buckets.items()},
+        }
+
+
+fanout = RoomFanout()
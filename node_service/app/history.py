@@ -0,0 +1,116 @@
+import sys
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from . import codec
+
+
+class RoomChatHistory:
+    """Кольцевой буфер последних сообщений чата одной комнаты (закодированные конверты)."""
+
+    __slots__ = ("entries", "size", "next_seq")
+
+    def __init__(self) -> None:
+        # (seq, text, size)
+        self.entries: Deque[Tuple[int, str, int]] = deque()
+        self.size = 0
+        self.next_seq = 1
+
+
+class ChatHistoryStore:
+    """
+    История чата по комнатам с ограничением памяти.
+
+    У каждой комнаты лимит по числу сообщений и по байтам, у всей ноды —
+    общий лимит по байтам: при его превышении сообщения вытесняются из
+    комнат, где дольше всего никто не писал. Комната без сообщений не
+    занимает памяти, поэтому тысячи простаивающих комнат ничего не стоят.
+    """
+
+    def __init__(self, room_max_messages: int, room_max_bytes: int, node_max_bytes: int) -> None:
+        self.room_max_messages = room_max_messages
+        self.room_max_bytes = room_max_bytes
+        self.node_max_bytes = node_max_bytes
+
+        # порядок — от давно молчащих комнат к недавно активным
+        self._rooms: "OrderedDict[str, RoomChatHistory]" = OrderedDict()
+        self.total_bytes = 0
+        self.evicted = 0
+
+    def append(self, room_code: str, envelope: dict) -> str:
+        """Присвоить конверту seq, закодировать, сохранить. Возвращает готовый текст кадра."""
+        room = self._rooms.get(room_code)
+        if room is None:
+            room = self._rooms[room_code] = RoomChatHistory()
+        else:
+            self._rooms.move_to_end(room_code)
+
+        envelope["seq"] = room.next_seq
+        room.next_seq += 1
+        text = codec.dumps(envelope)
+        size = sys.getsizeof(text)
+
+        room.entries.append((envelope["seq"], text, size))
+        room.size += size
+        self.total_bytes += size
+
+        while room.entries and (
+            len(room.entries) > self.room_max_messages or room.size > self.room_max_bytes
+        ):
+            self._pop_oldest(room)
+
+        while self.total_bytes > self.node_max_bytes and self._rooms:
+            oldest_code, oldest = next(iter(self._rooms.items()))
+            self._pop_oldest(oldest)
+            if not oldest.entries:
+                # последовательность seq для этой комнаты начнётся заново — это допустимо,
+                # курсоры старше вытесненных сообщений всё равно уже некуда листать
+                del self._rooms[oldest_code]
+
+        return text
+
+    def _pop_oldest(self, room: RoomChatHistory) -> None:
+        _, _, size = room.entries.popleft()
+        room.size -= size
+        self.total_bytes -= size
+        self.evicted += 1
+
+    def recent(self, room_code: str) -> List[str]:
+        room = self._rooms.get(room_code)
+        return [text for _, text, _ in room.entries] if room else []
+
+    def page(self, room_code: str, before: Optional[int], limit: int) -> Tuple[List[str], Optional[int]]:
+        """
+        Страница истории от новых к старым: сообщения с seq < before (или самые
+        свежие, если before не задан). Второй элемент — курсор следующей страницы.
+        """
+        room = self._rooms.get(room_code)
+        if not room:
+            return [], None
+
+        picked: List[Tuple[int, str]] = []
+        for seq, text, _ in reversed(room.entries):
+            if before is not None and seq >= before:
+                continue
+            picked.append((seq, text))
+            if len(picked) == limit:
+                break
+
+        picked.reverse()
+        oldest_kept = room.entries[0][0]
+        next_cursor = picked[0][0] if picked and picked[0][0] > oldest_kept else None
+        return [text for _, text in picked], next_cursor
+
+    def drop_room(self, room_code: str) -> None:
+        room = self._rooms.pop(room_code, None)
+        if room:
+            self.total_bytes -= room.size
+
+    def snapshot(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "messages": sum(len(r.entries) for r in self._rooms.values()),
+            "bytes": self.total_bytes,
+            "node_max_bytes": self.node_max_bytes,
+            "evicted": self.evicted,
+        }
@@ -1,7 +1,6 @@
 import asyncio
-import json
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict
 from uuid import uuid4
 
 import httpx
@@ -9,14 +8,40 @@ from fastapi import (
     FastAPI,
     Depends,
     HTTPException,
+    Query,
+    Response,
     status,
     WebSocket,
     WebSocketDisconnect,
 )
 from pydantic import BaseModel
 
+from . import cluster, codec
 from .config import settings
+from .connections import ClientConnection
+from .fanout import fanout
+from .history import ChatHistoryStore
+from .ratelimit import (
+    CATEGORY_CHAT,
+    CATEGORY_CONTROL,
+    CATEGORY_SIGNAL,
+    CLOSE_RATE_LIMITED,
+    POLICY_DISCONNECT,
+    RateLimiter,
+    category_for,
+)
 from .models import node_state, LocalRoom, NodeState
+from .roster import RoomRoster
+from .sampler import LoadSampler
+from .signaling import make_coalescer
+from .uplink import LOAD_FIELDS, ControlPlaneUplink, stream_url
+from .wire import (
+    CLOSE_UNSUPPORTED_ENCODING,
+    ENCODING_JSON,
+    ENCODING_MSGPACK,
+    available_encodings,
+    wire_stats,
+)
 from .deps import get_node_state
 
 
@@ -31,8 +56,15 @@ app = FastAPI(
 class NodeInfo(BaseModel):
     node_id: str
     active_rooms: int
+    participants: int = 0
+    workers: int = 1
     cpu_load: float | None = None
     mem_load: float | None = None
+    process_cpu: float | None = None
+    rss_bytes: int | None = None
+    open_sockets: int | None = None
+    loop_lag_ms: float | None = None
+    loop_lag_max_ms: float | None = None
     timestamp: datetime
 
 
@@ -47,6 +79,7 @@ class LocalRoomOut(BaseModel):
     max_participants: int
     created_at: datetime
     is_active: bool
+    participants: int = 0
 
     class Config:
         from_attributes = True
@@ -54,26 +87,165 @@ class LocalRoomOut(BaseModel):
 
 # ---------- Память ноды ----------
 
-# room_code -> { client_id -> WebSocket }
-room_clients: Dict[str, Dict[str, WebSocket]] = {}
+# room_code -> { client_id -> ClientConnection }
+room_clients: Dict[str, Dict[str, ClientConnection]] = {}
 
 # room_code -> { client_id -> meta }
 room_participants_meta: Dict[str, Dict[str, dict]] = {}
 
+# room_code -> версионированный список участников
+room_rosters: Dict[str, RoomRoster] = {}
+
+
+def deliver_signal(room_code: str, to_id: str, text: str) -> None:
+    target = room_clients.get(room_code, {}).get(to_id)
+    if target:
+        fanout.send(target, text, "signal")
+
+
+# room_code -> последние сообщения чата для опоздавших
+chat_history = ChatHistoryStore(
+    room_max_messages=settings.CHAT_HISTORY_ROOM_MAX_MESSAGES,
+    room_max_bytes=settings.CHAT_HISTORY_ROOM_MAX_BYTES,
+    node_max_bytes=settings.CHAT_HISTORY_NODE_MAX_BYTES,
+)
+
+# Ограничение частоты входящих кадров (None — выключено)
+rate_limiter = RateLimiter(
+    connection_limits={
+        CATEGORY_SIGNAL: (settings.RATE_LIMIT_CONN_SIGNAL_PER_SEC, settings.RATE_LIMIT_CONN_SIGNAL_BURST),
+        CATEGORY_CONTROL: (settings.RATE_LIMIT_CONN_CONTROL_PER_SEC, settings.RATE_LIMIT_CONN_CONTROL_BURST),
+        CATEGORY_CHAT: (settings.RATE_LIMIT_CONN_CHAT_PER_SEC, settings.RATE_LIMIT_CONN_CHAT_BURST),
+    },
+    room_limits={
+        CATEGORY_SIGNAL: (settings.RATE_LIMIT_ROOM_SIGNAL_PER_SEC, settings.RATE_LIMIT_ROOM_SIGNAL_BURST),
+        CATEGORY_CONTROL: (settings.RATE_LIMIT_ROOM_CONTROL_PER_SEC, settings.RATE_LIMIT_ROOM_CONTROL_BURST),
+        CATEGORY_CHAT: (settings.RATE_LIMIT_ROOM_CHAT_PER_SEC, settings.RATE_LIMIT_ROOM_CHAT_BURST),
+    },
+    policy=settings.RATE_LIMIT_POLICY,
+) if settings.RATE_LIMIT_ENABLED else None
+
+# Замер загрузки хоста/процесса и задержки цикла событий
+load_sampler = LoadSampler(
+    node_state,
+    interval=settings.LOAD_SAMPLE_INTERVAL_SECONDS,
+    lag_probe_interval=settings.LOOP_LAG_PROBE_INTERVAL_MS / 1000,
+    alpha=settings.LOAD_EWMA_ALPHA,
+)
+
+# Постоянный канал в control-plane (None — только POST heartbeat)
+uplink = ControlPlaneUplink(
+    stream_url(settings.CONTROL_PLANE_URL, settings.NODE_ID),
+    collect=lambda: collect_node_state(),
+    tick=settings.CONTROL_STREAM_TICK_SECONDS,
+    min_gap=settings.CONTROL_STREAM_MIN_GAP_MS / 1000,
+    keepalive=settings.HEARTBEAT_INTERVAL_SECONDS,
+) if settings.CONTROL_STREAM_ENABLED else None
+
+
+def notify_uplink() -> None:
+    # в многопроцессном режиме канал держит воркер 0, остальных он опрашивает по тику
+    if uplink is not None:
+        uplink.notify()
+
+
+# Пакетная ретрансляция сигналинга (None — выключена)
+signal_coalescer = make_coalescer(
+    settings.SIGNAL_BATCH_WINDOW_MS,
+    settings.SIGNAL_BATCH_MAX,
+    deliver_signal,
+)
+
+
+# ---------- Допуск в комнату ----------
+
+CLOSE_ROOM_UNKNOWN = 4404
+CLOSE_ROOM_INACTIVE = 4410
+CLOSE_ROOM_FULL = 4429
+# соединение пришло в воркер, который не владеет комнатой (см. cluster.py)
+CLOSE_WRONG_WORKER = 4421
+
+
+def admit(room_code: str, client_id: str) -> Optional[int]:
+    """
+    O(1) допуск до accept(). None — клиент допущен, место в комнате уже
+    занято за ним (освобождается в detach_client); иначе — код закрытия.
+    Между проверкой и занятием места нет await, поэтому комнату нельзя переполнить.
+
+    Переподключение с client_id, который уже в комнате, пускается и в полную
+    комнату: место старого соединения освобождается при его замене.
+    """
+    room = node_state.rooms.get(room_code)
+    if room is None:
+        return CLOSE_ROOM_UNKNOWN
+    if not room.is_active:
+        return CLOSE_ROOM_INACTIVE
+    reconnecting = client_id in room_clients.get(room_code, ())
+    if room.participants >= room.max_participants and not reconnecting:
+        return CLOSE_ROOM_FULL
+    room.participants += 1
+    notify_uplink()
+    return None
+
+
+def release_slot(room_code: str) -> None:
+    room = node_state.rooms.get(room_code)
+    if room and room.participants > 0:
+        room.participants -= 1
+        notify_uplink()
+
+
+# ---------- Состояние воркера / ноды ----------
+
+def is_leader() -> bool:
+    """Воркер 0 (или единственный процесс) отвечает за ноду целиком: heartbeat, /node-info."""
+    return settings.NODE_WORKER_INDEX == 0
+
+
+def worker_state() -> dict:
+    """Состояние комнат этого процесса."""
+    return {
+        "active_rooms": node_state.active_rooms_count(),
+        "participants": node_state.participants_count(),
+        "rooms": [LocalRoomOut.model_validate(r).model_dump(mode="json") for r in node_state.rooms.values()],
+        "cpu_load": node_state.cpu_load,
+        "mem_load": node_state.mem_load,
+        "process_cpu": node_state.process_cpu,
+        "rss_bytes": node_state.rss_bytes,
+        "open_sockets": node_state.open_sockets,
+        "loop_lag_ms": node_state.loop_lag_ms,
+        "loop_lag_max_ms": node_state.loop_lag_max_ms,
+    }
+
+
+async def collect_node_state() -> dict:
+    """Состояние всей ноды: в многопроцессном режиме — сумма по всем воркерам."""
+    local = worker_state()
+    if settings.NODE_WORKER_COUNT <= 1:
+        return cluster.merge_states([local])
+    peers = await cluster.fetch_peer_states(
+        settings.NODE_WORKER_SOCKET_DIR,
+        settings.NODE_WORKER_COUNT,
+        settings.NODE_WORKER_INDEX,
+    )
+    return cluster.merge_states([local, *peers])
+
 
 # ---------- Heartbeat ----------
 
 async def send_heartbeat_loop():
+    """Запасной путь: POST heartbeat, пока постоянный канал (uplink.py) не поднят."""
     await asyncio.sleep(2)
     async with httpx.AsyncClient(timeout=5.0) as client:
         while True:
             try:
-                active_rooms = node_state.active_rooms_count()
-                payload = {
-                    "active_rooms": active_rooms,
-                    "cpu_load": node_state.cpu_load,
-                    "mem_load": node_state.mem_load,
-                }
+                if uplink is not None and uplink.connected:
+                    await asyncio.sleep(settings.HEARTBEAT_INTERVAL_SECONDS)
+                    continue
+                state = await collect_node_state()
+                payload = {key: state[key] for key in LOAD_FIELDS}
+                # по кодам control-plane подтверждает резервы мест под новые комнаты
+                payload["room_codes"] = [room["code"] for room in state["rooms"] if room["is_active"]]
                 url = f"{settings.CONTROL_PLANE_URL}/nodes/{settings.NODE_ID}/heartbeat"
                 await client.post(url, json=payload)
             except Exception as e:
@@ -81,38 +253,101 @@ async def send_heartbeat_loop():
             await asyncio.sleep(settings.HEARTBEAT_INTERVAL_SECONDS)
 
 
+async def sync_rooms_loop():
+    """
+    После перезапуска нода ничего не знает о своих комнатах и отклоняла бы
+    всех участников. Забираем у control-plane назначенные ноде комнаты
+    (в многопроцессном режиме — только свой шард) и сверяемся с ним
+    периодически: регистрация комнаты через POST /rooms/{code}/start могла
+    не дойти, а без сверки такая комната отклонялась бы до перезапуска ноды.
+    """
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        while True:
+            interval = settings.HEARTBEAT_INTERVAL_SECONDS
+            try:
+                url = f"{settings.CONTROL_PLANE_URL}/nodes/{settings.NODE_ID}/rooms"
+                resp = await client.get(url)
+                resp.raise_for_status()
+                for item in resp.json():
+                    code = item["code"]
+                    if cluster.shard_for(code, settings.NODE_WORKER_COUNT) != settings.NODE_WORKER_INDEX:
+                        continue
+                    if code not in node_state.rooms:
+                        node_state.rooms[code] = LocalRoom(
+                            code=code,
+                            title=item.get("title"),
+                            max_participants=item["max_participants"],
+                        )
+                interval = settings.ROOM_SYNC_INTERVAL_SECONDS
+            except Exception as e:
+                print(f"[{datetime.utcnow().isoformat()}] Room sync error: {e}")
+            await asyncio.sleep(interval)
+
+
 @app.on_event("startup")
 async def on_startup():
-    asyncio.create_task(send_heartbeat_loop())
+    load_sampler.start()
+    asyncio.create_task(sync_rooms_loop())
+    if is_leader():
+        if uplink is not None:
+            uplink.start()
+        asyncio.create_task(send_heartbeat_loop())
 
 
-async def broadcast_participants(room_code: str) -> None:
-    """Рассылаем всем участникам комнаты список участников."""
+def detach_client(room_code: str, conn: ClientConnection) -> bool:
+    """Убираем соединение из комнаты, если под его client_id всё ещё живёт именно оно."""
     clients = room_clients.get(room_code)
+    if not clients or clients.get(conn.client_id) is not conn:
+        return False
+
+    clients.pop(conn.client_id, None)
+    room_participants_meta.get(room_code, {}).pop(conn.client_id, None)
+    release_slot(room_code)
+    if signal_coalescer:
+        signal_coalescer.drop_client(room_code, conn.client_id)
+
     if not clients:
+        room_clients.pop(room_code, None)
+        room_participants_meta.pop(room_code, None)
+        if rate_limiter:
+            rate_limiter.drop_room(room_code)
+        roster = room_rosters.pop(room_code, None)
+        if roster:
+            roster.cancel_flush()
+    else:
+        roster = room_rosters[room_code]
+        roster.leave(conn.client_id)
+        roster.schedule_flush(
+            settings.ROSTER_COALESCE_WINDOW_MS / 1000,
+            lambda: flush_roster(room_code),
+        )
+    return True
+
+
+def evict_clients(room_code: str, client_ids: List[str]) -> None:
+    """Выселяем клиентов, которым не удалось доставить кадр."""
+    clients = room_clients.get(room_code, {})
+    for client_id in client_ids:
+        conn = clients.get(client_id)
+        if conn and conn.closed:
+            detach_client(room_code, conn)
+
+
+def flush_roster(room_code: str) -> None:
+    """Рассылаем накопленные за окно изменения состава комнаты одним кадром."""
+    roster = room_rosters.get(room_code)
+    clients = room_clients.get(room_code)
+    if not roster or not clients:
         return
 
-    meta = room_participants_meta.get(room_code, {})
-    participants = [
-        {
-            "id": client_id,
-            "name": meta.get(client_id, {}).get("name", "Гость"),
-        }
-        for client_id in clients.keys()
-    ]
-
-    message = json.dumps(
-        {
-            "type": "participants",
-            "participants": participants,
-        }
-    )
+    delta = roster.take_delta()
+    if delta is None:
+        return
 
-    for ws in list(clients.values()):
-        try:
-            await ws.send_text(message)
-        except Exception:
-            pass
+    result = fanout.broadcast(clients.values(), delta, "participants")
+    if result.failed:
+        # выселение запланирует следующую дельту, рекурсии нет
+        evict_clients(room_code, result.failed)
 
 
 # ---------- HTTP-эндпоинты ноды ----------
@@ -123,32 +358,138 @@ def health():
 
 
 @app.get("/node-info", response_model=NodeInfo)
-def get_node_info(state: NodeState = Depends(get_node_state)):
+async def get_node_info():
+    state = await collect_node_state()
     return NodeInfo(
         node_id=settings.NODE_ID,
-        active_rooms=state.active_rooms_count(),
-        cpu_load=state.cpu_load,
-        mem_load=state.mem_load,
+        active_rooms=state["active_rooms"],
+        participants=state["participants"],
+        workers=state["workers"],
+        cpu_load=state["cpu_load"],
+        mem_load=state["mem_load"],
+        process_cpu=state["process_cpu"],
+        rss_bytes=state["rss_bytes"],
+        open_sockets=state["open_sockets"],
+        loop_lag_ms=state["loop_lag_ms"],
+        loop_lag_max_ms=state["loop_lag_max_ms"],
         timestamp=datetime.utcnow(),
     )
 
 
+@app.get("/internal/worker-state", include_in_schema=False)
+async def get_worker_state():
+    """Опрашивается воркером 0 по unix-сокету при сборе состояния ноды."""
+    return worker_state()
+
+
+# ---------- Статистика ----------
+
+# имя -> показатели этого воркера; отдаются через /stats/{name}
+STATS: Dict[str, Callable[[], dict]] = {}
+
+
+def stats_view(name: str):
+    def register(view: Callable[[], dict]) -> Callable[[], dict]:
+        STATS[name] = view
+        return view
+    return register
+
+
+@stats_view("connections")
+def connection_stats():
+    """Глубина исходящих очередей и счётчики по каждому подключению."""
+    return {
+        code: [conn.snapshot() for conn in clients.values()]
+        for code, clients in room_clients.items()
+    }
+
+
+@stats_view("fanout")
+def fanout_stats():
+    """Латентность рассылки по комнате в разрезе размера комнаты."""
+    return fanout.snapshot()
+
+
+@stats_view("signaling")
+def signaling_stats():
+    if not signal_coalescer:
+        return {"enabled": False}
+    return signal_coalescer.snapshot()
+
+
+@stats_view("rate-limits")
+def rate_limit_stats():
+    """Решения ограничителя по категориям и текущий уровень вёдер комнат."""
+    if not rate_limiter:
+        return {"enabled": False}
+    return rate_limiter.snapshot()
+
+
+@stats_view("wire")
+def wire_stats_view():
+    """Байты на проводе по типам сообщений: JSON, оценка deflate, msgpack."""
+    return wire_stats.snapshot()
+
+
+@stats_view("chat-history")
+def chat_history_stats():
+    return chat_history.snapshot()
+
+
+@stats_view("load")
+def load_stats():
+    """Показатели этого воркера и сколько стоил последний замер /proc."""
+    return {
+        **{key: value for key, value in worker_state().items() if key != "rooms"},
+        "sample_ms": round(load_sampler.sample_seconds * 1000, 3),
+    }
+
+
+@stats_view("uplink")
+def uplink_stats():
+    return uplink.snapshot() if uplink is not None else {"enabled": False}
+
+
+@app.get("/stats/{name}")
+async def get_stats(name: str):
+    """
+    Показатели ноды. В многопроцессном режиме — по воркерам, собранные по
+    unix-сокетам так же, как состояние для /node-info: у каждого воркера
+    свои соединения, очереди, вёдра и история чата.
+    """
+    view = STATS.get(name)
+    if view is None:
+        raise HTTPException(status_code=404, detail="Unknown stats view")
+    local = view()
+    if settings.NODE_WORKER_COUNT <= 1:
+        return local
+    peers = await cluster.fetch_peers(
+        settings.NODE_WORKER_SOCKET_DIR,
+        settings.NODE_WORKER_COUNT,
+        settings.NODE_WORKER_INDEX,
+        f"/internal/stats/{name}",
+    )
+    peers[settings.NODE_WORKER_INDEX] = local
+    return {"workers": {str(index): peers[index] for index in sorted(peers)}}
+
+
+@app.get("/internal/stats/{name}", include_in_schema=False)
+async def get_worker_stats(name: str):
+    """Опрашивается воркером 0 по unix-сокету для /stats/{name}."""
+    view = STATS.get(name)
+    if view is None:
+        raise HTTPException(status_code=404, detail="Unknown stats view")
+    return view()
+
+
 @app.get("/rooms", response_model=List[LocalRoomOut])
-def list_rooms(state: NodeState = Depends(get_node_state)):
-    return [
-        LocalRoomOut(
-            code=r.code,
-            title=r.title,
-            max_participants=r.max_participants,
-            created_at=r.created_at,
-            is_active=r.is_active,
-        )
-        for r in state.rooms.values()
-    ]
+async def list_rooms():
+    state = await collect_node_state()
+    return state["rooms"]
 
 
 @app.post("/rooms/{code}/start", response_model=LocalRoomOut, status_code=status.HTTP_201_CREATED)
-def start_room(
+async def start_room(
     code: str,
     data: LocalRoomCreate,
     state: NodeState = Depends(get_node_state),
@@ -156,12 +497,18 @@ def start_room(
     if code in state.rooms:
         room = state.rooms[code]
         room.is_active = True
+        if "max_participants" in data.model_fields_set:
+            room.max_participants = data.max_participants
+        if "title" in data.model_fields_set:
+            room.title = data.title
+        notify_uplink()
         return LocalRoomOut(
             code=room.code,
             title=room.title,
             max_participants=room.max_participants,
             created_at=room.created_at,
             is_active=room.is_active,
+            participants=room.participants,
         )
 
     room = LocalRoom(
@@ -170,17 +517,19 @@ def start_room(
         max_participants=data.max_participants,
     )
     state.rooms[code] = room
+    notify_uplink()
     return LocalRoomOut(
         code=room.code,
         title=room.title,
         max_participants=room.max_participants,
         created_at=room.created_at,
         is_active=room.is_active,
+        participants=room.participants,
     )
 
 
 @app.post("/rooms/{code}/stop", response_model=LocalRoomOut)
-def stop_room(
+async def stop_room(
     code: str,
     state: NodeState = Depends(get_node_state),
 ):
@@ -189,97 +538,189 @@ def stop_room(
         raise HTTPException(status_code=404, detail="Room not found on this node")
 
     room.is_active = False
+    chat_history.drop_room(code)
+    notify_uplink()
     return LocalRoomOut(
         code=room.code,
         title=room.title,
         max_participants=room.max_participants,
         created_at=room.created_at,
         is_active=room.is_active,
+        participants=room.participants,
     )
 
 
+@app.get("/rooms/{code}/chat")
+async def get_chat_history(
+    code: str,
+    before: Optional[int] = Query(None, description="курсор: seq, с которого листать назад"),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Страница истории чата (от старых к новым) и курсор на более старую страницу."""
+    messages, next_cursor = chat_history.page(code, before, limit)
+    # сообщения уже закодированы — склеиваем без повторной сериализации
+    body = '{"messages":[%s],"next_cursor":%s}' % (",".join(messages), codec.dumps(next_cursor))
+    return Response(content=body, media_type="application/json")
+
+
 # ---------- WebSocket: сигналинг + управление + чат ----------
 
 @app.websocket("/ws/rooms/{code}")
 async def room_websocket(code: str, websocket: WebSocket):
     """
-    WebSocket для комнаты:
-      - type="participants" — список участников
+    WebSocket для комнаты. По умолчанию кадры — текстовый JSON;
+    с ?encoding=msgpack клиент шлёт и получает бинарные MessagePack-кадры.
+
+      - type="participants" — полный снимок участников с версией
+      - type="roster_delta" — participant_joined / participant_left с seq
+      - type="roster_resync" — (от клиента) запрос нового снимка
       - type="signal"      — WebRTC-сигналинг (offer/answer/ice)
+      - type="signal_batch" — пачка signal одной пары (from, to), если включено пакетирование
       - type="control"     — управляющие команды (разрешение видео, блокировка и т.п.)
-      - type="chat"        — текстовый чат
+      - type="chat"        — текстовый чат (у конверта есть seq)
+      - type="chat_history" — последние сообщения чата, приходят один раз при входе
     """
-    await websocket.accept()
-
+    encoding = websocket.query_params.get("encoding") or ENCODING_JSON
     client_id = websocket.query_params.get("client_id") or str(uuid4())
     name = websocket.query_params.get("name") or "Гость"
 
+    if cluster.shard_for(code, settings.NODE_WORKER_COUNT) != settings.NODE_WORKER_INDEX:
+        # соединение пришло мимо супервизора — в чужом воркере комната была бы «пустой»
+        reject = CLOSE_WRONG_WORKER
+    elif encoding not in available_encodings():
+        reject = CLOSE_UNSUPPORTED_ENCODING
+    else:
+        reject = admit(code, client_id)
+
+    try:
+        await websocket.accept()
+    except Exception:
+        if reject is None:
+            release_slot(code)
+        raise
+
+    if reject is not None:
+        # решение принято до accept(); принимаем только чтобы браузер увидел код закрытия
+        await websocket.close(code=reject)
+        return
+
     clients = room_clients.setdefault(code, {})
     meta = room_participants_meta.setdefault(code, {})
 
-    clients[client_id] = websocket
+    conn = ClientConnection(
+        client_id,
+        websocket,
+        max_size=settings.SEND_QUEUE_MAX_SIZE,
+        overflow_policy=settings.SEND_QUEUE_OVERFLOW_POLICY,
+        send_timeout=settings.SEND_TIMEOUT_SECONDS,
+        on_failed=lambda failed: evict_clients(code, [failed.client_id]),
+        encoding=encoding,
+        limits=rate_limiter.for_connection() if rate_limiter else None,
+    )
+    conn.start()
+
+    previous = clients.get(client_id)
+    if previous:
+        # переподключение с тем же client_id — старый писатель больше не нужен,
+        # а место в комнате переходит к новому соединению
+        previous.on_failed = None
+        previous.abort(1000)
+        release_slot(code)
+
+    clients[client_id] = conn
     meta[client_id] = {
         "name": name,
         "joined_at": datetime.utcnow().isoformat(),
     }
 
-    await broadcast_participants(code)
+    roster = room_rosters.setdefault(code, RoomRoster())
+    roster.join(client_id, name)
+    # новому клиенту — полный снимок, остальным — дельта по окончании окна
+    fanout.send(conn, roster.snapshot_message(), "participants")
+
+    history = chat_history.recent(code)
+    if history:
+        fanout.send(conn, '{"type":"chat_history","messages":[%s]}' % ",".join(history), "chat")
+
+    roster.schedule_flush(
+        settings.ROSTER_COALESCE_WINDOW_MS / 1000,
+        lambda: flush_roster(code),
+    )
 
     try:
         while True:
-            text = await websocket.receive_text()
-            try:
-                data = json.loads(text)
-            except json.JSONDecodeError:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("text") is not None:
+                frame = codec.decode(message["text"])
+            elif message.get("bytes") is not None and encoding == ENCODING_MSGPACK:
+                frame = codec.decode_binary(message["bytes"])
+            else:
+                frame = None
+
+            if rate_limiter and not rate_limiter.check(
+                code, conn.limits, category_for(frame.type if frame else None)
+            ):
+                if rate_limiter.policy == POLICY_DISCONNECT:
+                    rate_limiter.disconnects += 1
+                    await websocket.close(code=CLOSE_RATE_LIMITED)
+                    break
                 continue
 
-            msg_type = data.get("type")
+            if frame is None:
+                continue
 
+            msg_type = frame.type
+
+            # signal/control пересылаем исходным текстом кадра — без повторного кодирования
             if msg_type == "signal":
-                target_id = data.get("to")
-                if not target_id:
+                target_id = frame.to
+                if not target_id or target_id not in clients:
                     continue
-                target_ws = clients.get(target_id)
-                if target_ws:
-                    await target_ws.send_text(json.dumps(data))
+                if signal_coalescer:
+                    signal_coalescer.submit(code, client_id, target_id, frame.raw)
+                else:
+                    fanout.send(clients[target_id], frame.raw, "signal")
 
             elif msg_type == "control":
                 # управляющие сообщения: {type:"control", to, from, action, payload}
-                target_id = data.get("to")
+                target_id = frame.to
                 if target_id:
-                    target_ws = clients.get(target_id)
-                    if target_ws:
-                        await target_ws.send_text(json.dumps(data))
+                    target = clients.get(target_id)
+                    if target:
+                        fanout.send(target, frame.raw, "control")
                 else:
                     # broadcast по комнате, если to не указан
-                    for ws in list(clients.values()):
-                        try:
-                            await ws.send_text(json.dumps(data))
-                        except Exception:
-                            pass
+                    result = fanout.broadcast(clients.values(), frame.raw, "control")
+                    if result.failed:
+                        evict_clients(code, result.failed)
 
             elif msg_type == "chat":
                 # Простой чат: ретранслируем всем в комнате
-                text_msg = data.get("text")
+                text_msg = frame.data.get("text")
                 if not text_msg:
                     continue
 
-                author_name = data.get("name") or meta.get(client_id, {}).get("name", "Гость")
-
-                envelope = json.dumps(
-                    {
-                        "type": "chat",
-                        "from": client_id,
-                        "name": author_name,
-                        "text": text_msg,
-                        "ts": datetime.utcnow().isoformat(),
-                    }
-                )
-                for ws in list(clients.values()):
-                    try:
-                        await ws.send_text(envelope)
-                    except Exception:
-                        pass
+                author_name = frame.data.get("name") or meta.get(client_id, {}).get("name", "Гость")
+
+                envelope: codec.ChatEnvelope = {
+                    "type": "chat",
+                    "from": client_id,
+                    "name": author_name,
+                    "text": text_msg,
+                    "ts": datetime.utcnow().isoformat(),
+                }
+                result = fanout.broadcast(clients.values(), chat_history.append(code, envelope), "chat")
+                if result.failed:
+                    evict_clients(code, result.failed)
+
+            elif msg_type == "roster_resync":
+                # клиент заметил разрыв в seq — отдаём ему актуальный снимок
+                roster = room_rosters.get(code)
+                if roster:
+                    fanout.send(conn, roster.snapshot_message(), "participants")
 
             else:
                 # другие типы можно реализовать позже (чат, статус, и т.п.)
@@ -288,14 +729,7 @@ async def room_websocket(code: str, websocket: WebSocket):
     except WebSocketDisconnect:
         pass
     finally:
-        clients = room_clients.get(code, {})
-        meta = room_participants_meta.get(code, {})
-
-        clients.pop(client_id, None)
-        meta.pop(client_id, None)
+        await conn.close()
 
-        if not clients:
-            room_clients.pop(code, None)
-            room_participants_meta.pop(code, None)
-        else:
-            await broadcast_participants(code)
+        # после переподключения под этим client_id уже может жить новое соединение
+        detach_client(code, conn)
@@ -10,18 +10,33 @@ class LocalRoom:
     max_participants: int = 20
     created_at: datetime = field(default_factory=datetime.utcnow)
     is_active: bool = True
+    # сколько участников сейчас подключено (ведётся при входе/выходе)
+    participants: int = 0
 
 
 @dataclass
 class NodeState:
     rooms: Dict[str, LocalRoom] = field(default_factory=dict)
 
+    # загрузка хоста, % (сглажено EWMA, см. sampler.py)
     cpu_load: float | None = None
     mem_load: float | None = None
 
+    # показатели процесса ноды
+    process_cpu: float | None = None
+    rss_bytes: int | None = None
+    open_sockets: int | None = None
+
+    # задержка цикла событий, мс: сглаженная и худшая за интервал замера
+    loop_lag_ms: float | None = None
+    loop_lag_max_ms: float | None = None
+
     def active_rooms_count(self) -> int:
         return sum(1 for r in self.rooms.values() if r.is_active)
 
+    def participants_count(self) -> int:
+        return sum(r.participants for r in self.rooms.values())
+
 
 # Глобальный объект состояния для этой ноды
 node_state = NodeState()
@@ -0,0 +1,165 @@
+import heapq
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+CATEGORY_SIGNAL = "signal"
+CATEGORY_CONTROL = "control"
+CATEGORY_CHAT = "chat"
+CATEGORIES = (CATEGORY_SIGNAL, CATEGORY_CONTROL, CATEGORY_CHAT)
+
+POLICY_DROP = "drop"
+POLICY_DISCONNECT = "disconnect"
+
+# 1008 = "Policy Violation": клиент превысил лимит кадров
+CLOSE_RATE_LIMITED = 1008
+
+
+def category_for(msg_type: Optional[str]) -> str:
+    """Всё, что не сигналинг и не чат (включая битые кадры), считается по бюджету control."""
+    if msg_type == "signal":
+        return CATEGORY_SIGNAL
+    if msg_type == "chat":
+        return CATEGORY_CHAT
+    return CATEGORY_CONTROL
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refilled_at(self) -> float:
+        """Момент (по monotonic), когда ведро снова станет полным."""
+        missing = self.burst - self.tokens
+        if missing <= 0:
+            return self.updated
+        return self.updated + missing / self.rate if self.rate > 0 else float("inf")
+
+    def level(self, now: float) -> float:
+        self._refill(now)
+        return round(self.tokens, 2)
+
+
+class BucketSet:
+    """По одному ведру на категорию — у соединения или у комнаты."""
+
+    __slots__ = ("buckets",)
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]]) -> None:
+        self.buckets = {category: TokenBucket(rate, burst) for category, (rate, burst) in limits.items()}
+
+    def take(self, category: str, now: float) -> bool:
+        return self.buckets[category].take(now)
+
+    def refilled_at(self) -> float:
+        return max(bucket.refilled_at() for bucket in self.buckets.values())
+
+    def levels(self) -> dict:
+        now = time.monotonic()
+        return {category: bucket.level(now) for category, bucket in self.buckets.items()}
+
+
+@dataclass
+class _CategoryCounters:
+    allowed: int = 0
+    throttled_connection: int = 0
+    throttled_room: int = 0
+
+
+class RateLimiter:
+    """
+    Token bucket на соединение и на комнату, отдельно для signal/control/chat.
+
+    Кадр проходит, только если токен нашёлся и в ведре соединения, и в ведре
+    комнаты: один клиент не забьёт ни свою комнату, ни цикл событий ноды.
+    """
+
+    def __init__(
+        self,
+        connection_limits: Dict[str, Tuple[float, float]],
+        room_limits: Dict[str, Tuple[float, float]],
+        policy: str,
+    ) -> None:
+        self.connection_limits = connection_limits
+        self.room_limits = room_limits
+        self.policy = policy
+
+        self._rooms: Dict[str, BucketSet] = {}
+        # опустевшие комнаты -> момент, когда их вёдра наполнятся и их можно забыть;
+        # куча по этому моменту, чтобы не перебирать все комнаты при каждом выходе
+        self._idle_rooms: Dict[str, float] = {}
+        self._idle_heap: List[Tuple[float, str]] = []
+        self._counters: Dict[str, _CategoryCounters] = defaultdict(_CategoryCounters)
+        self.disconnects = 0
+
+    def for_connection(self) -> BucketSet:
+        return BucketSet(self.connection_limits)
+
+    def check(self, room_code: str, connection: BucketSet, category: str) -> bool:
+        now = time.monotonic()
+        counters = self._counters[category]
+
+        if not connection.take(category, now):
+            counters.throttled_connection += 1
+            return False
+
+        if self._idle_rooms:
+            # в комнате снова пишут; устаревшую запись в куче пропустит _prune_idle
+            self._idle_rooms.pop(room_code, None)
+
+        room = self._rooms.get(room_code)
+        if room is None:
+            room = self._rooms[room_code] = BucketSet(self.room_limits)
+        if not room.take(category, now):
+            counters.throttled_room += 1
+            return False
+
+        counters.allowed += 1
+        return True
+
+    def drop_room(self, room_code: str) -> None:
+        """
+        Комната опустела. Вёдра живут, пока не наполнятся: иначе выход и
+        повторный вход в пустую комнату сбрасывал бы её бюджет.
+        """
+        room = self._rooms.get(room_code)
+        if room is not None:
+            refilled_at = self._idle_rooms[room_code] = room.refilled_at()
+            heapq.heappush(self._idle_heap, (refilled_at, room_code))
+        self._prune_idle(time.monotonic())
+
+    def _prune_idle(self, now: float) -> None:
+        heap = self._idle_heap
+        while heap and heap[0][0] <= now:
+            refilled_at, code = heapq.heappop(heap)
+            if self._idle_rooms.get(code) == refilled_at:
+                del self._idle_rooms[code]
+                self._rooms.pop(code, None)
+
+    def snapshot(self) -> dict:
+        return {
+            "policy": self.policy,
+            "disconnects": self.disconnects,
+            "by_category": {
+                category: asdict(self._counters[category]) for category in CATEGORIES
+            },
+            "rooms": {code: buckets.levels() for code, buckets in self._rooms.items()},
+        }
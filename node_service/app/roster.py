@@ -0,0 +1,71 @@
+import asyncio
+from typing import Dict, List, Optional
+
+
+class RoomRoster:
+    """
+    Версионированный список участников комнаты.
+
+    Каждое изменение получает порядковый номер (seq). Новому клиенту
+    отдаётся полный снимок с текущей версией, остальным — дельты
+    participant_joined / participant_left, склеенные за короткое окно
+    в один кадр roster_delta. Клиент, увидевший разрыв (base больше
+    его версии), просит снимок заново через roster_resync.
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        # client_id -> name, в порядке входа
+        self.members: Dict[str, str] = {}
+
+        self._pending: List[dict] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def join(self, client_id: str, name: str) -> None:
+        # переподключение с тем же client_id: для остальных это выход старого
+        # соединения и вход нового — иначе они не узнали бы, что пора
+        # пересоздать соединение с этим участником
+        self.leave(client_id)
+        self.version += 1
+        self.members[client_id] = name
+        self._pending.append(
+            {"type": "participant_joined", "seq": self.version, "id": client_id, "name": name}
+        )
+
+    def leave(self, client_id: str) -> None:
+        if self.members.pop(client_id, None) is None:
+            return
+        self.version += 1
+        self._pending.append({"type": "participant_left", "seq": self.version, "id": client_id})
+
+    def snapshot_message(self) -> dict:
+        return {
+            "type": "participants",
+            "version": self.version,
+            "participants": [
+                {"id": client_id, "name": name} for client_id, name in self.members.items()
+            ],
+        }
+
+    def take_delta(self) -> Optional[dict]:
+        """Забрать накопленные изменения одним кадром (или None, если их нет)."""
+        self._flush_handle = None
+        if not self._pending:
+            return None
+
+        events, self._pending = self._pending, []
+        return {
+            "type": "roster_delta",
+            "base": events[0]["seq"] - 1,
+            "version": events[-1]["seq"],
+            "events": events,
+        }
+
+    def schedule_flush(self, delay: float, callback) -> None:
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(delay, callback)
+
+    def cancel_flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
@@ -0,0 +1,195 @@
+"""
+Фоновый замер загрузки хоста и процесса ноды.
+
+Раз в LOAD_SAMPLE_INTERVAL_SECONDS читаем /proc (CPU хоста, память хоста,
+CPU и RSS процесса, число сокетов процесса) в отдельном потоке, чтобы
+чтение файлов не занимало цикл событий. Отдельная корутина раз в
+LOOP_LAG_PROBE_INTERVAL_MS засыпает и меряет, насколько позже заданного
+она проснулась, — это задержка цикла событий, которую видят клиенты.
+Все значения сглаживаются EWMA, чтобы единичный всплеск не перекидывал
+размещение комнат.
+
+Вне Linux (нет /proc) показатели хоста остаются None, задержка цикла
+меряется везде.
+"""
+
+import asyncio
+import os
+import time
+from typing import Optional, Tuple
+
+from .models import NodeState
+
+
+PROC = "/proc"
+
+
+def _ewma(previous: Optional[float], value: Optional[float], alpha: float) -> Optional[float]:
+    if value is None:
+        return previous
+    if previous is None:
+        return value
+    return previous + alpha * (value - previous)
+
+
+def read_host_cpu() -> Optional[Tuple[int, int]]:
+    """(busy, total) в тиках из первой строки /proc/stat."""
+    try:
+        with open(f"{PROC}/stat", "rb") as f:
+            fields = f.readline().split()[1:]
+    except OSError:
+        return None
+    values = [int(v) for v in fields]
+    # idle + iowait
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    total = sum(values[:8])
+    return total - idle, total
+
+
+def read_host_mem_percent() -> Optional[float]:
+    try:
+        with open(f"{PROC}/meminfo", "rb") as f:
+            info = {}
+            for line in f:
+                key, _, rest = line.partition(b":")
+                info[key] = int(rest.split()[0])
+                if b"MemTotal" in info and b"MemAvailable" in info:
+                    break
+    except (OSError, ValueError, IndexError):
+        return None
+    total = info.get(b"MemTotal")
+    available = info.get(b"MemAvailable")
+    if not total or available is None:
+        return None
+    return 100.0 * (total - available) / total
+
+
+def read_process_cpu_seconds() -> Optional[float]:
+    try:
+        with open(f"{PROC}/self/stat", "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    # имя процесса в скобках может содержать пробелы — режем после ')'
+    fields = raw[raw.rindex(b")") + 2:].split()
+    utime, stime = int(fields[11]), int(fields[12])
+    return (utime + stime) / os.sysconf("SC_CLK_TCK")
+
+
+def read_process_rss_bytes() -> Optional[int]:
+    try:
+        with open(f"{PROC}/self/statm", "rb") as f:
+            resident = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident * os.sysconf("SC_PAGE_SIZE")
+
+
+def count_process_sockets() -> Optional[int]:
+    try:
+        entries = os.scandir(f"{PROC}/self/fd")
+    except OSError:
+        return None
+    sockets = 0
+    with entries:
+        for entry in entries:
+            try:
+                if os.readlink(entry.path).startswith("socket:"):
+                    sockets += 1
+            except OSError:
+                # дескриптор успел закрыться
+                continue
+    return sockets
+
+
+class LoadSampler:
+    def __init__(self, state: NodeState, interval: float, lag_probe_interval: float, alpha: float) -> None:
+        self.state = state
+        self.interval = interval
+        self.lag_probe_interval = lag_probe_interval
+        self.alpha = alpha
+
+        self._host_cpu: Optional[Tuple[int, int]] = None
+        self._process_cpu: Optional[Tuple[float, float]] = None
+        # максимум задержки цикла за текущее окно замера
+        self._lag_max_ms = 0.0
+        self.sample_seconds = 0.0
+
+        self._tasks: list = []
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._sample_loop()), loop.create_task(self._lag_loop())]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    # ---------- /proc ----------
+
+    def sample(self) -> dict:
+        """Один замер. Синхронный — вызывается в отдельном потоке."""
+        started = time.perf_counter()
+        result = {
+            "cpu_load": None,
+            "mem_load": read_host_mem_percent(),
+            "process_cpu": None,
+            "rss_bytes": read_process_rss_bytes(),
+            "open_sockets": count_process_sockets(),
+        }
+
+        host = read_host_cpu()
+        if host is not None:
+            if self._host_cpu is not None:
+                busy = host[0] - self._host_cpu[0]
+                total = host[1] - self._host_cpu[1]
+                if total > 0:
+                    result["cpu_load"] = 100.0 * busy / total
+            self._host_cpu = host
+
+        process = read_process_cpu_seconds()
+        if process is not None:
+            now = time.monotonic()
+            if self._process_cpu is not None:
+                elapsed = now - self._process_cpu[1]
+                if elapsed > 0:
+                    result["process_cpu"] = 100.0 * (process - self._process_cpu[0]) / elapsed
+            self._process_cpu = (process, now)
+
+        self.sample_seconds = time.perf_counter() - started
+        return result
+
+    def apply(self, sample: dict) -> None:
+        state = self.state
+        state.cpu_load = _round(_ewma(state.cpu_load, sample["cpu_load"], self.alpha))
+        state.mem_load = _round(_ewma(state.mem_load, sample["mem_load"], self.alpha))
+        state.process_cpu = _round(_ewma(state.process_cpu, sample["process_cpu"], self.alpha))
+        # RSS и сокеты — уровни, а не скорости: сглаживать их незачем
+        state.rss_bytes = sample["rss_bytes"]
+        state.open_sockets = sample["open_sockets"]
+        # худшая задержка цикла за прошедший интервал; окно начинается заново
+        state.loop_lag_max_ms = round(self._lag_max_ms, 2)
+        self._lag_max_ms = 0.0
+
+    async def _sample_loop(self) -> None:
+        while True:
+            try:
+                self.apply(await asyncio.to_thread(self.sample))
+            except Exception as e:
+                print(f"[sampler] sample failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    # ---------- задержка цикла событий ----------
+
+    async def _lag_loop(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.lag_probe_interval
+            await asyncio.sleep(self.lag_probe_interval)
+            lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+            self._lag_max_ms = max(self._lag_max_ms, lag_ms)
+            self.state.loop_lag_ms = _round(_ewma(self.state.loop_lag_ms, lag_ms, self.alpha))
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
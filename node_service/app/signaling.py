@@ -0,0 +1,102 @@
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import codec
+
+
+# (room_code, from_id, to_id)
+PairKey = Tuple[str, str, str]
+
+
+def build_signal_batch(from_id: str, to_id: str, texts: List[str]) -> str:
+    """Склеиваем уже закодированные signal-кадры в один массив без повторного кодирования."""
+    return '{"type":"signal_batch","from":%s,"to":%s,"signals":[%s]}' % (
+        codec.dumps(from_id),
+        codec.dumps(to_id),
+        ",".join(texts),
+    )
+
+
+class SignalCoalescer:
+    """
+    Пакетная ретрансляция сигналинга.
+
+    Сообщения одной пары (from, to) копятся в течение окна и уходят одним
+    кадром signal_batch, порядок внутри пары сохраняется. Одиночное
+    сообщение уходит как обычный signal-кадр.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        max_batch: int,
+        deliver: Callable[[str, str, str], None],
+    ) -> None:
+        self.window = window
+        self.max_batch = max_batch
+        # deliver(room_code, to_id, text)
+        self._deliver = deliver
+
+        self._pending: Dict[PairKey, List[str]] = {}
+        self._handles: Dict[PairKey, asyncio.TimerHandle] = {}
+
+        self.signals_in = 0
+        self.frames_out = 0
+
+    def submit(self, room_code: str, from_id: str, to_id: str, text: str) -> None:
+        key = (room_code, from_id, to_id)
+        batch = self._pending.setdefault(key, [])
+        batch.append(text)
+        self.signals_in += 1
+
+        if len(batch) >= self.max_batch:
+            self.flush(key)
+        elif key not in self._handles:
+            self._handles[key] = asyncio.get_running_loop().call_later(
+                self.window, self.flush, key
+            )
+
+    def flush(self, key: PairKey) -> None:
+        handle = self._handles.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+
+        texts = self._pending.pop(key, None)
+        if not texts:
+            return
+
+        room_code, from_id, to_id = key
+        if len(texts) == 1:
+            frame = texts[0]
+        else:
+            frame = build_signal_batch(from_id, to_id, texts)
+        self.frames_out += 1
+        self._deliver(room_code, to_id, frame)
+
+    def drop_client(self, room_code: str, client_id: str) -> None:
+        """Клиент ушёл — его недоставленные и адресованные ему сигналы больше не нужны."""
+        for key in [k for k in self._pending if k[0] == room_code and client_id in (k[1], k[2])]:
+            handle = self._handles.pop(key, None)
+            if handle is not None:
+                handle.cancel()
+            self._pending.pop(key, None)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": True,
+            "window_ms": round(self.window * 1000, 3),
+            "signals_in": self.signals_in,
+            "frames_out": self.frames_out,
+            "pending_pairs": len(self._pending),
+        }
+
+
+def make_coalescer(
+    window_ms: int,
+    max_batch: int,
+    deliver: Callable[[str, str, str], None],
+) -> Optional[SignalCoalescer]:
+    """None — пакетирование выключено (окно 0), сигналы ретранслируются сразу."""
+    if window_ms <= 0:
+        return None
+    return SignalCoalescer(window_ms / 1000, max_batch, deliver)
@@ -0,0 +1,182 @@
+"""
+Постоянный канал нода -> control-plane.
+
+Вместо полного POST /nodes/{id}/heartbeat раз в HEARTBEAT_INTERVAL_SECONDS
+нода держит один WebSocket к /nodes/{id}/stream и шлёт по нему только то,
+что изменилось:
+
+    {"type": "snapshot", "state": {...}, "rooms": {code: participants}}
+        — один раз после подключения;
+    {"type": "delta", "state": {...изменённые поля}, "rooms": {...}, "rooms_gone": [...]}
+        — при изменениях; пустая дельта раз в HEARTBEAT_INTERVAL_SECONDS
+          служит keepalive.
+
+Показатели загрузки перед сравнением округляются (см. LOAD_QUANTUM), иначе
+дрожание CPU на десятые доли процента давало бы дельту на каждом тике.
+Вход/выход участника и старт/стоп комнаты будят канал сразу (notify), но
+не чаще одного кадра в CONTROL_STREAM_MIN_GAP_MS — всплеск входов
+склеивается в одну дельту. Пока канал не поднят, работает старый POST.
+"""
+
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import websockets
+
+
+# Поля состояния ноды, которые уходят в control-plane (и в POST heartbeat)
+LOAD_FIELDS = (
+    "active_rooms",
+    "participants",
+    "cpu_load",
+    "mem_load",
+    "process_cpu",
+    "rss_bytes",
+    "open_sockets",
+    "loop_lag_ms",
+    "loop_lag_max_ms",
+)
+
+# Шаг округления показателей: изменение меньше шага дельту не порождает
+LOAD_QUANTUM = {
+    "cpu_load": 1.0,
+    "mem_load": 1.0,
+    "process_cpu": 1.0,
+    "loop_lag_ms": 1.0,
+    "loop_lag_max_ms": 5.0,
+    "rss_bytes": 1024 * 1024,
+    "open_sockets": 8,
+}
+
+MAX_RECONNECT_DELAY = 30.0
+
+
+def quantize(state: dict) -> dict:
+    result = {}
+    for key in LOAD_FIELDS:
+        value = state.get(key)
+        step = LOAD_QUANTUM.get(key)
+        if value is not None and step is not None:
+            value = round(value / step) * step
+            if isinstance(step, int):
+                value = int(value)
+        result[key] = value
+    return result
+
+
+def active_rooms_map(state: dict) -> Dict[str, int]:
+    return {room["code"]: room["participants"] for room in state["rooms"] if room["is_active"]}
+
+
+def stream_url(control_plane_url: str, node_id: str) -> str:
+    base = control_plane_url.rstrip("/")
+    if base.startswith("https://"):
+        base = "wss://" + base[len("https://"):]
+    elif base.startswith("http://"):
+        base = "ws://" + base[len("http://"):]
+    return f"{base}/nodes/{node_id}/stream"
+
+
+class ControlPlaneUplink:
+    def __init__(
+        self,
+        url: str,
+        collect: Callable[[], Awaitable[dict]],
+        tick: float,
+        min_gap: float,
+        keepalive: float,
+    ) -> None:
+        self.url = url
+        self.collect = collect
+        self.tick = tick
+        self.min_gap = min_gap
+        self.keepalive = keepalive
+
+        self.connected = False
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.reconnects = 0
+
+        self._wake = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self.run())
+
+    def notify(self) -> None:
+        """
+        Состав комнат изменился — отправить дельту, не дожидаясь тика.
+        Синхронные эндпоинты FastAPI работают в пуле потоков, поэтому будим через call_soon_threadsafe.
+        """
+        if self._loop is not None and self.connected:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                async with websockets.connect(self.url, open_timeout=5, max_size=None) as ws:
+                    self.connected = True
+                    delay = 1.0
+                    await self._session(ws)
+            except Exception as e:
+                print(f"[uplink] stream to control-plane lost: {e}")
+            finally:
+                if self.connected:
+                    self.reconnects += 1
+                self.connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _send(self, ws, message: dict) -> None:
+        text = json.dumps(message, separators=(",", ":"))
+        await ws.send(text)
+        self.sent_messages += 1
+        self.sent_bytes += len(text)
+
+    async def _session(self, ws) -> None:
+        state = await self.collect()
+        last = quantize(state)
+        last_rooms = active_rooms_map(state)
+        await self._send(ws, {"type": "snapshot", "state": last, "rooms": last_rooms})
+        last_sent = time.monotonic()
+
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            state = await self.collect()
+            current = quantize(state)
+            rooms = active_rooms_map(state)
+
+            changed = {key: value for key, value in current.items() if last.get(key) != value}
+            rooms_changed = {code: n for code, n in rooms.items() if last_rooms.get(code) != n}
+            rooms_gone: List[str] = [code for code in last_rooms if code not in rooms]
+
+            if changed or rooms_changed or rooms_gone or time.monotonic() - last_sent >= self.keepalive:
+                message: dict = {"type": "delta", "state": changed}
+                if rooms_changed:
+                    message["rooms"] = rooms_changed
+                if rooms_gone:
+                    message["rooms_gone"] = rooms_gone
+                await self._send(ws, message)
+                last, last_rooms = current, rooms
+                last_sent = time.monotonic()
+                # склеиваем всплеск событий в следующую дельту
+                await asyncio.sleep(self.min_gap)
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "sent_messages": self.sent_messages,
+            "sent_bytes": self.sent_bytes,
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,124 @@
+"""
+Форматы кадров на проводе и учёт байтов по типам сообщений.
+
+По умолчанию клиент получает текстовые JSON-кадры (их дополнительно
+сжимает permessage-deflate, если клиент его согласовал). По
+?encoding=msgpack клиент переходит на бинарные MessagePack-кадры: каждый
+кадр перекодируется один раз и разделяется всеми msgpack-получателями.
+"""
+
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack необязателен
+    msgpack = None
+
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+# Оценку сжатия deflate считаем по каждому N-му кадру — сжатие само стоит CPU
+DEFLATE_SAMPLE_EVERY = 16
+
+# 1003 = "Unsupported Data": запрошенная кодировка недоступна на этой ноде
+CLOSE_UNSUPPORTED_ENCODING = 1003
+
+
+def available_encodings() -> tuple:
+    return (ENCODING_JSON, ENCODING_MSGPACK) if msgpack is not None else (ENCODING_JSON,)
+
+
+@dataclass
+class _TypeStats:
+    frames: int = 0
+    json_bytes: int = 0
+
+    deflate_sampled_in: int = 0
+    deflate_sampled_out: int = 0
+
+    text_sends: int = 0
+    text_bytes: int = 0
+    msgpack_sends: int = 0
+    msgpack_bytes: int = 0
+    # json-размер тех же кадров, что ушли в msgpack, — база для сравнения
+    msgpack_json_bytes: int = 0
+    msgpack_encode_seconds: float = 0.0
+
+    def snapshot(self) -> dict:
+        def ratio(part: int, whole: int):
+            return round(part / whole, 3) if whole else None
+
+        return {
+            "frames": self.frames,
+            "avg_json_bytes": round(self.json_bytes / self.frames) if self.frames else 0,
+            # доля от исходного размера; 0.3 = на проводе 30% от JSON
+            "deflate_ratio_est": ratio(self.deflate_sampled_out, self.deflate_sampled_in),
+            "msgpack_ratio": ratio(self.msgpack_bytes, self.msgpack_json_bytes),
+            "text_sends": self.text_sends,
+            "text_bytes": self.text_bytes,
+            "msgpack_sends": self.msgpack_sends,
+            "msgpack_bytes": self.msgpack_bytes,
+            "msgpack_encode_ms": round(self.msgpack_encode_seconds * 1000, 3),
+        }
+
+
+class WireStats:
+    def __init__(self) -> None:
+        self._by_type: Dict[str, _TypeStats] = defaultdict(_TypeStats)
+
+    def record_frame(self, msg_type: str, text: str) -> int:
+        """Новый кадр (один раз на кадр, а не на получателя). Возвращает его JSON-размер."""
+        stats = self._by_type[msg_type]
+        raw = text.encode("utf-8")
+        stats.frames += 1
+        stats.json_bytes += len(raw)
+
+        if stats.frames % DEFLATE_SAMPLE_EVERY == 1:
+            # raw deflate без общего контекста — нижняя оценка выигрыша permessage-deflate
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            stats.deflate_sampled_in += len(raw)
+            stats.deflate_sampled_out += len(compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH))
+        return len(raw)
+
+    def record_text_send(self, msg_type: str, size: int) -> None:
+        stats = self._by_type[msg_type]
+        stats.text_sends += 1
+        stats.text_bytes += size
+
+    def record_msgpack_send(self, msg_type: str, json_size: int, size: int) -> None:
+        stats = self._by_type[msg_type]
+        stats.msgpack_sends += 1
+        stats.msgpack_bytes += size
+        stats.msgpack_json_bytes += json_size
+
+    def record_msgpack_encode(self, msg_type: str, seconds: float) -> None:
+        self._by_type[msg_type].msgpack_encode_seconds += seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "encodings": list(available_encodings()),
+            "by_type": {msg_type: stats.snapshot() for msg_type, stats in self._by_type.items()},
+        }
+
+
+wire_stats = WireStats()
+
+
+def pack(obj) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpack(payload: bytes):
+    return msgpack.unpackb(payload, raw=False)
+
+
+def timed_pack(msg_type: str, obj) -> bytes:
+    started = time.perf_counter()
+    payload = pack(obj)
+    wire_stats.record_msgpack_encode(msg_type, time.perf_counter() - started)
+    return payload
@@ -0,0 +1,166 @@
+"""
+Процесс-воркер многопроцессного node_service (запускает супервизор из cluster.py).
+
+Это обычный uvicorn со всеми его параметрами командной строки плюс ещё один
+unix-сокет: по нему супервизор передаёт принятые TCP-соединения клиентов
+(SCM_RIGHTS) вместе с уже прочитанным заголовком запроса. Дальше соединение
+целиком обслуживает воркер — байты через супервизор больше не идут.
+
+    python -m node_service.app.worker --uds /tmp/quiet-node-x/worker-0.sock
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import os
+import socket
+import sys
+from typing import Callable, List, Optional, Set
+
+import uvicorn
+
+from .cluster import HANDOFF_MAX_BYTES, worker_handoff_path
+from .config import settings
+
+APP = "node_service.app.main:app"
+
+# ссылки на задачи подключения, чтобы их не собрал сборщик мусора
+_adopting: Set[asyncio.Task] = set()
+
+
+def adopt_connection(
+    loop: asyncio.AbstractEventLoop,
+    create_protocol: Callable[[], asyncio.Protocol],
+    fd: int,
+    data: bytes,
+) -> None:
+    """Обслуживаем переданный супервизором сокет так, будто uvicorn принял его сам."""
+    sock = socket.socket(fileno=fd)
+    sock.setblocking(False)
+
+    def protocol_factory() -> asyncio.Protocol:
+        protocol = create_protocol()
+        connection_made = protocol.connection_made
+
+        def made(transport: asyncio.BaseTransport) -> None:
+            connection_made(transport)
+            # заголовок уже прочитан супервизором; отдаём его до первого чтения из сокета
+            protocol.data_received(data)
+
+        protocol.connection_made = made  # type: ignore[method-assign]
+        return protocol
+
+    async def connect() -> None:
+        try:
+            await loop.connect_accepted_socket(protocol_factory, sock)
+        except Exception as e:
+            print(f"[worker] handed-off connection failed: {e}")
+            sock.close()
+
+    task = loop.create_task(connect())
+    _adopting.add(task)
+    task.add_done_callback(_adopting.discard)
+
+
+class HandoffListener:
+    """Принимает соединения супервизора и забирает из них сокеты клиентов."""
+
+    def __init__(self, path: str, create_protocol: Callable[[], asyncio.Protocol]) -> None:
+        self.path = path
+        self.create_protocol = create_protocol
+        self._listener: Optional[socket.socket] = None
+        self._peers: List[socket.socket] = []
+        self._accepting: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        listener.bind(self.path)
+        listener.listen()
+        listener.setblocking(False)
+        self._listener = listener
+        self._accepting = asyncio.get_running_loop().create_task(self._accept())
+
+    async def _accept(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            peer, _ = await loop.sock_accept(self._listener)
+            peer.setblocking(False)
+            self._peers.append(peer)
+            loop.add_reader(peer.fileno(), self._receive, peer)
+
+    def _receive(self, peer: socket.socket) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                data, fds, _flags, _addr = socket.recv_fds(peer, HANDOFF_MAX_BYTES, 1)
+            except BlockingIOError:
+                return
+            except OSError:
+                data, fds = b"", []
+            if not data and not fds:
+                # супервизор закрыл канал (перезапуск) — он переподключится
+                self._drop(peer)
+                return
+            for fd in fds:
+                adopt_connection(loop, self.create_protocol, fd, data)
+
+    def _drop(self, peer: socket.socket) -> None:
+        asyncio.get_running_loop().remove_reader(peer.fileno())
+        peer.close()
+        if peer in self._peers:
+            self._peers.remove(peer)
+
+    def stop(self) -> None:
+        if self._accepting is not None:
+            self._accepting.cancel()
+        for peer in list(self._peers):
+            self._drop(peer)
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class HandoffServer(uvicorn.Server):
+    """uvicorn.Server, который вдобавок принимает сокеты клиентов от супервизора."""
+
+    handoff: Optional[HandoffListener] = None
+
+    def create_protocol(self) -> asyncio.Protocol:
+        # то же, что делает uvicorn для соединений со своего сокета: соединение
+        # попадает в server_state и учитывается при штатной остановке
+        return self.config.http_protocol_class(  # type: ignore[call-arg]
+            config=self.config,
+            server_state=self.server_state,
+            app_state=self.lifespan.state,
+        )
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if self.should_exit:
+            return
+        path = worker_handoff_path(settings.NODE_WORKER_SOCKET_DIR, settings.NODE_WORKER_INDEX)
+        self.handoff = HandoffListener(path, self.create_protocol)
+        self.handoff.start()
+
+    async def shutdown(self, sockets=None) -> None:
+        if self.handoff is not None:
+            self.handoff.stop()
+        await super().shutdown(sockets=sockets)
+
+
+def main() -> None:
+    # uvicorn.main.run создаёт Server по имени из своего модуля — подставляем
+    # наш подкласс, чтобы все параметры командной строки uvicorn работали как есть.
+    # (атрибут uvicorn.main пакета — это уже click-команда, а не модуль)
+    cli = importlib.import_module("uvicorn.main")
+    cli.Server = HandoffServer
+    cli.main([APP, *sys.argv[1:]], prog_name="uvicorn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app import main
+from app.models import LocalRoom
+
+
+@pytest.fixture
+def client():
+    main.node_state.rooms.clear()
+    main.room_clients.clear()
+    main.room_participants_meta.clear()
+    main.room_rosters.clear()
+    yield TestClient(main.app)
+    main.node_state.rooms.clear()
+
+
+def test_full_room_rejects_newcomer(client):
+    main.node_state.rooms["R1"] = LocalRoom(code="R1", max_participants=1)
+    with client.websocket_connect("/ws/rooms/R1?client_id=a") as a:
+        assert a.receive_json()["type"] == "participants"
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect("/ws/rooms/R1?client_id=b") as b:
+                b.receive_json()
+        assert exc.value.code == main.CLOSE_ROOM_FULL
+
+
+def test_reconnect_into_full_room_takes_over_slot(client):
+    room = main.node_state.rooms["R2"] = LocalRoom(code="R2", max_participants=2)
+    with client.websocket_connect("/ws/rooms/R2?client_id=a") as a:
+        a.receive_json()
+        with client.websocket_connect("/ws/rooms/R2?client_id=b") as b:
+            b.receive_json()
+            assert room.participants == 2
+
+            with client.websocket_connect("/ws/rooms/R2?client_id=b") as b2:
+                snapshot = b2.receive_json()
+                assert snapshot["type"] == "participants"
+                assert [p["id"] for p in snapshot["participants"]] == ["a", "b"]
+                assert room.participants == 2
+                assert main.room_clients["R2"]["b"] is not None
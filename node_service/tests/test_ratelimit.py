@@ -0,0 +1,48 @@
+import pytest
+
+from app import ratelimit
+from app.ratelimit import CATEGORIES, CATEGORY_CHAT, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_limiter() -> RateLimiter:
+    connection = {category: (100.0, 100.0) for category in CATEGORIES}
+    room = {category: (10.0, 2.0) for category in CATEGORIES}
+    return RateLimiter(connection, room, ratelimit.POLICY_DROP)
+
+
+def test_rejoining_empty_room_keeps_its_budget(clock):
+    limiter = make_limiter()
+    assert limiter.check("R", limiter.for_connection(), CATEGORY_CHAT)
+    assert limiter.check("R", limiter.for_connection(), CATEGORY_CHAT)
+
+    limiter.drop_room("R")
+    assert not limiter.check("R", limiter.for_connection(), CATEGORY_CHAT)
+
+
+def test_idle_room_is_forgotten_once_refilled(clock):
+    limiter = make_limiter()
+    limiter.check("R", limiter.for_connection(), CATEGORY_CHAT)
+    limiter.drop_room("R")
+    assert "R" in limiter.snapshot()["rooms"]
+
+    clock[0] += 1.0
+    limiter.drop_room("other")
+    assert "R" not in limiter.snapshot()["rooms"]
+
+
+def test_room_active_again_is_not_pruned(clock):
+    limiter = make_limiter()
+    limiter.check("R", limiter.for_connection(), CATEGORY_CHAT)
+    limiter.drop_room("R")
+    limiter.check("R", limiter.for_connection(), CATEGORY_CHAT)
+
+    clock[0] += 1.0
+    limiter.drop_room("other")
+    assert "R" in limiter.snapshot()["rooms"]
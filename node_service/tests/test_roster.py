@@ -0,0 +1,18 @@
+from app.roster import RoomRoster
+
+
+def test_rejoin_with_same_id_is_left_then_joined():
+    roster = RoomRoster()
+    roster.join("a", "Анна")
+    roster.take_delta()
+
+    roster.join("a", "Анна")
+    delta = roster.take_delta()
+
+    assert [(e["type"], e["id"]) for e in delta["events"]] == [
+        ("participant_left", "a"),
+        ("participant_joined", "a"),
+    ]
+    assert delta["base"] == 1
+    assert delta["version"] == 3
+    assert list(roster.members) == ["a"]
@@ -0,0 +1,150 @@
+"""
+Бенчмарк пропускной способности control-plane: синхронная сессия vs AsyncSession.
+
+Поднимает control-plane (uvicorn) на временной SQLite-базе дважды — с
+DATABASE_URL=sqlite:/// (эндпоинты ходят в БД из пула потоков) и
+sqlite+aiosqlite:/// (AsyncSession в цикле событий) — и гоняет по
+существующим роутерам смесь чтений: GET /rooms/{code}/node, GET /users/me,
+GET /nodes/{id}. Печатает запросов/сек и задержки:
+
+    python scripts/bench_db_async.py
+    python scripts/bench_db_async.py --concurrency 200 --seconds 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+EMAIL = "bench@example.com"
+PASSWORD = "12345678"
+
+MODES = [
+    ("Session + пул потоков", "sqlite"),
+    ("AsyncSession (aiosqlite)", "sqlite+aiosqlite"),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, scheme: str) -> subprocess.Popen:
+    db_dir = tempfile.mkdtemp(prefix="quiet-bench-")
+    env = dict(os.environ, DATABASE_URL=f"{scheme}:///{db_dir}/bench.db", PASSWORD_HASH_WORKERS="0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("control-plane не поднялся")
+
+
+async def seed(client: httpx.AsyncClient) -> list[tuple[str, dict]]:
+    """Пользователь, нода и комната; возвращает запросы для нагрузки."""
+    (await client.post("/auth/register", json={"email": EMAIL, "password": PASSWORD})).raise_for_status()
+    resp = await client.post("/auth/login", data={"username": EMAIL, "password": PASSWORD})
+    resp.raise_for_status()
+    auth = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    # адрес ноды никуда не ведёт: фоновый запуск комнаты на ноде просто не удастся
+    resp = await client.post("/nodes/", json={"name": "bench", "base_url": "http://127.0.0.1:9", "max_rooms": 10})
+    resp.raise_for_status()
+    node_id = resp.json()["id"]
+    resp = await client.post("/rooms/", json={"title": "bench"}, headers=auth)
+    resp.raise_for_status()
+    code = resp.json()["code"]
+
+    return [
+        (f"/rooms/{code}/node", {}),
+        ("/users/me", auth),
+        (f"/nodes/{node_id}", {}),
+    ]
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    requests: "itertools.cycle[tuple[str, dict]]",
+    deadline: float,
+    latencies: list[float],
+) -> None:
+    while time.perf_counter() < deadline:
+        path, headers = next(requests)
+        started = time.perf_counter()
+        resp = await client.get(path, headers=headers)
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+def pct(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+async def run_mode(scheme: str, args: argparse.Namespace) -> dict:
+    port = free_port()
+    proc = start_server(port, scheme)
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_ready(client)
+            requests = itertools.cycle(await seed(client))
+
+            # прогрев: кэши, пул соединений
+            await worker(client, requests, time.perf_counter() + 0.5, [])
+
+            latencies: list[float] = []
+            deadline = time.perf_counter() + args.seconds
+            await asyncio.gather(*(worker(client, requests, deadline, latencies) for _ in range(args.concurrency)))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    return {
+        "rps": len(latencies) / args.seconds,
+        "p50": pct(latencies, 0.5),
+        "p99": pct(latencies, 0.99),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных запросов")
+    parser.add_argument("--seconds", type=float, default=5.0, help="длительность замера в каждом режиме")
+    args = parser.parse_args()
+
+    print(f"одновременных запросов: {args.concurrency}, CPU: {os.cpu_count()}")
+    print(f"{'режим':<28}{'req/s':>10}{'p50':>10}{'p99':>10}")
+    for title, scheme in MODES:
+        r = asyncio.run(run_mode(scheme, args))
+        print(f"{title:<28}{r['rps']:>10,.0f}{r['p50']:>8.1f}ms{r['p99']:>8.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
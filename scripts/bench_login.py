@@ -0,0 +1,148 @@
+"""
+Бенчмарк логинов под нагрузкой.
+
+Поднимает control-plane (uvicorn) на временной SQLite-базе дважды: с
+хэшированием паролей в пуле потоков (PASSWORD_HASH_WORKERS=0, как раньше
+в синхронных эндпоинтах) и в пуле процессов. В каждом режиме гонит волну
+POST /auth/login и параллельно меряет задержку постороннего эндпоинта
+(GET /nodes/), которому нужен тот же пул потоков:
+
+    python scripts/bench_login.py
+    python scripts/bench_login.py --workers 4 --concurrency 64 --seconds 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+EMAIL = "bench@example.com"
+PASSWORD = "12345678"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, rounds: int) -> subprocess.Popen:
+    db_dir = tempfile.mkdtemp(prefix="quiet-bench-")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_dir}/bench.db",
+        PASSWORD_HASH_WORKERS=str(workers),
+        PASSWORD_HASH_ROUNDS=str(rounds),
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("control-plane не поднялся")
+
+
+async def login_storm(client: httpx.AsyncClient, deadline: float, done: list[float]) -> None:
+    form = {"username": EMAIL, "password": PASSWORD}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        resp = await client.post("/auth/login", data=form)
+        resp.raise_for_status()
+        done.append(time.perf_counter() - started)
+
+
+async def probe(client: httpx.AsyncClient, deadline: float, latencies: list[float]) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        resp = await client.get("/nodes/")
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.02)
+
+
+def pct(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+async def run_mode(workers: int, args: argparse.Namespace) -> dict:
+    port = free_port()
+    proc = start_server(port, workers, args.rounds)
+    limits = httpx.Limits(max_connections=args.concurrency + 8)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_ready(client)
+            resp = await client.post("/auth/register", json={"email": EMAIL, "password": PASSWORD})
+            resp.raise_for_status()
+
+            # задержка в покое — точка отсчёта
+            idle: list[float] = []
+            await probe(client, time.perf_counter() + 1.0, idle)
+
+            logins: list[float] = []
+            loaded: list[float] = []
+            deadline = time.perf_counter() + args.seconds
+            await asyncio.gather(
+                probe(client, deadline, loaded),
+                *(login_storm(client, deadline, logins) for _ in range(args.concurrency)),
+            )
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    return {
+        "logins_per_sec": len(logins) / args.seconds,
+        "login_p50": pct(logins, 0.5),
+        "idle_p50": statistics.median(idle) * 1000,
+        "probe_p50": pct(loaded, 0.5),
+        "probe_p99": pct(loaded, 0.99),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="размер пула процессов для второго режима")
+    parser.add_argument("--rounds", type=int, default=29000, help="итерации pbkdf2_sha256")
+    parser.add_argument("--concurrency", type=int, default=32, help="одновременных логинов")
+    parser.add_argument("--seconds", type=float, default=5.0, help="длительность волны в каждом режиме")
+    args = parser.parse_args()
+
+    modes = [("пул потоков", 0), (f"пул процессов x{args.workers}", args.workers)]
+    print(f"итераций: {args.rounds}, одновременных логинов: {args.concurrency}, CPU: {os.cpu_count()}")
+    print(f"{'режим':<22}{'login/s':>10}{'login p50':>12}{'/nodes idle':>13}{'/nodes p50':>12}{'/nodes p99':>12}")
+    for title, workers in modes:
+        r = asyncio.run(run_mode(workers, args))
+        print(
+            f"{title:<22}{r['logins_per_sec']:>10,.1f}{r['login_p50']:>10.1f}ms"
+            f"{r['idle_p50']:>11.1f}ms{r['probe_p50']:>10.1f}ms{r['probe_p99']:>10.1f}ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
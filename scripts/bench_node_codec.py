@@ -0,0 +1,107 @@
+"""
+Микробенчмарк кодека WebSocket-протокола ноды.
+
+Сравнивает сообщений/сек старого пути (json.loads + json.dumps на каждую
+пересылку, а для broadcast control — json.dumps на каждого получателя)
+с node_service.app.codec (разбор заголовка + пересылка исходного текста):
+
+    python scripts/bench_node_codec.py
+    python scripts/bench_node_codec.py --seconds 2 --room-size 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from node_service.app import codec  # noqa: E402
+
+
+def sample_frames() -> Dict[str, str]:
+    sdp = "\r\n".join(
+        f"a=candidate:{i} 1 udp 2122260223 192.168.1.{i} 5{i:04d} typ host generation 0" for i in range(40)
+    )
+    return {
+        "signal_ice": json.dumps(
+            {
+                "type": "signal",
+                "from": "c3b0c7a2-1f7e-4bb0-9b1e-111111111111",
+                "to": "f0e1d2c3-4b5a-6978-8a9b-222222222222",
+                "signalType": "ice",
+                "payload": {
+                    "candidate": "candidate:842163049 1 udp 1677729535 203.0.113.7 61782 typ srflx",
+                    "sdpMid": "0",
+                    "sdpMLineIndex": 0,
+                },
+            }
+        ),
+        "signal_offer": json.dumps(
+            {
+                "type": "signal",
+                "from": "c3b0c7a2-1f7e-4bb0-9b1e-111111111111",
+                "to": "f0e1d2c3-4b5a-6978-8a9b-222222222222",
+                "signalType": "offer",
+                "payload": {"type": "offer", "sdp": "v=0\r\n" + sdp},
+            }
+        ),
+        "control": json.dumps(
+            {
+                "type": "control",
+                "from": "c3b0c7a2-1f7e-4bb0-9b1e-111111111111",
+                "action": "video_permission",
+                "payload": {"allowed": True},
+            }
+        ),
+    }
+
+
+def legacy_relay(text: str, recipients: int) -> int:
+    data = json.loads(text)
+    if data.get("type") == "control" and not data.get("to"):
+        return sum(len(json.dumps(data)) for _ in range(recipients))
+    return len(json.dumps(data))
+
+
+def codec_relay(text: str, recipients: int) -> int:
+    frame = codec.decode(text)
+    if frame.type == "control" and not frame.to:
+        return len(frame.raw) * recipients
+    return len(frame.raw)
+
+
+def measure(fn: Callable[[str, int], int], text: str, recipients: int, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(200):
+            fn(text, recipients)
+        count += 200
+    return count / seconds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="длительность замера на каждый случай")
+    parser.add_argument("--room-size", type=int, default=20, help="получателей у broadcast control")
+    args = parser.parse_args()
+
+    print(f"JSON-бэкенд кодека: {codec.JSON_BACKEND}")
+    print(f"{'сообщение':<14}{'байт':>8}{'legacy msg/s':>16}{'codec msg/s':>16}{'x':>8}")
+    for name, text in sample_frames().items():
+        legacy = measure(legacy_relay, text, args.room_size, args.seconds)
+        fast = measure(codec_relay, text, args.room_size, args.seconds)
+        print(f"{name:<14}{len(text):>8}{legacy:>16,.0f}{fast:>16,.0f}{fast / legacy:>8.2f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+"""
+Бенчмарк сериализации больших листингов control-plane.
+
+Для /rooms/my и /nodes/ сравнивает строк/сек прежнего пути (ORM-объекты ->
+проверка response_model в FastAPI -> JSONResponse) и быстрого пути
+app/serialization.py (колонки схемы -> TypeAdapter -> готовые байты) на
+временной SQLite-базе. Заодно проверяет, что JSON у обоих путей одинаковый:
+
+    python scripts/bench_serialization.py
+    python scripts/bench_serialization.py --rows 50000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# база для замера — временная, рабочую не трогаем
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='quiet-bench-')}/bench.db"
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from app import crud, models, schemas  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.heartbeats import heartbeats  # noqa: E402
+from app.migrate import upgrade  # noqa: E402
+from app.models import NodeStatus, RoomStatus  # noqa: E402
+from app.principals import Principal  # noqa: E402
+from app.serialization import NODE_LIST, ROOM_LIST, render  # noqa: E402
+
+
+def seed(rows: int) -> Principal:
+    started = datetime.utcnow()
+    owner = Principal(id=str(uuid.uuid4()), email="bench@example.com", max_rooms=rows, created_at=started)
+    node_ids = [str(uuid.uuid4()) for _ in range(rows)]
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__).values(
+            id=owner.id, email=owner.email, hashed_password="x", max_rooms=rows, created_at=started,
+        ))
+        conn.execute(insert(models.ServerNode.__table__), [
+            {"id": node_id, "name": f"node-{i}", "base_url": f"http://node-{i}.example.com:9000/",
+             "status": NodeStatus.ACTIVE, "max_rooms": 10, "active_rooms": i % 10, "cpu_load": random.uniform(0, 100),
+             "mem_load": random.uniform(0, 100), "last_heartbeat": started, "created_at": started + timedelta(microseconds=i)}
+            for i, node_id in enumerate(node_ids)
+        ])
+        conn.execute(insert(models.Room.__table__), [
+            {"id": str(uuid.uuid4()), "code": uuid.uuid4().hex[:8], "title": f"room {i}", "owner_id": owner.id,
+             "node_id": random.choice(node_ids), "max_participants": 20, "status": RoomStatus.ACTIVE,
+             "created_at": started + timedelta(microseconds=i), "is_deleted": False}
+            for i in range(rows)
+        ])
+    # часть нод с heartbeat в памяти — как в работающем сервисе
+    for node_id in node_ids[::2]:
+        heartbeats.record(node_id, schemas.ServerNodeHeartbeat(active_rooms=3, participants=40, loop_lag_ms=1.5))
+    return owner
+
+
+async def legacy_rooms(owner: Principal, field) -> bytes:
+    """Как было: ORM-объекты, проверка response_model, JSONResponse."""
+    with SessionLocal() as db:
+        stmt = select(models.Room).where(models.Room.owner_id == owner.id, models.Room.is_deleted == False)
+        rooms = list(db.scalars(stmt.order_by(models.Room.created_at.desc(), models.Room.id.desc())))
+        content = await serialize_response(field=field, response_content=rooms)
+    return JSONResponse(content).body
+
+
+async def legacy_nodes(field) -> bytes:
+    with SessionLocal() as db:
+        nodes = list(db.scalars(select(models.ServerNode).order_by(models.ServerNode.created_at, models.ServerNode.id)))
+        content = await serialize_response(field=field, response_content=[heartbeats.overlay(n) for n in nodes])
+    return JSONResponse(content).body
+
+
+def fast_rooms(owner: Principal) -> bytes:
+    with SessionLocal() as db:
+        return render(ROOM_LIST, crud.list_user_rooms(db, owner)).body
+
+
+def fast_nodes() -> bytes:
+    with SessionLocal() as db:
+        rows = crud.list_nodes(db)
+        return render(NODE_LIST, [{**row._mapping, **heartbeats.overlay_values(row.id)} for row in rows]).body
+
+
+def measure(fn, repeat: int) -> tuple[float, bytes]:
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="комнат у пользователя и нод в базе")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов, берётся лучший")
+    args = parser.parse_args()
+
+    upgrade(engine)
+    owner = seed(args.rows)
+    room_field = create_model_field(name="Response", type_=List[schemas.RoomOut], mode="serialization")
+    node_field = create_model_field(name="Response", type_=List[schemas.ServerNodeOut], mode="serialization")
+
+    cases = [
+        ("/rooms/my", lambda: asyncio.run(legacy_rooms(owner, room_field)), lambda: fast_rooms(owner)),
+        ("/nodes/", lambda: asyncio.run(legacy_nodes(node_field)), fast_nodes),
+    ]
+
+    print(f"строк: {args.rows:,}, база: {engine.url}")
+    print(f"{'листинг':<12}{'путь':<22}{'rows/s':>12}{'мс':>9}{'байт':>12}")
+    for title, legacy, fast in cases:
+        legacy_time, legacy_body = measure(legacy, args.repeat)
+        fast_time, fast_body = measure(fast, args.repeat)
+        if json.loads(legacy_body) != json.loads(fast_body):
+            print(f"{title}: ответы путей различаются!")
+            return 1
+        for name, seconds, body in (("ORM + response_model", legacy_time, legacy_body), ("колонки + TypeAdapter", fast_time, fast_body)):
+            print(f"{title:<12}{name:<22}{args.rows / seconds:>12,.0f}{seconds * 1000:>9.1f}{len(body):>12,}")
+        print(f"{'':<12}ускорение: x{legacy_time / fast_time:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,181 @@
+"""
+Бенчмарк конкуренции чтений и записей в SQLite.
+
+Сравнивает прежнее подключение (rollback journal, synchronous=FULL, без
+прагм) с профилем хранилища из app/database.py (WAL, synchronous=NORMAL,
+busy_timeout). На временной базе со схемой из миграций несколько потоков
+читают комнаты пользователей (как GET /rooms/my), а писатели создают
+комнаты и обновляют ноды (как создание комнат и запись heartbeat-ов):
+
+    python scripts/bench_sqlite_contention.py
+    python scripts/bench_sqlite_contention.py --readers 16 --writers 4 --seconds 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# база для замера — временная, рабочую не трогаем
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='quiet-bench-')}/unused.db"
+
+from sqlalchemy import create_engine, insert, select, update  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import apply_sqlite_pragmas  # noqa: E402
+from app.migrate import upgrade  # noqa: E402
+from app.models import NodeStatus, RoomStatus  # noqa: E402
+
+PROFILES = [
+    # (название, journal_mode, synchronous, busy_timeout_ms); None — прагму не ставим
+    ("rollback journal (как было)", "", "", None),
+    ("WAL + NORMAL + busy_timeout", "WAL", "NORMAL", 5000),
+]
+
+rooms = models.Room.__table__
+nodes = models.ServerNode.__table__
+
+
+def make_engine(path: str, journal_mode: str, synchronous: str, busy_timeout_ms: int | None) -> Engine:
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=32)
+    apply_sqlite_pragmas(engine, journal_mode, synchronous, busy_timeout_ms)
+    return engine
+
+
+def seed(engine: Engine, users: int, rooms_per_user: int) -> tuple[list[str], list[str]]:
+    now = datetime.utcnow()
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    node_ids = [str(uuid.uuid4()) for _ in range(10)]
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": uid, "email": f"{uid}@example.com", "hashed_password": "x", "max_rooms": 1, "created_at": now}
+            for uid in user_ids
+        ])
+        conn.execute(insert(nodes), [
+            {"id": nid, "name": nid, "base_url": "http://node", "status": NodeStatus.ACTIVE,
+             "max_rooms": 1000, "active_rooms": 0, "created_at": now}
+            for nid in node_ids
+        ])
+        conn.execute(insert(rooms), [
+            {"id": str(uuid.uuid4()), "code": uuid.uuid4().hex[:12], "owner_id": uid,
+             "node_id": random.choice(node_ids), "max_participants": 20,
+             "status": RoomStatus.ACTIVE, "created_at": now, "is_deleted": False}
+            for uid in user_ids for _ in range(rooms_per_user)
+        ])
+    return user_ids, node_ids
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reads: list[float] = []
+        self.writes: list[float] = []
+        self.errors = 0
+
+    def add(self, bucket: list[float], started: float) -> None:
+        with self.lock:
+            bucket.append(time.perf_counter() - started)
+
+
+def reader(engine: Engine, user_ids: list[str], deadline: float, stats: Stats) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(
+                    select(rooms).where(rooms.c.owner_id == random.choice(user_ids), rooms.c.is_deleted == False)
+                    .order_by(rooms.c.created_at.desc())
+                ).all()
+        except OperationalError:
+            stats.errors += 1
+            continue
+        stats.add(stats.reads, started)
+
+
+def writer(engine: Engine, user_ids: list[str], node_ids: list[str], deadline: float, stats: Stats) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                if random.random() < 0.5:
+                    conn.execute(insert(rooms).values(
+                        id=str(uuid.uuid4()), code=uuid.uuid4().hex[:12], owner_id=random.choice(user_ids),
+                        node_id=random.choice(node_ids), max_participants=20, status=RoomStatus.ACTIVE,
+                        created_at=datetime.utcnow(), is_deleted=False,
+                    ))
+                else:
+                    conn.execute(
+                        update(nodes).where(nodes.c.id == random.choice(node_ids))
+                        .values(active_rooms=random.randint(0, 100), last_heartbeat=datetime.utcnow())
+                    )
+        except OperationalError:
+            stats.errors += 1
+            continue
+        stats.add(stats.writes, started)
+
+
+def pct(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def run_profile(profile: tuple, args: argparse.Namespace) -> Stats:
+    _, journal_mode, synchronous, busy_timeout_ms = profile
+    path = Path(tempfile.mkdtemp(prefix="quiet-bench-")) / "bench.db"
+    engine = make_engine(str(path), journal_mode, synchronous, busy_timeout_ms)
+    upgrade(engine)
+    user_ids, node_ids = seed(engine, args.users, args.rooms_per_user)
+
+    stats = Stats()
+    deadline = time.perf_counter() + args.seconds
+    threads = [threading.Thread(target=reader, args=(engine, user_ids, deadline, stats)) for _ in range(args.readers)]
+    threads += [
+        threading.Thread(target=writer, args=(engine, user_ids, node_ids, deadline, stats))
+        for _ in range(args.writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8, help="потоков-читателей")
+    parser.add_argument("--writers", type=int, default=2, help="потоков-писателей")
+    parser.add_argument("--users", type=int, default=1000, help="пользователей в базе")
+    parser.add_argument("--rooms-per-user", type=int, default=5, help="комнат на пользователя")
+    parser.add_argument("--seconds", type=float, default=3.0, help="длительность замера на профиль")
+    args = parser.parse_args()
+
+    print(f"читателей: {args.readers}, писателей: {args.writers}, комнат: {args.users * args.rooms_per_user:,}")
+    print(f"{'профиль':<30}{'read/s':>9}{'read p99':>11}{'write/s':>9}{'write p99':>11}{'locked':>8}")
+    for profile in PROFILES:
+        s = run_profile(profile, args)
+        print(
+            f"{profile[0]:<30}{len(s.reads) / args.seconds:>9,.0f}{pct(s.reads, 0.99):>9.1f}ms"
+            f"{len(s.writes) / args.seconds:>9,.0f}{pct(s.writes, 0.99):>9.1f}ms{s.errors:>8}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,173 @@
+"""
+Бенчмарк webhook ЮKassa при всплеске платежей.
+
+Шлёт волну payment.succeeded (каждый платёж доставляется несколько раз, как
+при повторах провайдера) в прежний обработчик, применявший оплату прямо в
+запросе, и в нынешний (запись во входящую очередь + фоновое применение
+app/billing_inbox.py), на временной SQLite-базе. Печатает p50/p99 ответа и
+проверяет, что каждый платёж выдал ровно одну комнату:
+
+    python scripts/bench_webhook.py
+    python scripts/bench_webhook.py --payments 2000 --deliveries 3 --concurrency 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# база для замера — временная, рабочую не трогаем
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='quiet-bench-')}/bench.db"
+
+import httpx  # noqa: E402
+from fastapi import Request  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app import crud, models  # noqa: E402
+from app.billing_inbox import billing_inbox, inbox_loop  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrate import upgrade  # noqa: E402
+
+LEGACY_URL = "/bench/legacy-webhook"
+INBOX_URL = "/billing/yookassa/webhook"
+
+
+def legacy_apply(body: dict) -> None:
+    """Как было: пользователь, подписка, +1 к лимиту и commit прямо в запросе, без дедупликации."""
+    obj = body["object"]
+    with SessionLocal() as db:
+        user = crud.get_user(db, obj["metadata"]["user_id"])
+        crud.get_room_usage(db, user)
+        crud.add_room_subscription(db, user, external_id=obj["id"], amount_rub=1200, description="legacy")
+        db.commit()
+
+
+@app.post(LEGACY_URL)
+async def legacy_webhook(request: Request):
+    await run_in_threadpool(legacy_apply, await request.json())
+    return {"status": "ok"}
+
+
+def seed_users(count: int) -> list[str]:
+    user_ids = [str(uuid.uuid4()) for _ in range(count)]
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id": uid, "email": f"{uid}@example.com", "hashed_password": "x", "max_rooms": 1,
+             "created_at": datetime.utcnow()}
+            for uid in user_ids
+        ])
+    return user_ids
+
+
+def payment(user_id: str) -> bytes:
+    return json.dumps({
+        "event": "payment.succeeded",
+        "object": {
+            "id": str(uuid.uuid4()),
+            "amount": {"value": "1200.00", "currency": "RUB"},
+            "metadata": {"user_id": user_id, "purpose": "buy_room"},
+        },
+    }).encode()
+
+
+async def spike(url: str, bodies: list[bytes], concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker() -> None:
+            while not queue.empty():
+                body = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.post(url, content=body, headers={"content-type": "application/json"})
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def granted(user_ids: list[str]) -> tuple[int, int]:
+    """(комнат выдано сверх исходной, подписок) по пользователям замера."""
+    with SessionLocal() as db:
+        rooms = db.scalar(select(func.sum(models.User.max_rooms - 1)).where(models.User.id.in_(user_ids)))
+        subs = db.scalar(select(func.count()).where(models.UserSubscription.user_id.in_(user_ids)))
+    return rooms or 0, subs
+
+
+def pct(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+async def run_inbox(bodies: list[bytes], concurrency: int) -> tuple[list[float], float]:
+    loop_task = asyncio.create_task(inbox_loop(
+        engine,
+        settings.BILLING_INBOX_POLL_SECONDS,
+        settings.BILLING_INBOX_BATCH_SIZE,
+        settings.BILLING_INBOX_MAX_ATTEMPTS,
+        settings.BILLING_INBOX_BATCH_PAUSE_SECONDS,
+    ))
+    started = time.perf_counter()
+    latencies = await spike(INBOX_URL, bodies, concurrency)
+    loop_task.cancel()
+    # догоняем очередь, чтобы проверить итог
+    while await asyncio.to_thread(billing_inbox.apply_pending, engine, settings.BILLING_INBOX_BATCH_SIZE,
+                                  settings.BILLING_INBOX_MAX_ATTEMPTS):
+        pass
+    return latencies, time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=1000, help="уникальных платежей в волне")
+    parser.add_argument("--deliveries", type=int, default=2, help="сколько раз провайдер доставляет каждый платёж")
+    parser.add_argument("--users", type=int, default=200, help="пользователей, между которыми делятся платежи")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных запросов")
+    args = parser.parse_args()
+
+    upgrade(engine)
+    print(f"платежей: {args.payments:,} x{args.deliveries} доставки, одновременно: {args.concurrency}")
+    print(f"{'путь':<26}{'p50':>9}{'p99':>9}{'всего, с':>10}{'комнат':>9}{'подписок':>10}")
+
+    ok = True
+    for title, url in (("в запросе (как было)", LEGACY_URL), ("inbox + фоновое применение", INBOX_URL)):
+        user_ids = seed_users(args.users)
+        bodies = [payment(user_ids[i % len(user_ids)]) for i in range(args.payments)]
+        bodies = [body for body in bodies for _ in range(args.deliveries)]
+        if url == LEGACY_URL:
+            started = time.perf_counter()
+            latencies = asyncio.run(spike(url, bodies, args.concurrency))
+            total = time.perf_counter() - started
+        else:
+            latencies, total = asyncio.run(run_inbox(bodies, args.concurrency))
+        rooms, subs = granted(user_ids)
+        print(f"{title:<26}{pct(latencies, 0.5):>7.1f}ms{pct(latencies, 0.99):>7.1f}ms{total:>10.2f}{rooms:>9,}{subs:>10,}")
+        if url == INBOX_URL and (rooms != args.payments or subs != args.payments):
+            ok = False
+
+    if not ok:
+        print("inbox: число выданных комнат не совпадает с числом платежей!")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
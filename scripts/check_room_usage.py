@@ -0,0 +1,51 @@
+"""
+Сверка счётчиков user_room_usage с фактическими данными.
+
+Пересчитывает для каждого пользователя число незакрытых комнат (COUNT) и
+лимит по активным подпискам (SUM room_count) и сравнивает со счётчиками,
+по которым проверяется лимит при создании комнат:
+
+    python scripts/check_room_usage.py          # только отчёт
+    python scripts/check_room_usage.py --fix    # исправить расхождения
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app import crud  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.migrate import upgrade  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fix", action="store_true", help="записать пересчитанные значения")
+    args = parser.parse_args()
+
+    upgrade(engine)
+    with SessionLocal() as db:
+        mismatches = crud.check_room_usage(db, fix=args.fix)
+
+    for m in mismatches:
+        print(
+            f"{m['user_id']}: комнат {m['active_rooms']} (должно {m['expected_active_rooms']}), "
+            f"лимит {m['room_limit']} (должно {m['expected_room_limit']})"
+        )
+    if not mismatches:
+        print("Расхождений нет")
+    elif args.fix:
+        print(f"Исправлено: {len(mismatches)}")
+
+    # ненулевой код — чтобы проверку можно было повесить на cron/CI
+    return 1 if mismatches and not args.fix else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
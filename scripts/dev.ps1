@@ -36,7 +36,7 @@ Write-Host "[dev] Стартуем control-plane (port 8000)..."
 $cp = Start-Process python -ArgumentList '-m', 'uvicorn', 'app.main:app', '--reload', '--port', '8000' -WorkingDirectory $Root -PassThru -NoNewWindow
 
 Write-Host "[dev] Стартуем node_service (port 9000)..."
-$node = Start-Process python -ArgumentList '-m', 'uvicorn', 'node_service.app.main:app', '--reload', '--host', '0.0.0.0', '--port', '9000' -WorkingDirectory $Root -PassThru -NoNewWindow
+$node = Start-Process python -ArgumentList '-m', 'uvicorn', 'node_service.app.main:app', '--reload', '--host', '0.0.0.0', '--port', '9000', '--ws', 'websockets', '--ws-per-message-deflate', 'true' -WorkingDirectory $Root -PassThru -NoNewWindow
 
 Write-Host "[dev] Стартуем frontend (port 5173)..."
 $fe = Start-Process npm -ArgumentList 'run','dev','--','--host','--port','5173' -WorkingDirectory "$Root/frontend" -PassThru -NoNewWindow
@@ -68,6 +68,10 @@ def main() -> int:
                     "0.0.0.0",
                     "--port",
                     "9000",
+                    "--ws",
+                    "websockets",
+                    "--ws-per-message-deflate",
+                    "true",
                 ],
                 ROOT,
             )
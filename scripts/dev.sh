@@ -30,7 +30,7 @@ uvicorn app.main:app --reload --port 8000 &
 CP_PID=$!
 
 echo "[dev] Стартуем node_service (port 9000)..."
-uvicorn node_service.app.main:app --reload --host 0.0.0.0 --port 9000 &
+uvicorn node_service.app.main:app --reload --host 0.0.0.0 --port 9000 --ws websockets --ws-per-message-deflate true &
 NODE_PID=$!
 
 echo "[dev] Стартуем frontend (port 5173)..."
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from app import crud, migrate
+from app.principals import Principal
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    migrate.upgrade(engine)
+    return engine
+
+
+def _query_plan(engine, call) -> str:
+    """План запроса, который выполнил call(session)."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as db:
+            call(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("before", [None, (datetime(2026, 1, 1), "room-id")])
+def test_user_rooms_page_uses_index_order(engine, before):
+    user = Principal(id="user-id", email="u@example.com", max_rooms=1, created_at=datetime(2026, 1, 1))
+    plan = _query_plan(engine, lambda db: crud.list_user_rooms(db, user, 21, before))
+
+    assert "ix_rooms_owner_created_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_old_owner_index_is_dropped(engine):
+    with engine.connect() as conn:
+        names = set(conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+    assert "ix_rooms_owner_created_id" in names
+    assert "ix_rooms_owner_listing" not in names